@@ -1,22 +1,29 @@
+import logging
 from flask import Blueprint, request, jsonify
 from models import db, User, Exam, Result
-from auth_middleware import auth_required
+from auth_middleware import auth_required, user_cache
+import db_routing
+import retention
+from pagination import list_response
+
+logger = logging.getLogger(__name__)
 
 admin_bp = Blueprint('admin', __name__)
 
-# --- 1. GET ALL USERS ---
+# --- 1. GET ALL USERS (Supports ?limit=&cursor=&fields=, see pagination.py) ---
+USER_FIELDS = {
+    'id': (User.id, None),
+    'username': (User.username, None),
+    'email': (User.email, None),
+    'role': (User.role, None),
+    'enrollment_id': (User.enrollment_id, None),
+}
+
 @admin_bp.route('/users', methods=['GET'])
 @auth_required
 def get_all_users():
     try:
-        users = db.session.execute(db.select(User)).scalars().all()
-        return jsonify([{
-            'id': u.id,
-            'username': u.username,
-            'email': u.email,
-            'role': u.role,
-            'enrollment_id': u.enrollment_id
-        } for u in users]), 200
+        return list_response(User.id, USER_FIELDS, lambda q: q.select_from(User))
     except Exception as e:
         return jsonify(message=str(e)), 500
 
@@ -57,23 +64,22 @@ def create_user():
 @auth_required
 def delete_user(user_id):
     try:
-        user = db.session.get(User, user_id)
-        if not user:
-            return jsonify(message="User not found"), 404
-            
         # Optional: Prevent deleting yourself (Security)
         # requester_id = request.headers.get('user-id')
         # if str(requester_id) == str(user_id):
         #    return jsonify(message="Cannot delete yourself"), 403
 
-        db.session.delete(user)
-        db.session.commit()
+        # Results (out of the analytics), timelines and saved answers go with the user
+        if not retention.delete_user(user_id):
+            return jsonify(message="User not found"), 404
+        user_cache.invalidate(user_id)
         return jsonify(message="User deleted"), 200
     except Exception as e:
         return jsonify(message=str(e)), 500
 
 # --- 4. SYSTEM STATS ---
 @admin_bp.route('/stats', methods=['GET'])
+@db_routing.read_replica
 def get_stats():
     try:
         total_users = db.session.query(User).count()
@@ -85,5 +91,12 @@ def get_stats():
             "exams": total_exams,
             "results": total_results
         }), 200
-    except:
-        return jsonify(message="Error"), 500
\ No newline at end of file
+    except Exception:
+        logger.exception("Loading admin stats failed")
+        return jsonify(message="Error"), 500
+
+# --- 5. CONNECTION POOL METRICS ---
+@admin_bp.route('/pool', methods=['GET'])
+@auth_required
+def get_pool_stats():
+    return jsonify(db_routing.pool_stats(db)), 200
@@ -0,0 +1,302 @@
+import argparse
+import atexit
+import logging
+import math
+import threading
+from collections import defaultdict
+
+from sqlalchemy import bindparam, update, insert
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Result, Question, ExamStats, ExamScoreBucket, QuestionStats
+from grading import decode_mask
+
+logger = logging.getLogger(__name__)
+
+# --- INCREMENTAL EXAM ANALYTICS ---
+# Per-exam count / sum / sum of squares, a 10-bucket score histogram and
+# per-question attempts/correct counts are kept as running totals, so the
+# analytics endpoint reads a handful of rows instead of scanning all results.
+# Submissions don't touch these hot rows in their own transaction: they hand
+# their contribution to `stats_writer`, which merges it in memory and applies
+# everything pending every ANALYTICS_FLUSH_SECONDS (the queued grading writer
+# applies its batch itself). delete_result subtracts a result inline, using the
+# graded question bitmap stored on the Result. Contributions still pending when
+# a process dies are lost; 'rebuild' repairs the totals from the Result rows.
+#
+#   python analytics.py rebuild [--exam ID]     backfill / repair from Result rows
+
+BUCKETS = 10
+
+def bucket_for(score, total):
+    if not total:
+        return 0
+    return min(BUCKETS - 1, int(BUCKETS * score / total))
+
+class Aggregates:
+    def __init__(self):
+        self.exams = defaultdict(lambda: [0, 0, 0, 0.0])   # attempts, sum, sum of squares, percent sum
+        self.buckets = defaultdict(int)                     # (exam_id, bucket) -> count
+        self.questions = defaultdict(lambda: [0, 0])        # question_id -> attempts, correct
+        self.question_exam = {}
+
+    def add(self, exam_id, score, total, correct_mask=None, sign=1):
+        score = score or 0
+        e = self.exams[exam_id]
+        e[0] += sign
+        e[1] += sign * score
+        e[2] += sign * score * score
+        e[3] += sign * (100.0 * score / total if total else 0.0)
+        self.buckets[(exam_id, bucket_for(score, total))] += sign
+
+        if correct_mask is not None:
+            ids, mask = decode_mask(correct_mask)
+            for qid, ok in zip(ids.tolist(), mask.tolist()):
+                q = self.questions[qid]
+                q[0] += sign
+                q[1] += sign * int(ok)
+                self.question_exam[qid] = exam_id
+        return self
+
+    def merge(self, other):
+        for exam_id, values in other.exams.items():
+            e = self.exams[exam_id]
+            for i, v in enumerate(values):
+                e[i] += v
+        for key, d in other.buckets.items():
+            self.buckets[key] += d
+        for qid, (a, c) in other.questions.items():
+            q = self.questions[qid]
+            q[0] += a
+            q[1] += c
+        self.question_exam.update(other.question_exam)
+        return self
+
+    def __bool__(self):
+        return bool(self.exams or self.questions)
+
+    # --- INCREMENTAL UPDATE (Caller commits) ---
+    def apply(self):
+        for exam_id, (n, s, sq, pct) in self.exams.items():
+            values = {
+                ExamStats.attempts: ExamStats.attempts + n,
+                ExamStats.score_sum: ExamStats.score_sum + s,
+                ExamStats.score_sq_sum: ExamStats.score_sq_sum + sq,
+                ExamStats.percent_sum: ExamStats.percent_sum + pct,
+            }
+            updated = db.session.query(ExamStats).filter_by(exam_id=exam_id).update(values, synchronize_session=False)
+            # Exams created before analytics existed get their rows on first use
+            if not updated and n > 0:
+                ensure_exam(exam_id)
+                db.session.query(ExamStats).filter_by(exam_id=exam_id).update(values, synchronize_session=False)
+
+        buckets = ExamScoreBucket.__table__
+        params = [{'b_exam': e, 'b_bucket': b, 'b_delta': d} for (e, b), d in self.buckets.items() if d]
+        if params:
+            db.session.execute(
+                update(buckets)
+                .where(buckets.c.exam_id == bindparam('b_exam'), buckets.c.bucket == bindparam('b_bucket'))
+                .values(count=buckets.c.count + bindparam('b_delta')),
+                params
+            )
+
+        if self.questions:
+            known = {r[0] for r in db.session.query(QuestionStats.question_id)
+                     .filter(QuestionStats.question_id.in_(list(self.questions)))}
+            missing = [qid for qid in self.questions if qid not in known]
+            # Only questions that still exist get a stats row
+            if missing:
+                alive = {r[0] for r in db.session.query(Question.id).filter(Question.id.in_(missing))}
+                rows = [{'question_id': qid, 'exam_id': self.question_exam[qid], 'attempts': 0, 'correct': 0}
+                        for qid in missing if qid in alive]
+                _insert_ignore(QuestionStats, rows, ['question_id'])
+
+            questions = QuestionStats.__table__
+            db.session.execute(
+                update(questions)
+                .where(questions.c.question_id == bindparam('b_question'))
+                .values(attempts=questions.c.attempts + bindparam('b_attempts'),
+                        correct=questions.c.correct + bindparam('b_correct')),
+                [{'b_question': qid, 'b_attempts': a, 'b_correct': c}
+                 for qid, (a, c) in self.questions.items()]
+            )
+
+def _insert_ignore(model, rows, keys):
+    # INSERT ... ON CONFLICT DO NOTHING: two writers creating the same row both succeed
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        db.session.execute(upsert(model).on_conflict_do_nothing(index_elements=keys), rows)
+        return
+    # Other databases: one savepoint per row
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(model), row)
+        except IntegrityError:
+            pass
+
+def ensure_exam(exam_id):
+    # Creates the zeroed stats rows of an exam, unless they already exist
+    _insert_ignore(ExamStats, [{'exam_id': exam_id, 'attempts': 0, 'score_sum': 0,
+                                'score_sq_sum': 0, 'percent_sum': 0.0}], ['exam_id'])
+    _insert_ignore(ExamScoreBucket, [{'exam_id': exam_id, 'bucket': b, 'count': 0} for b in range(BUCKETS)],
+                   ['exam_id', 'bucket'])
+
+def ensure_question(question_id, exam_id):
+    db.session.add(QuestionStats(question_id=question_id, exam_id=exam_id, attempts=0, correct=0))
+
+def record_result(exam_id, score, total, correct_mask=None):
+    Aggregates().add(exam_id, score, total, correct_mask).apply()
+
+# --- BATCHED WRITER (Submissions, after their commit) ---
+class StatsWriter:
+    def __init__(self, app=None):
+        self._pending = Aggregates()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.app = None
+        self.flush_seconds = 1.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_seconds = app.config.get('ANALYTICS_FLUSH_SECONDS', 1.0)
+        if self._thread is None and self.flush_seconds > 0:
+            self._thread = threading.Thread(target=self._run, name='analytics-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self._flush_at_exit)
+        app.extensions['stats_writer'] = self
+
+    def add(self, exam_id, score, total, correct_mask=None):
+        # The Result is committed; its contribution goes out with the next flush
+        with self._lock:
+            self._pending.add(exam_id, score, total, correct_mask)
+        if self._thread is None:
+            self.flush()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception:
+                logger.exception("Analytics flush failed")
+
+    def _flush_at_exit(self):
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception:
+            logger.exception("Final analytics flush failed")
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, Aggregates()
+            try:
+                batch.apply()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                # Put it back; counts added meanwhile just sum up
+                with self._lock:
+                    self._pending = batch.merge(self._pending)
+                raise
+            return sum(n for n, *_ in batch.exams.values())
+
+    def discard(self, exam_id):
+        # Before an exam's stats rows are deleted
+        with self._flush_lock, self._lock:
+            self._pending.exams.pop(exam_id, None)
+            for key in [k for k in self._pending.buckets if k[0] == exam_id]:
+                del self._pending.buckets[key]
+            for qid in [q for q, e in self._pending.question_exam.items() if e == exam_id]:
+                self._pending.questions.pop(qid, None)
+                del self._pending.question_exam[qid]
+
+stats_writer = StatsWriter()
+
+def reverse_result(result):
+    Aggregates().add(result.exam_id, result.score, result.total_questions, result.correct_mask, sign=-1).apply()
+
+def drop_exam_stats(exam_id):
+    for model in (QuestionStats, ExamScoreBucket, ExamStats):
+        db.session.query(model).filter_by(exam_id=exam_id).delete(synchronize_session=False)
+
+# --- READ ---
+def exam_analytics(exam_id):
+    stats = db.session.get(ExamStats, exam_id)
+    if stats is None:
+        return None
+
+    n = stats.attempts
+    mean = stats.score_sum / n if n else 0.0
+    variance = max(0.0, stats.score_sq_sum / n - mean * mean) if n else 0.0
+    buckets = dict(db.session.query(ExamScoreBucket.bucket, ExamScoreBucket.count).filter_by(exam_id=exam_id))
+    questions = db.session.query(QuestionStats).filter_by(exam_id=exam_id).order_by(QuestionStats.question_id)
+
+    return {
+        'exam_id': exam_id,
+        'attempts': n,
+        'mean_score': round(mean, 3),
+        'stddev_score': round(math.sqrt(variance), 3),
+        'mean_percent': round(stats.percent_sum / n, 2) if n else 0.0,
+        'histogram': [{'range': f"{b * 100 // BUCKETS}-{(b + 1) * 100 // BUCKETS}%", 'count': buckets.get(b, 0)}
+                      for b in range(BUCKETS)],
+        'questions': [{
+            'question_id': q.question_id,
+            'attempts': q.attempts,
+            'correct': q.correct,
+            'correct_rate': round(q.correct / q.attempts, 3) if q.attempts else None,
+        } for q in questions],
+    }
+
+# --- REBUILD (Backfill from Result rows) ---
+def rebuild(exam_id=None):
+    exam_ids = [exam_id] if exam_id is not None else [r[0] for r in db.session.query(Result.exam_id).distinct()]
+    for eid in exam_ids:
+        drop_exam_stats(eid)
+        # Every current question gets a row, even if nobody answered it yet
+        db.session.execute(insert(QuestionStats).from_select(
+            ['question_id', 'exam_id', 'attempts', 'correct'],
+            db.select(Question.id, Question.exam_id, db.literal(0), db.literal(0)).where(Question.exam_id == eid)
+        ))
+    db.session.flush()
+
+    agg = Aggregates()
+    q = db.session.query(Result.exam_id, Result.score, Result.total_questions, Result.correct_mask)
+    if exam_id is not None:
+        q = q.filter(Result.exam_id == exam_id)
+    # Results graded before correct_mask existed only count towards the exam totals
+    for row in q.execution_options(yield_per=1000):
+        agg.add(*row)
+    agg.apply()
+    if exam_id is not None and exam_id not in agg.exams:
+        ensure_exam(exam_id)
+    db.session.commit()
+    return len(exam_ids)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exam analytics maintenance.")
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--exam', type=int, default=None, help="Only rebuild this exam")
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        count = rebuild(args.exam)
+        print(f"✅ Rebuilt analytics for {count} exam(s).")
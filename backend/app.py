@@ -1,7 +1,23 @@
+import logging
+
 from flask import Flask
 from flask_cors import CORS
 from config import Config
 from models import db
+import db_routing
+import instrumentation
+import responses
+from proctor_backend import proctor
+from broadcast import broadcasts
+from timeline import timeline
+from catalog import exam_catalog
+from auth_middleware import user_cache
+from passwords import passwords, login_limiter
+from grading import answer_keys, submissions
+from papers import papers
+from autosave import autosave
+from analytics import stats_writer
+from partitions import exam_partitions
 from students_routes import student_bp
 from admin_routes import admin_bp
 
@@ -9,13 +25,34 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    logging.basicConfig(level=app.config.get('LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
     # Initialize Database
     db.init_app(app)
+    db_routing.init_app(app, db)
+    instrumentation.init_app(app, db)
+    responses.init_app(app)
+    exam_catalog.init_app(app)
+    user_cache.init_app(app)
+    passwords.init_app(app)
+    login_limiter.init_app(app)
+    answer_keys.init_app(app)
+    submissions.init_app(app)
+    papers.init_app(app)
+    autosave.init_app(app)
+    stats_writer.init_app(app)
+    exam_partitions.init_app(app)
+
+    # Proctoring backend (the local worker pool starts on the first frame), video broadcasters
+    proctor.init_app(app)
+    broadcasts.init_app(app)
+    timeline.init_app(app)
     
     # Enable CORS
     CORS(app, resources={r"/api/*": {
         "origins": "*",
-        "allow_headers": ["Content-Type", "user-id"], 
+        "allow_headers": ["Content-Type", "user-id", "Authorization"], 
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
     }})
 
@@ -23,10 +60,12 @@ def create_app():
     from routes import auth_bp, exam_bp
     from question_routes import question_bp
     from attempt_routes import attempt_bp
+    from proctor_routes import proctor_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(exam_bp, url_prefix='/api/exams')
     app.register_blueprint(question_bp, url_prefix='/api/exams')
+    app.register_blueprint(proctor_bp, url_prefix='/api/exams')
     app.register_blueprint(attempt_bp, url_prefix='/api/attempts')
     app.register_blueprint(student_bp, url_prefix='/api/students')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
@@ -1,24 +1,144 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, g, current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from models import User, db
 
+# Lightweight, detached copy of a user row that is safe to cache and share
+AuthUser = namedtuple('AuthUser', ['id', 'username', 'role', 'enrollment_id'])
+
+# --- USER CACHE (Small TTL + LRU, invalidated when a user is deleted) ---
+class UserCache:
+    def __init__(self, max_size=4096, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_size = app.config.get('AUTH_CACHE_SIZE', 4096)
+        self.ttl = app.config.get('AUTH_CACHE_TTL', 60)
+
+    def get(self, user_id):
+        now = time.time()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry and now - entry[1] < self.ttl:
+                self._users.move_to_end(user_id)
+                return entry[0]
+
+        user = db.session.get(User, user_id)
+        if not user:
+            return None
+        auth_user = AuthUser(user.id, user.username, user.role, user.enrollment_id)
+        with self._lock:
+            self._users[user_id] = (auth_user, now)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+        return auth_user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+user_cache = UserCache()
+
+# --- SIGNED TOKENS (Carry id + role, verified without touching the DB) ---
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['JWT_SECRET_KEY'], salt='auth-token')
+
+def issue_token(user):
+    return _serializer().dumps({'id': user.id, 'role': user.role})
+
+def verify_token(token, max_age=None):
+    if max_age is None:
+        max_age = current_app.config.get('AUTH_TOKEN_TTL', 8 * 3600)
+    try:
+        return _serializer().loads(token, max_age=max_age)
+    except (BadSignature, SignatureExpired):
+        return None
+
+# --- SESSION COOKIE (Short-lived, refreshed on use, so pages don't log in again) ---
+def set_session_cookie(response, token):
+    config = current_app.config
+    response.set_cookie(config.get('AUTH_SESSION_COOKIE', 'exam_session'), token,
+                        max_age=config.get('AUTH_SESSION_TTL', 1800), httponly=True,
+                        secure=config.get('AUTH_SESSION_SECURE', False), samesite='Lax')
+    return response
+
+def clear_session_cookie(response):
+    response.delete_cookie(current_app.config.get('AUTH_SESSION_COOKIE', 'exam_session'))
+    return response
+
+def _session_claims():
+    token = request.cookies.get(current_app.config.get('AUTH_SESSION_COOKIE', 'exam_session'))
+    if not token:
+        return None
+    return verify_token(token, current_app.config.get('AUTH_SESSION_TTL', 1800))
+
+def _user_id():
+    # -> (user id, None) or (None, error response)
+    # 1. A signed token, then the session cookie. Only stream endpoints take the token
+    # as ?access_token= (EventSource and <img> cannot set headers), so it doesn't end
+    # up in the logs and history of every other URL.
+    auth = request.headers.get('Authorization', '')
+    token = auth[7:] if auth.startswith('Bearer ') else None
+    if token is None and g.get('query_token_allowed'):
+        token = request.args.get('access_token')
+    if token:
+        claims = verify_token(token)
+        if not claims:
+            return None, (jsonify(message="Invalid or expired token"), 401)
+        return claims['id'], None
+
+    session = _session_claims()
+    if session:
+        return session['id'], None
+
+    # Unsigned 'user-id' header: old clients only, off unless AUTH_ALLOW_USER_ID_HEADER
+    user_id = request.headers.get('user-id')
+    if not user_id or not current_app.config.get('AUTH_ALLOW_USER_ID_HEADER', False):
+        return None, (jsonify(message="Authentication required"), 401)
+    try:
+        return int(user_id), None
+    except ValueError:
+        return None, (jsonify(message="Invalid ID format"), 401)
+
 def auth_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # 1. Look for 'user-id' in the request headers
-        user_id = request.headers.get('user-id')
+        user_id, error = _user_id()
+        if error:
+            return error
 
-        if not user_id:
-            return jsonify(message="Missing user-id header"), 401
+        # 2. Check the user still exists (served from the cache on repeat calls)
+        user = user_cache.get(user_id)
+        if not user:
+            return jsonify(message="Invalid User ID"), 401
 
-        # 2. Check if this user actually exists in the DB
-        try:
-            user = db.session.get(User, int(user_id))
-            if not user:
-                return jsonify(message="Invalid User ID"), 401
-        except:
-            return jsonify(message="Invalid ID format"), 401
+        # 3. Handlers reuse the resolved user instead of loading it again
+        g.current_user = user
+        return f(*args, **kwargs)
+    return decorated_function
 
-        # 3. If user exists, let the request pass!
+def staff_required(f):
+    # auth_required for proctor/teacher/admin endpoints: students get 403
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if g.current_user.role == 'student':
+            return jsonify(message="Forbidden"), 403
         return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return auth_required(decorated_function)
+
+def stream_auth_required(f):
+    # auth_required that also accepts ?access_token= (SSE, MJPEG)
+    checked = auth_required(f)
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.query_token_allowed = True
+        return checked(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import insert, tuple_
+
+from models import db, SavedAnswer
+
+logger = logging.getLogger(__name__)
+
+# --- WRITE-BEHIND ANSWER AUTOSAVE ---
+# Every answer click is buffered in memory per attempt; repeated edits of the
+# same question just overwrite the buffered value. A background flusher writes
+# the dirty answers as one bulk upsert every AUTOSAVE_FLUSH_SECONDS, or as soon
+# as AUTOSAVE_BATCH_SIZE are pending. Memory is bounded: past AUTOSAVE_MAX_PENDING
+# dirty answers the saving request flushes inline. Durability window: an answer
+# is in the database at most AUTOSAVE_FLUSH_SECONDS after it was saved (lost only
+# if the process dies within that window; the browser still has it and resends).
+# submit_exam grades from buffer + database when the request carries no answers.
+
+VALID_ANSWERS = {'A', 'B', 'C', 'D', None}
+
+class AnswerBuffer:
+    def __init__(self, app=None):
+        self._dirty = {}      # (student_id, exam_id) -> {question_id: (answer, ts)}
+        self._inflight = {}   # same shape, taken by a flush that has not committed yet
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.app = None
+        self.flush_seconds = 2.0
+        self.batch_size = 1000
+        self.max_pending = 50000
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_seconds = app.config.get('AUTOSAVE_FLUSH_SECONDS', 2.0)
+        self.batch_size = app.config.get('AUTOSAVE_BATCH_SIZE', 1000)
+        self.max_pending = app.config.get('AUTOSAVE_MAX_PENDING', 50000)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='autosave-flush', daemon=True)
+            self._thread.start()
+        app.extensions['autosave'] = self
+
+    # --- WRITE PATH ---
+    def save(self, student_id, exam_id, answers):
+        now = time.time()
+        with self._lock:
+            attempt = self._dirty.setdefault((student_id, exam_id), {})
+            for question_id, answer in answers.items():
+                if question_id not in attempt:
+                    self._pending += 1
+                attempt[question_id] = (answer, now)
+            pending = self._pending
+        if pending >= self.max_pending:
+            # Backpressure: the caller pays for the flush instead of growing the buffer
+            self.flush()
+        elif pending >= self.batch_size:
+            self._wake.set()
+        return len(answers)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception:
+                logger.exception("Autosave flush failed")
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return 0
+                self._inflight, self._dirty = self._dirty, {}
+                self._pending = 0
+            rows = [{'student_id': sid, 'exam_id': eid, 'question_id': qid, 'answer': answer, 'saved_at': ts}
+                    for (sid, eid), attempt in self._inflight.items()
+                    for qid, (answer, ts) in attempt.items()]
+            try:
+                self._upsert(rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self._restore()
+                raise
+            with self._lock:
+                self._inflight = {}
+            return len(rows)
+
+    def _upsert(self, rows):
+        dialect = db.engine.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            stmt = upsert(SavedAnswer)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['exam_id', 'student_id', 'question_id'],
+                set_={'answer': stmt.excluded.answer, 'saved_at': stmt.excluded.saved_at}
+            ), rows)
+            return
+        # Other databases: replace the affected rows
+        for row in rows:
+            db.session.query(SavedAnswer).filter_by(
+                exam_id=row['exam_id'], student_id=row['student_id'], question_id=row['question_id']
+            ).delete(synchronize_session=False)
+        db.session.execute(insert(SavedAnswer), rows)
+
+    def _restore(self):
+        # Failed flush: newer edits made since win over the in-flight values
+        with self._lock:
+            for key, attempt in self._inflight.items():
+                current = self._dirty.setdefault(key, {})
+                for qid, value in attempt.items():
+                    if qid not in current:
+                        current[qid] = value
+                        self._pending += 1
+            self._inflight = {}
+
+    # --- READ PATH ---
+    def answers(self, student_id, exam_id):
+        # Saved state of an attempt: database, then in-flight, then buffered edits
+        key = (student_id, exam_id)
+        out = {str(r.question_id): r.answer for r in
+               db.session.query(SavedAnswer.question_id, SavedAnswer.answer)
+               .filter_by(student_id=student_id, exam_id=exam_id)}
+        with self._lock:
+            for layer in (self._inflight.get(key, {}), self._dirty.get(key, {})):
+                out.update({str(qid): answer for qid, (answer, _) in layer.items()})
+        return {qid: answer for qid, answer in out.items() if answer is not None}
+
+    def clear(self, student_id, exam_id):
+        # After a successful submit; the caller commits the delete with its Result.
+        # Waits for a running flush, which could otherwise re-insert the answers.
+        with self._flush_lock, self._lock:
+            attempt = self._dirty.pop((student_id, exam_id), None)
+            if attempt:
+                self._pending -= len(attempt)
+        db.session.query(SavedAnswer).filter_by(
+            student_id=student_id, exam_id=exam_id
+        ).delete(synchronize_session=False)
+
+    def clear_many(self, pairs):
+        # Batch form of clear() for the submission writer: pairs of (student_id, exam_id)
+        with self._flush_lock, self._lock:
+            for key in pairs:
+                attempt = self._dirty.pop(key, None)
+                if attempt:
+                    self._pending -= len(attempt)
+        if pairs:
+            db.session.query(SavedAnswer).filter(
+                tuple_(SavedAnswer.student_id, SavedAnswer.exam_id).in_(list(pairs))
+            ).delete(synchronize_session=False)
+
+    def discard(self, exam_id=None, student_id=None):
+        # Before an exam or user is deleted: drop its buffered answers so a later
+        # flush can't write rows for it. Waits for a running flush to finish.
+        with self._flush_lock, self._lock:
+            for key in [k for k in self._dirty
+                        if (student_id is None or k[0] == student_id) and (exam_id is None or k[1] == exam_id)]:
+                self._pending -= len(self._dirty.pop(key))
+
+autosave = AnswerBuffer()
@@ -0,0 +1,415 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# --- BENCHMARKS ---
+#   python benchmark.py stampede [--db URL] [--students N] [--exams N] [--questions N]
+#   python benchmark.py camera VIDEO [VIDEO ...] [--frames N] [--sampling]
+#   python benchmark.py serialize [--cohort N] [--questions N] [--repeat N]
+#   python benchmark.py startup [--repeat N]
+#
+# 'stampede' replays an exam start through the real blueprints (Flask test
+# client, no network): seed students/exams/questions, login burst, exam list,
+# question papers, proctor_status polls, then every student submits at once.
+# Per endpoint it reports p50/p99 latency, throughput and SQL statements per
+# request. The default database is a throwaway SQLite file; pass --db with a
+# local Postgres URL (and --reset to drop its tables first) for realistic numbers.
+#
+# 'camera' times VideoCamera.get_frame on recorded video files instead of a webcam.
+#
+# 'startup' starts fresh interpreters in each process role and reports the
+# create_app() time, total process time, peak RSS and whether cv2 got loaded.
+
+PASSWORD = 'bench-pass'
+
+# --- MEASUREMENT ---
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.queries = defaultdict(int)
+        self.phases = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def on_sql(self, *args):
+        label = getattr(self._local, 'label', None)
+        if label is not None:
+            self._local.queries += 1
+
+    def call(self, client, label, method, url, **kwargs):
+        self._local.label, self._local.queries = label, 0
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        # Streamed bodies only run their queries when consumed
+        body = response.get_data()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[label].append(elapsed)
+            self.queries[label] += self._local.queries
+            if response.status_code >= 400:
+                self.errors[label] += 1
+        self._local.label = None
+        return response, body
+
+    def reset(self):
+        self.latencies.clear()
+        self.errors.clear()
+        self.queries.clear()
+
+    def phase(self, label, fn, items, concurrency):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(fn, items))
+        self.phases[label] = time.perf_counter() - start
+        return results
+
+    def report(self):
+        rows = []
+        for label, values in self.latencies.items():
+            values = sorted(values)
+            n = len(values)
+            rows.append({
+                'endpoint': label,
+                'requests': n,
+                'errors': self.errors[label],
+                'p50_ms': round(values[n // 2] * 1000, 2),
+                'p99_ms': round(values[min(n - 1, int(n * 0.99))] * 1000, 2),
+                'req_per_s': round(n / self.phases[label], 1) if self.phases.get(label) else None,
+                'queries_per_req': round(self.queries[label] / n, 2),
+            })
+        return rows
+
+def print_report(rows):
+    print(f"{'endpoint':<16}{'reqs':>7}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'SQL/req':>9}")
+    for r in rows:
+        print(f"{r['endpoint']:<16}{r['requests']:>7}{r['errors']:>8}{r['p50_ms']:>10}"
+              f"{r['p99_ms']:>10}{r['req_per_s'] or '-':>10}{r['queries_per_req']:>9}")
+
+# --- EXAM-START STAMPEDE ---
+def _client_pool(app):
+    # One test client per thread, like one browser per candidate
+    local = threading.local()
+    def client():
+        c = getattr(local, 'client', None)
+        if c is None:
+            c = local.client = app.test_client()
+        return c
+    return client
+
+def _bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+def seed(app, rec, students, exams, questions):
+    from models import db, User
+    client = app.test_client()
+
+    # The first admin cannot be created through the API (it needs an admin)
+    with app.app_context():
+        admin = User(username='bench-admin', email='bench-admin@exam.com', role='admin')
+        admin.set_password(PASSWORD)
+        db.session.add(admin)
+        db.session.commit()
+
+    _, body = rec.call(client, 'login', 'POST', '/api/auth/login',
+                       json={'username': 'bench-admin', 'password': PASSWORD})
+    headers = _bearer(json.loads(body)['token'])
+
+    rec.call(client, 'bulk_add', 'POST', '/api/students/bulk_add', headers=headers, json={'students': [
+        {'username': f'bench-s{i}', 'password': PASSWORD, 'enrollment_id': f'BENCH{i:06d}'}
+        for i in range(students)
+    ]})
+
+    exam_ids = []
+    for e in range(exams):
+        _, body = rec.call(client, 'create_exam', 'POST', '/api/exams', headers=headers,
+                           json={'title': f'Bench exam {e}', 'duration': 60})
+        exam_ids.append(json.loads(body)['exam_id'])
+
+    for exam_id in exam_ids:
+        for q in range(questions):
+            rec.call(client, 'add_question', 'POST', f'/api/exams/{exam_id}/questions', headers=headers, json={
+                'text': f'Question {q}', 'option_a': 'a', 'option_b': 'b', 'option_c': 'c', 'option_d': 'd',
+                'correct_option': 'ABCD'[q % 4]
+            })
+    return exam_ids
+
+def stampede(app, students=200, exams=1, questions=40, polls=5, concurrency=32):
+    from sqlalchemy import event
+    from models import db
+
+    rec = Recorder()
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', rec.on_sql)
+
+    exam_ids = seed(app, rec, students, exams, questions)
+    # Seeding numbers are not part of the report
+    rec.reset()
+    client = _client_pool(app)
+    names = [f'bench-s{i}' for i in range(students)]
+
+    def login(name):
+        _, body = rec.call(client(), 'login', 'POST', '/api/auth/login',
+                           json={'username': name, 'password': PASSWORD})
+        data = json.loads(body)
+        return data['user']['id'], data['token']
+    sessions = rec.phase('login', login, names, concurrency)
+
+    def exam_of(student_id):
+        return exam_ids[student_id % len(exam_ids)]
+
+    rec.phase('get_exams', lambda s: rec.call(client(), 'get_exams', 'GET', '/api/exams',
+                                                headers=_bearer(s[1])), sessions, concurrency)
+    def get_questions(s):
+        _, body = rec.call(client(), 'get_questions', 'GET', f'/api/exams/{exam_of(s[0])}/questions',
+                           headers=_bearer(s[1]))
+        return [q['id'] for q in json.loads(body)]
+    papers = rec.phase('get_questions', get_questions, sessions, concurrency)
+    rec.phase('proctor_status', lambda s: rec.call(client(), 'proctor_status', 'GET',
+                                                     f'/api/exams/proctor_status?exam_id={exam_of(s[0])}',
+                                                     headers=_bearer(s[1])),
+              sessions * polls, concurrency)
+
+    # Timer runs out: everyone submits at the same moment (one thread per student)
+    barrier = threading.Barrier(len(sessions))
+    def submit(item):
+        (student_id, token), question_ids = item
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        answers = {str(q): 'ABCD'[(student_id + q) % 4] for q in question_ids}
+        return rec.call(client(), 'submit_exam', 'POST', f'/api/exams/{exam_of(student_id)}/submit',
+                        headers=_bearer(token), json={'answers': answers})
+    rec.phase('submit_exam', submit, list(zip(sessions, papers)), len(sessions))
+    return rec.report()
+
+def make_app(db_url, reset=False):
+    path = None
+    if db_url is None:
+        fd, path = tempfile.mkstemp(suffix='.db', prefix='bench-')
+        os.close(fd)
+        db_url = f'sqlite:///{path}'
+    # config.py reads the environment at import time
+    os.environ['DATABASE_URL'] = db_url
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    with app.app_context():
+        if reset or path:
+            db.drop_all()
+        db.create_all()
+    return app, path
+
+# --- VIDEOCAMERA MICRO-BENCHMARK ---
+def camera_benchmark(video, frames=300, sampling=False):
+    from camera import VideoCamera
+    from sampling import AdaptiveSampler
+
+    sampler = AdaptiveSampler(target_fps=1000) if sampling else None
+    camera = VideoCamera(sampler, source=video)
+    timings = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        if camera.get_frame() is None:
+            break
+        timings.append(time.perf_counter() - start)
+    del camera
+
+    if not timings:
+        return {'video': video, 'frames': 0}
+    timings.sort()
+    n = len(timings)
+    return {
+        'video': video,
+        'sampling': sampling,
+        'frames': n,
+        'fps': round(n / sum(timings), 1),
+        'p50_ms': round(timings[n // 2] * 1000, 2),
+        'p99_ms': round(timings[min(n - 1, int(n * 0.99))] * 1000, 2),
+    }
+
+# --- SERIALIZATION MICRO-BENCHMARK ---
+# Encodes the payloads a cohort produces (teacher results listing, analytics,
+# student list, one question paper) with each available encoder, then compresses
+# them: per payload, encode time and bytes on the wire for every combination.
+def _payloads(cohort, questions):
+    import datetime
+    import random
+    rnd = random.Random(7)
+    taken = datetime.datetime(2026, 5, 4, 9, 30)
+    return {
+        'results': [{'id': i, 'student': f"student{i:05d}", 'exam': "Data Structures - Midterm",
+                     'score': rnd.randint(0, questions), 'total': questions,
+                     'date': (taken + datetime.timedelta(minutes=i % 240)).date()} for i in range(cohort)],
+        'analytics': {'exam_id': 1, 'attempts': cohort, 'mean': 27.4, 'stdev': 6.1,
+                      'histogram': [rnd.randint(0, cohort // 10) for _ in range(questions + 1)],
+                      'questions': [{'question_id': q, 'attempts': cohort, 'correct': rnd.randint(0, cohort),
+                                     'p_value': round(rnd.random(), 4), 'discrimination': round(rnd.random(), 4)}
+                                    for q in range(questions)]},
+        'users': [{'id': i, 'username': f"student{i:05d}", 'role': 'student',
+                   'created_at': taken - datetime.timedelta(days=i % 90)} for i in range(cohort)],
+        'paper': [{'id': q, 'question_text': f"Question {q}: which of the following best describes "
+                   f"the amortised cost of operation {q} on a dynamic array?",
+                   'option_a': "O(1)", 'option_b': "O(log n)", 'option_c': "O(n)", 'option_d': "O(n log n)",
+                   'order': rnd.sample('ABCD', 4)} for q in range(questions)],
+    }
+
+def serialize_benchmark(cohort=2000, questions=100, repeat=20):
+    import gzip
+    import responses
+    from flask.json.provider import DefaultJSONProvider
+
+    encoders = {'json': lambda obj: json.dumps(obj, default=DefaultJSONProvider.default,
+                                               separators=(',', ':'), sort_keys=True).encode()}
+    if responses.orjson is not None:
+        encoders['orjson'] = responses.dumps
+    if responses.msgpack is not None:
+        encoders['msgpack'] = lambda obj: responses.msgpack.packb(obj, default=responses._default)
+    compressors = {'identity': lambda b: b, 'gzip': lambda b: gzip.compress(b, 6)}
+    if responses.brotli is not None:
+        compressors['br'] = lambda b: responses.brotli.compress(b, quality=5)
+
+    rows = []
+    for name, payload in _payloads(cohort, questions).items():
+        for encoder, encode in encoders.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                body = encode(payload)
+            encode_ms = (time.perf_counter() - start) / repeat * 1000
+            for compressor, compress in compressors.items():
+                start = time.perf_counter()
+                wire = compress(body)
+                rows.append({'payload': name, 'encoder': encoder, 'encoding': compressor,
+                             'encode_ms': round(encode_ms, 3),
+                             'compress_ms': round((time.perf_counter() - start) * 1000, 3),
+                             'bytes': len(wire)})
+    return rows
+
+# --- STARTUP TIME AND MEMORY PER PROCESS ROLE ---
+STARTUP_ROLES = {
+    'api': {'PROCTOR_BACKEND': 'remote', 'PROCTOR_WORKER_AUTHKEY': 'benchmark'},  # frames go to proctor_worker.py
+    'api-local': {'PROCTOR_BACKEND': 'local', 'PROCTOR_PRELOAD': '0'},           # OpenCV on the first frame
+    'worker': {'PROCTOR_BACKEND': 'local', 'PROCTOR_PRELOAD': '1'},              # what proctor_worker.py runs
+}
+
+_STARTUP_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+from app import create_app
+create_app()
+print(json.dumps({'seconds': time.perf_counter() - start,
+                  'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'cv2': 'cv2' in sys.modules, 'modules': len(sys.modules)}))
+"""
+
+def startup_benchmark(repeat=3):
+    here = os.path.dirname(os.path.abspath(__file__))
+    rows = []
+    for role, env in STARTUP_ROLES.items():
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, '-c', _STARTUP_PROBE], env=dict(os.environ, **env),
+                                 cwd=here, capture_output=True, text=True, check=True)
+            run = json.loads(out.stdout.strip().splitlines()[-1])
+            run['process'] = time.perf_counter() - start
+            runs.append(run)
+        runs.sort(key=lambda r: r['seconds'])
+        median = runs[len(runs) // 2]
+        rows.append({
+            'role': role,
+            'create_app_ms': round(median['seconds'] * 1000, 1),
+            'process_ms': round(median['process'] * 1000, 1),
+            # ru_maxrss is in KB on Linux
+            'peak_rss_mb': round(max(r['rss_kb'] for r in runs) / 1024, 1),
+            'cv2_loaded': median['cv2'],
+            'modules': median['modules'],
+        })
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load tests and micro-benchmarks.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('stampede', help="Simulate an exam start against the blueprints")
+    p.add_argument('--db', default=None, help="Database URL (default: a temporary SQLite file)")
+    p.add_argument('--reset', action='store_true', help="Drop and recreate the tables of --db first")
+    p.add_argument('--students', type=int, default=200)
+    p.add_argument('--exams', type=int, default=1)
+    p.add_argument('--questions', type=int, default=40)
+    p.add_argument('--polls', type=int, default=5, help="proctor_status polls per student")
+    p.add_argument('--concurrency', type=int, default=32)
+    p.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    p = sub.add_parser('camera', help="Time VideoCamera.get_frame on recorded videos")
+    p.add_argument('videos', nargs='+')
+    p.add_argument('--frames', type=int, default=300)
+    p.add_argument('--sampling', action='store_true', help="Use the AdaptiveSampler")
+
+    p = sub.add_parser('serialize', help="Time JSON/MessagePack encoding and compression of cohort payloads")
+    p.add_argument('--cohort', type=int, default=2000, help="Students (rows in the results and user listings)")
+    p.add_argument('--questions', type=int, default=100)
+    p.add_argument('--repeat', type=int, default=20)
+    p.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    p = sub.add_parser('startup', help="Startup time and memory of API and proctoring worker processes")
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    args = parser.parse_args()
+    if args.command == 'stampede':
+        app, path = make_app(args.db, args.reset)
+        try:
+            rows = stampede(app, args.students, args.exams, args.questions, args.polls, args.concurrency)
+        finally:
+            if path:
+                # Write out what the background writers still hold while the file exists,
+                # or their exit flush fails on the deleted database
+                from models import db
+                from analytics import stats_writer
+                from grading import submissions
+                with app.app_context():
+                    submissions.drain()
+                    stats_writer.flush()
+                    db.engine.dispose()
+                os.remove(path)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print_report(rows)
+    elif args.command == 'serialize':
+        rows = serialize_benchmark(args.cohort, args.questions, args.repeat)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print(f"{'payload':<11}{'encoder':<9}{'encoding':<10}{'encode ms':>11}{'compress ms':>13}{'bytes':>10}")
+            for r in rows:
+                print(f"{r['payload']:<11}{r['encoder']:<9}{r['encoding']:<10}{r['encode_ms']:>11}"
+                      f"{r['compress_ms']:>13}{r['bytes']:>10}")
+    elif args.command == 'startup':
+        rows = startup_benchmark(args.repeat)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print(f"{'role':<11}{'create_app ms':>15}{'process ms':>12}{'peak RSS MB':>13}{'cv2':>6}{'modules':>9}")
+            for r in rows:
+                print(f"{r['role']:<11}{r['create_app_ms']:>15}{r['process_ms']:>12}{r['peak_rss_mb']:>13}"
+                      f"{'yes' if r['cv2_loaded'] else 'no':>6}{r['modules']:>9}")
+    else:
+        for video in args.videos:
+            r = camera_benchmark(video, args.frames, args.sampling)
+            if not r['frames']:
+                print(f"{video}: no frames could be read")
+                continue
+            print(f"{video}: {r['frames']} frames  {r['fps']} fps  p50 {r['p50_ms']} ms  p99 {r['p99_ms']} ms"
+                  f"{'  (sampling)' if r['sampling'] else ''}")
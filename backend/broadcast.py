@@ -0,0 +1,184 @@
+import threading
+import time
+
+import cooperative
+
+# --- LATEST-FRAME BROADCASTER ---
+# One producer per video source writes the latest annotated frame into a shared
+# buffer; any number of MJPEG consumers read from it at their own pace. A slow
+# client never stalls the producer: frames it could not keep up with are simply
+# overwritten (dropped), never queued. JPEGs are encoded lazily, once per frame
+# and quality level, and shared by every consumer of that level. cv2 is imported
+# on the first encode, so importing this module stays cheap for API processes.
+
+BOUNDARY = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+# Default ladder: level -> (max width or None for native size, JPEG quality)
+DEFAULT_LADDER = {
+    'full': (None, 80),
+    'high': (640, 75),
+    'low': (320, 60),
+    'thumb': (160, 50),
+}
+
+class FrameBuffer:
+    def __init__(self, ladder):
+        self.ladder = ladder
+        self.seq = 0
+        self.closed = False
+        self._img = None
+        self._encoded = {}
+        self._cond = cooperative.Condition()
+
+    def publish(self, img):
+        with self._cond:
+            self.seq += 1
+            self._img = img
+            self._encoded = {}
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def wait(self, after_seq, timeout=5.0):
+        cooperative.wait_for(self._cond, lambda: self.seq > after_seq or self.closed, timeout)
+        with self._cond:
+            return self.seq
+
+    def jpeg(self, level):
+        with self._cond:
+            seq, img = self.seq, self._img
+            cached = self._encoded.get(level)
+        if cached is not None:
+            return cached
+        if img is None:
+            return None
+
+        import cv2
+        max_width, quality = self.ladder.get(level, self.ladder['full'])
+        if max_width and img.shape[1] > max_width:
+            height = int(img.shape[0] * max_width / img.shape[1])
+            img = cv2.resize(img, (max_width, height), interpolation=cv2.INTER_AREA)
+        ret, jpeg = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        data = jpeg.tobytes()
+
+        with self._cond:
+            # Only cache if no newer frame arrived while we were encoding
+            if self.seq == seq:
+                self._encoded[level] = data
+        return data
+
+class Broadcaster:
+    def __init__(self, key, ladder, source_factory=None, idle_timeout=5.0, on_stop=None):
+        self.key = key
+        self.buffer = FrameBuffer(ladder)
+        self.watchers = 0
+        self._leased_until = 0.0
+        self._source_factory = source_factory
+        self._idle_timeout = idle_timeout
+        self._idle_since = time.time()
+        self._on_stop = on_stop
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        # Sources without a factory are fed from outside (e.g. the proctoring workers)
+        if self._source_factory is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._produce, name=f'broadcast-{self.key}', daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def watched(self):
+        # Someone streams this feed here, or a remote API process polled it recently
+        return self.watchers > 0 or time.time() < self._leased_until
+
+    def lease(self, seconds):
+        with self._lock:
+            self._leased_until = max(self._leased_until, time.time() + seconds)
+
+    def _produce(self):
+        camera = None
+        try:
+            camera = self._source_factory()
+            while True:
+                with self._lock:
+                    if self.watchers == 0 and time.time() - self._idle_since > self._idle_timeout:
+                        break
+                ok, img = camera.read_annotated()
+                if not ok:
+                    time.sleep(0.05)
+                    continue
+                # None means the scene did not change: consumers keep the previous frame
+                if img is not None:
+                    self.buffer.publish(img)
+        finally:
+            # Dropping the last reference releases the capture device
+            camera = None
+            self.buffer.close()
+            if self._on_stop:
+                self._on_stop(self)
+
+    def stream(self, level='full', max_fps=None):
+        with self._lock:
+            self.watchers += 1
+        min_gap = 1.0 / max_fps if max_fps else 0.0
+        seq = 0
+        try:
+            while True:
+                latest = self.buffer.wait(seq)
+                if self.buffer.closed:
+                    break
+                if latest == seq:
+                    continue
+                seq = latest
+                frame = self.buffer.jpeg(level)
+                if frame:
+                    sent = time.time()
+                    yield BOUNDARY + frame + b'\r\n'
+                    if min_gap:
+                        time.sleep(max(0.0, min_gap - (time.time() - sent)))
+        finally:
+            with self._lock:
+                self.watchers -= 1
+                if self.watchers == 0:
+                    self._idle_since = time.time()
+
+class BroadcastRegistry:
+    def __init__(self, app=None):
+        self._feeds = {}
+        self._lock = threading.Lock()
+        self.ladder = DEFAULT_LADDER
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ladder = app.config.get('PROCTOR_STREAM_LADDER', DEFAULT_LADDER)
+        app.extensions['broadcasts'] = self
+
+    def get(self, key):
+        with self._lock:
+            return self._feeds.get(key)
+
+    def get_or_create(self, key, source_factory=None):
+        with self._lock:
+            feed = self._feeds.get(key)
+            if feed is None or feed.buffer.closed:
+                feed = self._feeds[key] = Broadcaster(key, self.ladder, source_factory, on_stop=self._remove)
+                feed.start()
+            return feed
+
+    def discard(self, key):
+        with self._lock:
+            feed = self._feeds.pop(key, None)
+        if feed is not None:
+            feed.buffer.close()
+
+    def _remove(self, feed):
+        with self._lock:
+            if self._feeds.get(feed.key) is feed:
+                del self._feeds[feed.key]
+
+broadcasts = BroadcastRegistry()
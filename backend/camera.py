@@ -1,53 +1,118 @@
 import cv2
 
+from instrumentation import frame_seconds
+
 # Global variable to store the latest status for the frontend API
+# (only used by the local webcam feed; browser sessions keep their own verdicts)
 last_status = "Safe"
 
+STATUS_TEXT = {
+    "safe": "Safe",
+    "missing": "No Face Detected",
+    "multiple": "Multiple People",
+    "looking_away": "Looking Away",
+}
+
+def load_cascade():
+    return cv2.CascadeClassifier(
+        cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+    )
+
+# Detection / classification defaults (offline_analysis.py can override them for tuning)
+MIN_FACE_SIZE = 60
+AWAY_DIVISOR = 4
+
+def detect_faces(face_cascade, gray, scale=1.0, min_size=MIN_FACE_SIZE):
+    with frame_seconds.time('detect'):
+        return _detect_faces(face_cascade, gray, scale, min_size)
+
+def _detect_faces(face_cascade, gray, scale, min_size):
+    # Optionally run the cascade on a downscaled copy and map boxes back
+    if scale >= 1.0:
+        faces = face_cascade.detectMultiScale(gray, 1.1, 5, minSize=(min_size, min_size))
+        return [tuple(int(v) for v in f) for f in faces]
+
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    min_side = max(1, int(round(min_size * scale)))
+    faces = face_cascade.detectMultiScale(small, 1.1, 5, minSize=(min_side, min_side))
+    return [tuple(int(round(v / scale)) for v in f) for f in faces]
+
+def classify_faces(faces, width, away_divisor=AWAY_DIVISOR):
+    if len(faces) == 0:
+        return "missing"
+    if len(faces) > 1:
+        return "multiple"
+
+    # The face centre must lie in the middle band (outer 1/divisor on each side is "away")
+    center_x_min = width // away_divisor
+    center_x_max = (away_divisor - 1) * (width // away_divisor)
+    x, y, w, h = faces[0]
+    face_center_x = x + (w // 2)
+    if face_center_x < center_x_min or face_center_x > center_x_max:
+        return "looking_away"
+    return "safe"
+
+def annotate_frame(img, faces, status):
+    with frame_seconds.time('annotate'):
+        return _annotate_frame(img, faces, status)
+
+def _annotate_frame(img, faces, status):
+    color = (0, 0, 255) if status != "safe" else (0, 255, 0)
+    # Boxes are only drawn for a single candidate, same as the original feed
+    if len(faces) == 1:
+        x, y, w, h = faces[0]
+        cv2.rectangle(img, (x, y), (x+w, y+h), color, 2)
+
+    # Draw visual text on video as backup
+    cv2.putText(img, STATUS_TEXT[status], (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+    return img
+
+def analyze_frame(img, face_cascade, scale=1.0, min_size=MIN_FACE_SIZE, away_divisor=AWAY_DIVISOR):
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    faces = detect_faces(face_cascade, gray, scale, min_size)
+    status = classify_faces(faces, img.shape[1], away_divisor)
+    return status, faces
+
 class VideoCamera:
-    def __init__(self):
-        self.video = cv2.VideoCapture(0)
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
+    def __init__(self, sampler=None, source=0):
+        # source: camera index, or a recorded video file (benchmarks, offline runs)
+        self.video = cv2.VideoCapture(source)
+        self.face_cascade = load_cascade()
+        # Optional AdaptiveSampler (sampling.py) that skips the cascade on unchanged frames
+        self.sampler = sampler
+        self._has_frame = False
+        self._last_jpeg = None
 
     def __del__(self):
         self.video.release()
 
-    def get_frame(self):
+    def read_annotated(self):
+        # Returns (ok, annotated image); the image is None when the scene is unchanged
         global last_status
         success, img = self.video.read()
         if not success:
-            return None
+            return False, None
 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.1, 5, minSize=(60, 60))
-
-        height, width, _ = img.shape
-        center_x_min = width // 4
-        center_x_max = 3 * (width // 4)
-        
-        status_text = "Safe"
-        
-        if len(faces) == 0:
-            status_text = "No Face Detected"
-            last_status = "missing" # Update global status
-        elif len(faces) > 1:
-            status_text = "Multiple People"
-            last_status = "multiple"
+        if self.sampler is None:
+            status, faces = analyze_frame(img, self.face_cascade)
         else:
-            last_status = "safe" # Reset to safe
-            for (x, y, w, h) in faces:
-                face_center_x = x + (w // 2)
-                if face_center_x < center_x_min or face_center_x > center_x_max:
-                    status_text = "Looking Away"
-                    last_status = "looking_away"
-                
-                # Draw Box
-                color = (0, 0, 255) if last_status != "safe" else (0, 255, 0)
-                cv2.rectangle(img, (x, y), (x+w, y+h), color, 2)
-
-        # Draw visual text on video as backup
-        cv2.putText(img, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255) if last_status != "safe" else (0, 255, 0), 2)
-
-        ret, jpeg = cv2.imencode('.jpg', img)
-        return jpeg.tobytes()
\ No newline at end of file
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            plan = self.sampler.process(gray, lambda g: detect_faces(self.face_cascade, g))
+            # Nothing moved and nothing was re-analyzed: the previous frame is still accurate
+            if plan.kind == 'skip' and not plan.changed and self._has_frame:
+                return True, None
+            status, faces = self.sampler.status, self.sampler.faces
+
+        last_status = status
+        self._has_frame = True
+        return True, annotate_frame(img, faces, status)
+
+    def get_frame(self):
+        ok, img = self.read_annotated()
+        if not ok:
+            return None
+        if img is not None:
+            with frame_seconds.time('encode'):
+                ret, jpeg = cv2.imencode('.jpg', img)
+            self._last_jpeg = jpeg.tobytes()
+        return self._last_jpeg
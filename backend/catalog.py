@@ -0,0 +1,57 @@
+import hashlib
+import threading
+import time
+
+from models import db, Exam
+from responses import dumps
+
+# --- EXAM CATALOGUE CACHE ---
+# Every dashboard load needs the same exam list, so it is built once per process
+# and shared. create_exam/delete_exam invalidate it; the TTL bounds how long
+# another worker process can serve a stale copy. A build that was already
+# running when invalidate() was called is returned but not cached (generation
+# counter, as in papers.py). The ETag is derived from the content itself, so it
+# is stable across processes.
+
+class ExamCatalog:
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._exams = None
+        self._etag = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self.ttl = 30
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('EXAM_CATALOG_TTL', 30)
+        app.extensions['exam_catalog'] = self
+
+    def get(self):
+        with self._lock:
+            if self._exams is not None and time.time() - self._loaded_at < self.ttl:
+                return self._etag, self._exams
+            generation = self._generation
+
+        exams = [{
+            'id': e.id,
+            'title': e.title,
+            'duration': e.duration_minutes,
+            'start_date': e.start_date,
+            'end_date': e.end_date,
+        } for e in db.session.execute(db.select(Exam).order_by(Exam.id)).scalars()]
+        etag = hashlib.sha1(dumps(exams)).hexdigest()
+
+        with self._lock:
+            if self._generation == generation:
+                self._exams, self._etag, self._loaded_at = exams, etag, time.time()
+        return etag, exams
+
+    def invalidate(self):
+        with self._lock:
+            self._exams = None
+            self._etag = None
+            self._generation += 1
+
+exam_catalog = ExamCatalog()
@@ -0,0 +1,136 @@
+import threading
+import time
+
+# --- WAITING THAT DOESN'T PIN THE EVENT LOOP ---
+# Long-lived responses (MJPEG feeds, server-sent events) spend their life waiting
+# for the next frame or verdict. Under the threaded server they simply block on a
+# Condition. serve.py runs the app on gevent but keeps real OS threads for the
+# proctoring workers and other background writers (cv2 must not run on the event
+# loop), so those Conditions are real locks: blocking on one would stall every
+# greenlet. In that mode a waiting greenlet parks on the hub instead, and is woken
+# through a gevent async watcher, which any OS thread may trigger: Condition below
+# sends to the watchers of its waiters on notify. Conditions and events that are
+# waited on through this module must come from here.
+
+_cooperative = False
+
+def enable():
+    global _cooperative
+    _cooperative = True
+
+def is_enabled():
+    return _cooperative
+
+def _on_loop():
+    # The gevent hub runs in the main thread; real worker threads block as usual
+    return _cooperative and threading.current_thread() is threading.main_thread()
+
+def _watcher():
+    # -> (async watcher, gevent Event it sets). Started before it is handed out,
+    # so a send() that happens before the greenlet waits is not lost.
+    import gevent
+    from gevent.event import Event as GreenEvent
+    woken = GreenEvent()
+    watcher = gevent.get_hub().loop.async_()
+    watcher.start(woken.set)
+    return watcher, woken
+
+class Condition(threading.Condition):
+    def __init__(self, lock=None):
+        super().__init__(lock)
+        self._async_waiters = set()
+
+    def _wake_greenlets(self):
+        # Caller holds the lock. Greenlets re-check their predicate, so waking all is safe.
+        for watcher in self._async_waiters:
+            watcher.send()
+
+    def notify(self, n=1):
+        super().notify(n)
+        self._wake_greenlets()
+
+    def notify_all(self):
+        super().notify_all()
+        self._wake_greenlets()
+
+class Event:
+    # threading.Event on a cooperative Condition
+    def __init__(self):
+        self._cond = Condition(threading.Lock())
+        self._flag = False
+
+    def is_set(self):
+        return self._flag
+
+    def set(self):
+        with self._cond:
+            self._flag = True
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self._flag = False
+
+    def wait(self, timeout=None):
+        return wait_for(self._cond, lambda: self._flag, timeout)
+
+def wait_for(cond, predicate, timeout=None):
+    if not _on_loop():
+        with cond:
+            return cond.wait_for(predicate, timeout)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    watcher, woken = _watcher()
+    try:
+        with cond:
+            if predicate():
+                return True
+            cond._async_waiters.add(watcher)
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                with cond:
+                    return predicate()
+            woken.wait(remaining)
+            woken.clear()
+            with cond:
+                if predicate():
+                    return True
+    finally:
+        with cond:
+            cond._async_waiters.discard(watcher)
+        watcher.close()
+
+def result(future, timeout=None):
+    # concurrent.futures.Future.result() blocks on a real Condition as well
+    if _on_loop() and not future.done():
+        watcher, woken = _watcher()
+        lock = threading.Lock()
+
+        def done(_):
+            # Runs in the executor thread, possibly after the wait gave up
+            with lock:
+                if watcher is not None:
+                    watcher.send()
+        try:
+            future.add_done_callback(done)
+            woken.wait(timeout)
+        finally:
+            with lock:
+                watcher.close()
+                watcher = None
+        # Raises TimeoutError right away if still not done
+        return future.result(0)
+    return future.result(timeout)
+
+def readable(conn, timeout):
+    # multiprocessing.connection reads straight from the fd, which gevent can't patch;
+    # wait for the fd on the hub instead
+    if not _on_loop() or conn.poll(0):
+        return conn.poll(timeout)
+    from gevent.socket import wait_read
+    try:
+        wait_read(conn.fileno(), timeout)
+    except OSError:   # socket.timeout
+        pass
+    return conn.poll(0)
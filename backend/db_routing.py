@@ -0,0 +1,83 @@
+import threading
+from collections import defaultdict
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# --- READ REPLICA ROUTING ---
+# Endpoints decorated with @read_replica run their queries on the 'replica' bind
+# when one is configured (DATABASE_REPLICA_URL). Anything that flushes, and every
+# other endpoint, keeps using the primary. Streamed bodies are wrapped in
+# keep_routing() so their queries follow the view that returned them.
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('use_replica'):
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def read_replica(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_replica = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.use_replica = False
+    return decorated_function
+
+def keep_routing(body):
+    # A streamed body is iterated after the view (and @read_replica's reset) has
+    # returned; take the view's choice along and apply it around each chunk
+    replica = g.get('use_replica', False)
+
+    def generate():
+        it = iter(body)
+        while True:
+            # Set while the body runs its queries, cleared while the chunk is out
+            g.use_replica = replica
+            try:
+                chunk = next(it)
+            except StopIteration:
+                return
+            finally:
+                g.use_replica = False
+            yield chunk
+    return generate()
+
+# --- POOL METRICS ---
+_counters = defaultdict(lambda: defaultdict(int))
+_counters_lock = threading.Lock()
+
+def _count(name, what):
+    def listener(*args):
+        with _counters_lock:
+            _counters[name][what] += 1
+    return listener
+
+def init_app(app, db):
+    with app.app_context():
+        for name, engine in db.engines.items():
+            name = name or 'primary'
+            for what in ('connect', 'checkout', 'checkin', 'invalidate'):
+                event.listen(engine, what, _count(name, what))
+
+def pool_stats(db):
+    stats = {}
+    for name, engine in db.engines.items():
+        name = name or 'primary'
+        pool = engine.pool
+        entry = {'pool': type(pool).__name__}
+        # QueuePool exposes live sizes; other pool classes only have status()
+        for attr in ('size', 'checkedin', 'checkedout', 'overflow'):
+            if hasattr(pool, attr):
+                entry[attr] = getattr(pool, attr)()
+        entry['status'] = pool.status()
+        with _counters_lock:
+            entry.update(_counters[name])
+        stats[name] = entry
+    return stats
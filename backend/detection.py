@@ -0,0 +1,114 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from camera import load_cascade, detect_faces
+
+# --- PROCESS-POOL FACE DETECTION ENGINE ---
+# detectMultiScale is CPU bound and the Python glue around it holds the GIL, so
+# detection is spread over worker processes. Every process loads the cascade once
+# (in the pool initializer) and then handles whole batches of grayscale frames.
+
+_cascade = None
+
+def _init_worker():
+    global _cascade
+    # One process per core, so keep OpenCV from spawning its own thread pool too
+    cv2.setNumThreads(1)
+    _cascade = load_cascade()
+
+def _detect_batch(grays, scale):
+    return [detect_faces(_cascade, gray, scale) for gray in grays]
+
+class DetectionEngine:
+    def __init__(self, workers=None, batch_size=8, scale=1.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.scale = scale
+        # 'spawn' so forking a threaded API process never copies held locks
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+
+    def submit(self, grays):
+        return self._pool.submit(_detect_batch, list(grays), self.scale)
+
+    def detect(self, grays):
+        grays = list(grays)
+        futures = [self.submit(grays[i:i + self.batch_size])
+                   for i in range(0, len(grays), self.batch_size)]
+        results = []
+        for f in futures:
+            results.extend(f.result())
+        return results
+
+    def warm_up(self):
+        # Make sure every worker has started and loaded its cascade
+        blank = np.zeros((120, 160), np.uint8)
+        futures = [self.submit([blank]) for _ in range(self.workers)]
+        for f in futures:
+            f.result()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+# --- CAPACITY BENCHMARK ---
+def load_frames(video=None, count=200, width=640, height=480):
+    grays = []
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(grays) < count:
+            ok, img = cap.read()
+            if not ok:
+                break
+            grays.append(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+        cap.release()
+    if not grays:
+        # Synthetic noise still exercises the full cascade search
+        rng = np.random.default_rng(0)
+        grays = [rng.integers(0, 256, (height, width), dtype=np.uint8) for _ in range(count)]
+    return grays
+
+def benchmark(grays, workers=None, batch_size=8, scale=1.0, rounds=3):
+    engine = DetectionEngine(workers=workers, batch_size=batch_size, scale=scale)
+    try:
+        engine.warm_up()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            engine.detect(grays)
+        elapsed = time.perf_counter() - start
+    finally:
+        engine.close()
+
+    fps = len(grays) * rounds / elapsed
+    return {
+        'workers': engine.workers,
+        'batch_size': batch_size,
+        'scale': scale,
+        'frames': len(grays) * rounds,
+        'seconds': round(elapsed, 3),
+        'fps': round(fps, 1),
+        'fps_per_core': round(fps / engine.workers, 1),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure face detection throughput (frames/sec per core).")
+    parser.add_argument('--video', help="Recorded video to sample frames from (default: synthetic frames)")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--scale', type=float, nargs='+', default=[1.0, 0.5])
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames)
+    for scale in args.scale:
+        r = benchmark(frames, args.workers, args.batch_size, scale)
+        print(f"scale={r['scale']:<4} workers={r['workers']:<3} batch={r['batch_size']:<3} "
+              f"{r['fps']:>8} fps  {r['fps_per_core']:>7} fps/core")
@@ -0,0 +1,273 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import insert, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Question, Result
+from autosave import autosave
+
+logger = logging.getLogger(__name__)
+
+# --- PRECOMPUTED ANSWER KEYS ---
+# An exam's answer key is loaded once (two columns, no ORM objects) and kept as
+# compact arrays: question ids and the correct option encoded as small ints.
+# Grading a submission (or a whole batch of them) is then one array comparison.
+# add/update/delete_question invalidate the exam's key; ANSWER_KEY_TTL bounds how
+# long another worker process can keep a stale one.
+
+UNANSWERED = 0
+UNKNOWN = 255
+
+def encode_mask(question_ids, mask):
+    # uint32 count, uint32 question ids, then the correct flags packed 8 per byte
+    ids = np.asarray(question_ids, dtype='<u4')
+    return np.array([len(ids)], dtype='<u4').tobytes() + ids.tobytes() + np.packbits(mask).tobytes()
+
+def decode_mask(blob):
+    n = int(np.frombuffer(blob, dtype='<u4', count=1)[0])
+    ids = np.frombuffer(blob, dtype='<u4', count=n, offset=4).astype(np.int64)
+    mask = np.unpackbits(np.frombuffer(blob, dtype=np.uint8, offset=4 + 4 * n))[:n].astype(bool)
+    return ids, mask
+
+class AnswerKey:
+    def __init__(self, exam_id, rows):
+        self.exam_id = exam_id
+        self.question_ids = np.array([qid for qid, _ in rows], dtype=np.int64)
+        self.index = {str(qid): i for i, (qid, _) in enumerate(rows)}
+        # Option letters -> codes; a missing correct option is encoded like an
+        # unanswered question, so grading matches the plain equality check exactly
+        self.codes = {}
+        for _, opt in rows:
+            if opt is not None and opt not in self.codes:
+                self.codes[opt] = len(self.codes) + 1
+        self.correct = np.array([self.codes.get(opt, UNANSWERED) for _, opt in rows], dtype=np.uint8)
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def encode(self, answers):
+        row = np.zeros(len(self), dtype=np.uint8)
+        for qid, opt in answers.items():
+            pos = self.index.get(str(qid))
+            if pos is not None and opt is not None:
+                row[pos] = self.codes.get(opt, UNKNOWN)
+        return row
+
+    def grade(self, answers):
+        mask = self.encode(answers) == self.correct
+        return int(mask.sum()), mask
+
+    def grade_many(self, submissions):
+        if not submissions:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, len(self)), dtype=bool)
+        matrix = np.vstack([self.encode(a) for a in submissions])
+        masks = matrix == self.correct
+        return masks.sum(axis=1), masks
+
+class AnswerKeyCache:
+    def __init__(self, app=None):
+        self._keys = {}
+        self._lock = threading.Lock()
+        self.ttl = 300
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('ANSWER_KEY_TTL', 300)
+        app.extensions['answer_keys'] = self
+
+    def get(self, exam_id):
+        with self._lock:
+            key = self._keys.get(exam_id)
+        if key is not None and time.time() - key.loaded_at < self.ttl:
+            return key
+
+        rows = db.session.query(Question.id, Question.correct_option) \
+            .filter_by(exam_id=exam_id).order_by(Question.id).all()
+        key = AnswerKey(exam_id, rows)
+        with self._lock:
+            self._keys[exam_id] = key
+        return key
+
+    def invalidate(self, exam_id):
+        with self._lock:
+            self._keys.pop(exam_id, None)
+
+answer_keys = AnswerKeyCache()
+
+# --- QUEUED SUBMISSIONS (Optional, GRADING_QUEUE_SUBMISSIONS) ---
+# When a timer runs out hundreds of submissions arrive together. In queued mode
+# the request only enqueues the answers; a background writer grades whatever
+# has accumulated per exam in one batch and inserts the Result rows with a
+# single executemany + commit. Repeats are skipped by the insert itself (ON
+# CONFLICT DO NOTHING), and the attempt's autosaved answers are deleted in the
+# same transaction, so until the batch commits they are still there. A failed
+# batch is retried submission by submission; what keeps failing is requeued with
+# backoff and, after GRADING_MAX_RETRIES, written to GRADING_FAILED_PATH.
+
+class SubmissionQueue:
+    def __init__(self, app=None):
+        self._queue = queue.Queue()
+        self._thread = None
+        self.app = None
+        self.batch_size = 500
+        self.max_wait = 0.2
+        self.max_retries = 5
+        self.failed_path = 'failed_submissions.ndjson'
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get('GRADING_BATCH_SIZE', 500)
+        self.max_wait = app.config.get('GRADING_BATCH_WAIT', 0.2)
+        self.max_retries = app.config.get('GRADING_MAX_RETRIES', 5)
+        self.failed_path = app.config.get('GRADING_FAILED_PATH', 'failed_submissions.ndjson')
+        if app.config.get('GRADING_QUEUE_SUBMISSIONS') and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='submission-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.drain)
+        app.extensions['submission_queue'] = self
+
+    @property
+    def enabled(self):
+        return self._thread is not None
+
+    def submit(self, student_id, exam_id, answers):
+        # (student, exam, answers, failed attempts so far)
+        self._queue.put((student_id, exam_id, answers, 0))
+
+    def _collect(self, block=True):
+        items = []
+        try:
+            items.append(self._queue.get(block=block))
+        except queue.Empty:
+            return items
+        deadline = time.time() + self.max_wait
+        while len(items) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            with self.app.app_context():
+                self._write_safely(items)
+
+    def drain(self):
+        with self.app.app_context():
+            while True:
+                items = self._collect(block=False)
+                if not items:
+                    return
+                self._write_safely(items, final=True)
+
+    def _write_safely(self, items, final=False):
+        try:
+            self.write(items)
+            return
+        except Exception:
+            logger.exception("Writing %d queued submissions failed", len(items))
+
+        # Isolate the submissions that fail, so one bad item can't sink the batch
+        failed = items
+        if len(items) > 1:
+            failed = []
+            for item in items:
+                try:
+                    self.write([item])
+                except Exception:
+                    failed.append(item)
+
+        for student_id, exam_id, answers, attempts in failed:
+            item = (student_id, exam_id, answers, attempts + 1)
+            if final or attempts + 1 >= self.max_retries:
+                self._park(item)
+            else:
+                timer = threading.Timer(min(30, 2 ** attempts), self._queue.put, args=(item,))
+                timer.daemon = True
+                timer.start()
+
+    def _park(self, item):
+        # Last resort: keep the answers on disk for a manual replay
+        student_id, exam_id, answers, attempts = item
+        logger.error("Giving up on the submission of student %s for exam %s after %d attempts",
+                     student_id, exam_id, attempts)
+        with open(self.failed_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'student_id': student_id, 'exam_id': exam_id, 'answers': answers,
+                                'attempts': attempts, 'failed_at': time.time()}) + '\n')
+
+    def _insert(self, rows):
+        # -> the (student_id, exam_id) pairs actually inserted; existing results are skipped
+        table = Result.__table__
+        dialect = db.engine.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            stmt = upsert(table).on_conflict_do_nothing(index_elements=['student_id', 'exam_id'])
+            return {tuple(r) for r in db.session.execute(stmt.returning(table.c.student_id, table.c.exam_id), rows)}
+        # Other databases: one savepoint per row
+        inserted = set()
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(table), row)
+                inserted.add((row['student_id'], row['exam_id']))
+            except IntegrityError:
+                pass
+        return inserted
+
+    def write(self, items):
+        # One result per student per exam: drop repeats in the batch and pairs already stored
+        pairs = {(student_id, exam_id) for student_id, exam_id, *_ in items}
+        existing = set(db.session.query(Result.student_id, Result.exam_id)
+                       .filter(tuple_(Result.student_id, Result.exam_id).in_(pairs)).all())
+
+        by_exam = defaultdict(list)
+        for student_id, exam_id, answers, *_ in items:
+            if (student_id, exam_id) in existing:
+                continue
+            existing.add((student_id, exam_id))
+            by_exam[exam_id].append((student_id, answers))
+
+        from analytics import Aggregates
+        rows = []
+        for exam_id, subs in by_exam.items():
+            key = answer_keys.get(exam_id)
+            scores, masks = key.grade_many([answers for _, answers in subs])
+            for (student_id, _), score, mask in zip(subs, scores, masks):
+                rows.append({'exam_id': exam_id, 'student_id': student_id, 'score': int(score),
+                             'total_questions': len(key), 'correct_mask': encode_mask(key.question_ids, mask)})
+        try:
+            inserted = self._insert(rows) if rows else set()
+            stats = Aggregates()
+            for row in rows:
+                if (row['student_id'], row['exam_id']) in inserted:
+                    stats.add(row['exam_id'], row['score'], row['total_questions'], row['correct_mask'])
+            # Analytics for the whole batch in a few statements, same transaction
+            stats.apply()
+            # The autosaved answers go only together with the results
+            autosave.clear_many(pairs)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(inserted)
+
+submissions = SubmissionQueue()
@@ -0,0 +1,18 @@
+import os
+
+# gunicorn -c gunicorn.conf.py 'app:create_app()'
+#
+# Proctoring sessions, video broadcasters and the caches live in process memory,
+# so keep one worker per machine unless frames of a session are routed to the
+# same worker (sticky sessions); concurrency comes from worker_connections.
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_WORKERS', 1))
+worker_class = 'serve.ProctorGeventWorker'
+worker_connections = int(os.environ.get('WEB_CONNECTIONS', 2000))
+
+# Async workers heartbeat from the event loop, so open MJPEG / event streams
+# (they last the whole exam) don't count against the timeout
+timeout = 30
+graceful_timeout = 30
+keepalive = 75
@@ -0,0 +1,242 @@
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# --- INSTRUMENTATION ---
+# Per-endpoint latency histograms, SQL statements and SQL time per request
+# (SQLAlchemy engine events), and frame-analysis timings from camera.py, all
+# exposed in Prometheus text format on GET /metrics.
+#
+# PROFILE_SLOW_REQUEST_MS > 0 turns on a sampling profiler: while a request runs,
+# a background thread samples its stack every PROFILE_INTERVAL_MS; requests slower
+# than the threshold are written to PROFILE_DIR as collapsed stacks
+# ("frame;frame;frame count"), the input format of flamegraph.pl and speedscope.
+# It samples OS threads, so use it with the threaded server (app.py).
+#
+# Nothing here imports Flask or SQLAlchemy at module level: camera.py also runs
+# inside the detection worker processes.
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FRAME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, values)) + '}'
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per bucket counts (not cumulative) + sum + count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {k: ([*v[0]], v[1], v[2]) for k, v in self._series.items()}
+        for labels, (counts, total, n) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = _labels(self.labels + ('le',), labels + (bound,))
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            base = _labels(self.labels, labels)
+            lines.append(f'{self.name}_sum{base} {total}')
+            lines.append(f'{self.name}_count{base} {n}')
+        return lines
+
+class CounterMetric:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, value=1):
+        with self._lock:
+            self._values[labels] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f'{self.name}{_labels(self.labels, k)} {v}' for k, v in values]
+        return lines
+
+request_seconds = Histogram('http_request_duration_seconds', 'Request latency by endpoint',
+                            ('endpoint', 'method'))
+request_total = CounterMetric('http_requests_total', 'Requests by endpoint and status',
+                              ('endpoint', 'method', 'status'))
+request_queries = Histogram('http_request_sql_statements', 'SQL statements executed per request',
+                            ('endpoint',), QUERY_BUCKETS)
+request_sql_seconds = Histogram('http_request_sql_seconds', 'Time spent in SQL per request', ('endpoint',))
+sql_seconds = Histogram('sql_statement_duration_seconds', 'SQL statement latency by bind', ('bind',))
+frame_seconds = Histogram('proctor_frame_stage_seconds', 'Frame analysis time by stage',
+                          ('stage',), FRAME_BUCKETS)
+slow_profiles = CounterMetric('profiler_slow_requests_total', 'Slow requests written as profiles', ('endpoint',))
+
+METRICS = [request_seconds, request_total, request_queries, request_sql_seconds,
+           sql_seconds, frame_seconds, slow_profiles]
+
+# --- SQL EVENTS ---
+# A ContextVar rather than a thread-local: under gevent many requests share a thread
+_sql = ContextVar('request_sql_stats', default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute_for(bind):
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['_query_start'].pop()
+        sql_seconds.observe(elapsed, bind)
+        stats = _sql.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+    return listener
+
+# --- SAMPLING PROFILER ---
+class SamplingProfiler:
+    def __init__(self, interval, threshold, directory):
+        self.interval = interval
+        self.threshold = threshold
+        self.directory = directory
+        self._active = {}   # thread id -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._run, name='sampling-profiler', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[_collapse(frame)] += 1
+
+    def start(self):
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def stop(self, endpoint, seconds):
+        with self._lock:
+            stacks = self._active.pop(threading.get_ident(), None)
+        if not stacks or seconds * 1000 < self.threshold:
+            return
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{int(seconds * 1000)}ms-{endpoint}.folded")
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        slow_profiles.inc(endpoint)
+        logger.info("Slow request %s took %.0f ms, profile written to %s", endpoint, seconds * 1000, path)
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+# --- FLASK WIRING ---
+def render_metrics(db=None):
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    if db is not None:
+        import db_routing
+        lines += ['# HELP db_pool_connections Connections of each pool by state', '# TYPE db_pool_connections gauge']
+        for bind, stats in db_routing.pool_stats(db).items():
+            for state in ('size', 'checkedin', 'checkedout', 'overflow'):
+                if state in stats:
+                    lines.append(f'db_pool_connections{{bind="{bind}",state="{state}"}} {stats[state]}')
+    return '\n'.join(lines) + '\n'
+
+def init_app(app, db):
+    from flask import g, request, Response
+    from sqlalchemy import event
+
+    with app.app_context():
+        for name, engine in db.engines.items():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute_for(name or 'primary'))
+
+    profiler = None
+    if app.config.get('PROFILE_SLOW_REQUEST_MS'):
+        profiler = SamplingProfiler(app.config.get('PROFILE_INTERVAL_MS', 5) / 1000.0,
+                                    app.config['PROFILE_SLOW_REQUEST_MS'],
+                                    app.config.get('PROFILE_DIR', 'profiles'))
+
+    @app.before_request
+    def start_timer():
+        g._request_start = time.perf_counter()
+        _sql.set([0, 0.0])
+        if profiler is not None:
+            profiler.start()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('_request_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or 'unmatched'
+        request_seconds.observe(elapsed, endpoint, request.method)
+        request_total.inc(endpoint, request.method, str(response.status_code))
+        stats = _sql.get()
+        if stats is not None:
+            request_queries.observe(stats[0], endpoint)
+            request_sql_seconds.observe(stats[1], endpoint)
+        # Streamed bodies run after this point; only the time to first byte is measured
+        if profiler is not None:
+            profiler.stop(endpoint, elapsed)
+        return response
+
+    @app.teardown_request
+    def clear_request_stats(exc):
+        _sql.set(None)
+        if profiler is not None:
+            # No-op unless the request failed before after_request ran
+            profiler.stop(request.endpoint or 'unmatched', 0.0)
+
+    def metrics():
+        return Response(render_metrics(db), mimetype='text/plain; version=0.0.4')
+    if app.config.get('METRICS_ENABLED', True):
+        app.add_url_rule('/metrics', 'metrics', metrics)
+
+    app.extensions['instrumentation'] = sys.modules[__name__]
@@ -0,0 +1,244 @@
+import argparse
+import sys
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from models import db, ProctorEventBlock, ProctorSummary, ExamStats, ExamScoreBucket, QuestionStats, SavedAnswer
+from partitions import PARTITIONED_MODELS, partition_table
+
+# --- VERSIONED SCHEMA MIGRATIONS ---
+# Replaces the one-off scripts (update_schema.py, fix.py). Applied versions are
+# recorded in the schema_version table; every step is also idempotent, so a
+# database built with db.create_all() can be upgraded safely.
+#
+#   python migrations.py status
+#   python migrations.py upgrade [--concurrently] [--dedupe-results] [--partition-exams N]
+#   python migrations.py check-plans
+#
+# --concurrently builds indexes with CREATE INDEX CONCURRENTLY on PostgreSQL so a
+# live database keeps accepting writes while they are built. Migration 7 rebuilds
+# result and proctor_event_block as partitioned tables (partitions.py) in one
+# transaction; it holds an exclusive lock while the rows are copied.
+
+class MigrationContext:
+    def __init__(self, engine, concurrently=False, dedupe_results=False, partition_exams=50):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.concurrently = concurrently and self.dialect == 'postgresql'
+        self.dedupe_results = dedupe_results
+        self.partition_exams = partition_exams
+
+    def execute(self, sql, **params):
+        with self.engine.begin() as conn:
+            return conn.execute(text(sql), params)
+
+    def has_table(self, table):
+        return inspect(self.engine).has_table(table)
+
+    def has_column(self, table, column):
+        return column in {c['name'] for c in inspect(self.engine).get_columns(table)}
+
+    def has_index(self, table, name):
+        insp = inspect(self.engine)
+        names = {i['name'] for i in insp.get_indexes(table)}
+        names |= {u['name'] for u in insp.get_unique_constraints(table)}
+        return name in names
+
+    def create_index(self, name, table, columns, unique=False):
+        if self.dialect == 'postgresql':
+            # A failed CONCURRENTLY build leaves an INVALID index behind; rebuild it
+            invalid = self.execute(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid", name=name
+            ).first()
+            if invalid:
+                self._autocommit(f'DROP INDEX {"CONCURRENTLY " if self.concurrently else ""}{name}')
+        if self.has_index(table, name):
+            return False
+
+        sql = (f'CREATE {"UNIQUE " if unique else ""}INDEX '
+               f'{"CONCURRENTLY " if self.concurrently else ""}IF NOT EXISTS '
+               f'{name} ON "{table}" ({", ".join(columns)})')
+        if self.concurrently:
+            self._autocommit(sql)
+        else:
+            self.execute(sql)
+        return True
+
+    def _autocommit(self, sql):
+        # CONCURRENTLY cannot run inside a transaction block
+        with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text(sql))
+
+# --- MIGRATION STEPS ---
+def add_exam_end_date(ctx):
+    if not ctx.has_column('exam', 'end_date'):
+        default = ' DEFAULT NOW()' if ctx.dialect == 'postgresql' else ''
+        ctx.execute(f'ALTER TABLE exam ADD COLUMN end_date TIMESTAMP{default}')
+
+def create_proctoring_tables(ctx):
+    db.metadata.create_all(ctx.engine, tables=[ProctorEventBlock.__table__, ProctorSummary.__table__])
+
+def add_hot_path_indexes(ctx):
+    ctx.create_index('ix_question_exam_id', 'question', ['exam_id'])
+    ctx.create_index('ix_result_exam_id', 'result', ['exam_id'])
+
+def unique_result_per_attempt(ctx):
+    dupes = ctx.execute(
+        'SELECT student_id, exam_id, COUNT(*) FROM result '
+        'GROUP BY student_id, exam_id HAVING COUNT(*) > 1'
+    ).fetchall()
+    if dupes:
+        if not ctx.dedupe_results:
+            raise RuntimeError(
+                f"{len(dupes)} student/exam pairs have more than one result. "
+                "Re-run with --dedupe-results to keep only the first submission of each."
+            )
+        ctx.execute(
+            'DELETE FROM result WHERE id NOT IN ('
+            'SELECT MIN(id) FROM result GROUP BY student_id, exam_id)'
+        )
+
+    ctx.create_index('uq_result_student_exam', 'result', ['student_id', 'exam_id'], unique=True)
+    if ctx.dialect == 'postgresql':
+        exists = ctx.execute(
+            "SELECT 1 FROM pg_constraint WHERE conname = 'uq_result_student_exam'"
+        ).first()
+        if not exists:
+            # Promote the (possibly concurrently built) index to a real constraint
+            ctx.execute('ALTER TABLE result ADD CONSTRAINT uq_result_student_exam '
+                        'UNIQUE USING INDEX uq_result_student_exam')
+
+def create_analytics_tables(ctx):
+    if not ctx.has_column('result', 'correct_mask'):
+        blob = 'BYTEA' if ctx.dialect == 'postgresql' else 'BLOB'
+        ctx.execute(f'ALTER TABLE result ADD COLUMN correct_mask {blob}')
+    db.metadata.create_all(ctx.engine, tables=[
+        ExamStats.__table__, ExamScoreBucket.__table__, QuestionStats.__table__
+    ])
+
+def create_saved_answers(ctx):
+    db.metadata.create_all(ctx.engine, tables=[SavedAnswer.__table__])
+
+def partition_by_exam(ctx):
+    if ctx.dialect != 'postgresql':
+        return    # SQLite has no partitioning; the tables stay as they are
+    with ctx.engine.begin() as conn:
+        for model in PARTITIONED_MODELS:
+            partition_table(conn, model.__tablename__, ctx.partition_exams)
+
+MIGRATIONS = [
+    (1, 'exam.end_date column', add_exam_end_date),
+    (2, 'proctoring timeline tables', create_proctoring_tables),
+    (3, 'indexes on question.exam_id and result.exam_id', add_hot_path_indexes),
+    (4, 'one result per student per exam', unique_result_per_attempt),
+    (5, 'exam analytics tables and result.correct_mask', create_analytics_tables),
+    (6, 'autosaved answers table', create_saved_answers),
+    (7, 'partition result and proctor_event_block by exam', partition_by_exam),
+]
+
+# --- RUNNER ---
+def _ensure_version_table(ctx):
+    ctx.execute('CREATE TABLE IF NOT EXISTS schema_version ('
+                'version INTEGER PRIMARY KEY, name VARCHAR(200), applied_at TIMESTAMP)')
+
+def applied_versions(ctx):
+    _ensure_version_table(ctx)
+    return {r[0] for r in ctx.execute('SELECT version FROM schema_version')}
+
+def upgrade(engine, concurrently=False, dedupe_results=False, partition_exams=50):
+    ctx = MigrationContext(engine, concurrently, dedupe_results, partition_exams)
+    done = applied_versions(ctx)
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version in done:
+            continue
+        print(f"⏫ {version:03d} {name}...")
+        step(ctx)
+        ctx.execute('INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)',
+                    v=version, n=name, t=datetime.utcnow())
+        applied.append(version)
+    return applied
+
+def status(engine):
+    ctx = MigrationContext(engine)
+    done = applied_versions(ctx)
+    return [(version, name, version in done) for version, name, _ in MIGRATIONS]
+
+# --- QUERY PLAN REGRESSION CHECK ---
+# The hot queries must be answered from an index. Postgres would happily seq scan
+# a tiny dev table, so sequential scans are disabled for the check: a plan that
+# still scans the whole table has no usable index.
+HOT_QUERIES = [
+    ('attempted exams of a student', 'result',
+     'SELECT exam_id FROM result WHERE student_id = :sid', {'sid': 1}),
+    ('one attempt', 'result',
+     'SELECT id FROM result WHERE student_id = :sid AND exam_id = :eid', {'sid': 1, 'eid': 1}),
+    ('results of an exam', 'result',
+     'SELECT r.id, u.username FROM result r JOIN "user" u ON r.student_id = u.id WHERE r.exam_id = :eid',
+     {'eid': 1}),
+    ('questions of an exam', 'question',
+     'SELECT id, correct_option FROM question WHERE exam_id = :eid', {'eid': 1}),
+    ('timeline blocks of an attempt', 'proctor_event_block',
+     'SELECT payload FROM proctor_event_block WHERE exam_id = :eid AND student_id = :sid '
+     'AND first_ts <= :t ORDER BY first_ts', {'eid': 1, 'sid': 1, 't': 0.0}),
+]
+
+def _full_scans(engine, sql, params):
+    with engine.connect() as conn:
+        if engine.dialect.name == 'postgresql':
+            conn.execute(text('SET LOCAL enable_seqscan = off'))
+            plan = conn.execute(text('EXPLAIN (FORMAT JSON) ' + sql), params).scalar()
+            nodes, scans = [plan[0]['Plan']], []
+            while nodes:
+                node = nodes.pop()
+                if node.get('Node Type') == 'Seq Scan':
+                    scans.append(node.get('Relation Name'))
+                nodes.extend(node.get('Plans', []))
+            return scans, plan
+        rows = conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params).fetchall()
+        details = [r[-1] for r in rows]
+        # SQLite: 'SCAN <table>' is a full scan, 'SEARCH <table> USING INDEX' is not
+        scans = [d.split()[1] for d in details if d.startswith('SCAN ') and 'USING' not in d]
+        return scans, details
+
+def check_plans(engine):
+    failures = []
+    for name, table, sql, params in HOT_QUERIES:
+        scans, plan = _full_scans(engine, sql, params)
+        # The joined user table is looked up by primary key; only the filtered table
+        # (or one of its partitions, named <table>_e<N> / <table>_default) matters
+        aliases = {table, table[0]}
+        bad = [s for s in scans if s in aliases or s.startswith(table + '_')]
+        print(f"{'✅' if not bad else '❌'} {name}")
+        if bad:
+            failures.append((name, plan))
+    return failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Versioned schema migrations.")
+    parser.add_argument('command', choices=['upgrade', 'status', 'check-plans'])
+    parser.add_argument('--concurrently', action='store_true',
+                        help="Build indexes without blocking writes (PostgreSQL)")
+    parser.add_argument('--dedupe-results', action='store_true',
+                        help="Keep only the first result per student/exam before adding the unique constraint")
+    parser.add_argument('--partition-exams', type=int, default=None,
+                        help="Exams per partition for migration 7 (default: PARTITION_EXAMS)")
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        if args.command == 'upgrade':
+            applied = upgrade(db.engine, args.concurrently, args.dedupe_results,
+                              args.partition_exams or app.config.get('PARTITION_EXAMS', 50))
+            print(f"✅ Applied {len(applied)} migration(s)." if applied else "✅ Already up to date.")
+        elif args.command == 'status':
+            for version, name, done in status(db.engine):
+                print(f"{'✔' if done else '·'} {version:03d} {name}")
+        else:
+            failures = check_plans(db.engine)
+            for name, plan in failures:
+                print(f"\n--- {name} ---\n{plan}")
+            sys.exit(1 if failures else 0)
@@ -1,8 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from db_routing import RoutingSession
+from passwords import passwords
 
-db = SQLAlchemy()
+# RoutingSession sends @read_replica endpoints to the replica bind when configured
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -14,7 +17,7 @@ class User(db.Model):
     role = db.Column(db.String(20), default='student') 
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=passwords.method)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -39,10 +42,82 @@ class Question(db.Model):
     option_d = db.Column(db.String(200))
     correct_option = db.Column(db.String(1)) 
 
+    # Every exam page, answer key and delete filters on exam_id
+    __table_args__ = (
+        db.Index('ix_question_exam_id', 'exam_id'),
+    )
+
 class Result(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'))
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     score = db.Column(db.Integer)
     total_questions = db.Column(db.Integer)
-    date_taken = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    date_taken = db.Column(db.DateTime, default=datetime.utcnow)
+    # Graded question ids + correct bitmap (grading.encode_mask), lets analytics reverse a result
+    correct_mask = db.Column(db.LargeBinary, nullable=True)
+
+    # One result per student per exam; the unique index also serves student_id lookups
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'exam_id', name='uq_result_student_exam'),
+        db.Index('ix_result_exam_id', 'exam_id'),
+    )
+
+# --- PROCTORING TIMELINE (see timeline.py) ---
+# Status transitions are packed as fixed-width records and written in blocks,
+# one row per flushed batch of an attempt (attempt = student + exam)
+class ProctorEventBlock(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    first_ts = db.Column(db.Float, nullable=False)
+    last_ts = db.Column(db.Float, nullable=False)
+    event_count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_proctor_event_block_attempt', 'exam_id', 'student_id', 'first_ts'),
+    )
+
+# Running violation totals per attempt, updated with every flushed block
+class ProctorSummary(db.Model):
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    last_status = db.Column(db.String(20))
+    last_ts = db.Column(db.Float)
+    missing_seconds = db.Column(db.Float, default=0.0)
+    looking_away_seconds = db.Column(db.Float, default=0.0)
+    multiple_seconds = db.Column(db.Float, default=0.0)
+    missing_events = db.Column(db.Integer, default=0)
+    looking_away_events = db.Column(db.Integer, default=0)
+    multiple_events = db.Column(db.Integer, default=0)
+
+# --- EXAM ANALYTICS (see analytics.py) ---
+# Running aggregates, updated in the same transaction as each Result write/delete
+class ExamStats(db.Model):
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    score_sum = db.Column(db.BigInteger, default=0, nullable=False)
+    score_sq_sum = db.Column(db.BigInteger, default=0, nullable=False)
+    percent_sum = db.Column(db.Float, default=0.0, nullable=False)
+
+class ExamScoreBucket(db.Model):
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+class QuestionStats(db.Model):
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), nullable=False, index=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    correct = db.Column(db.Integer, default=0, nullable=False)
+
+# --- AUTOSAVED ANSWERS (see autosave.py) ---
+# Written behind by the autosave buffer; no FK on question_id so a question
+# deleted mid-exam can't fail a whole flushed batch
+class SavedAnswer(db.Model):
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    question_id = db.Column(db.Integer, primary_key=True)
+    answer = db.Column(db.String(1))
+    saved_at = db.Column(db.Float, nullable=False)
@@ -0,0 +1,193 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+import detection
+from camera import analyze_frame, MIN_FACE_SIZE, AWAY_DIVISOR
+from timeline import AttemptState, unpack_events, verdict_confidence
+
+# --- OFFLINE ANALYSIS OF RECORDED SESSIONS ---
+# Re-scores recorded exam sessions (appeals, threshold tuning). A video is split
+# into contiguous segments that are analyzed in parallel on a process pool (one
+# preloaded cascade per process, as in detection.py). Within a segment only every
+# step-th frame is decoded; the others are just grab()bed. Each analyzed frame goes
+# through camera.analyze_frame, the same code as the live analyzer, so a frame gets
+# the same verdict here as it would live. Segments are merged in order and turned
+# into the per-attempt timeline with the live rules (transitions only, confidence
+# from the last 5 verdicts).
+#
+#   python offline_analysis.py VIDEO [VIDEO ...] [--fps 5] [--workers N]
+#       [--min-size 60] [--away-divisor 4] [--scale 1.0] [--json]
+#       [--save --exam ID --student ID --start-ts UNIX_TS]
+
+RECENT = 5
+
+def _open(path, start):
+    cap = cv2.VideoCapture(path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        # Some containers can't seek exactly; fall back to grabbing up to the start
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+            cap.release()
+            cap = cv2.VideoCapture(path)
+            for _ in range(start):
+                if not cap.grab():
+                    break
+    return cap
+
+def _analyze_segment(path, start, end, step, scale, min_size, away_divisor):
+    # Runs in a pool process: -> [(frame index, status, faces)]
+    cap = _open(path, start)
+    out = []
+    try:
+        for idx in range(start, end):
+            if not cap.grab():
+                break
+            if idx % step:
+                continue
+            ok, img = cap.retrieve()
+            if not ok:
+                continue
+            status, faces = analyze_frame(img, detection._cascade, scale, min_size, away_divisor)
+            out.append((idx, status, faces))
+    finally:
+        cap.release()
+    return out
+
+def video_info(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Cannot open {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        return fps, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+def build_timeline(samples, end_ts=None):
+    # samples: ordered (ts, status, faces). Goes through the same AttemptState rules
+    # as the live TimelineRecorder, with the live confidence (ProctorManager)
+    state = AttemptState()
+    recent = deque(maxlen=RECENT)
+    for ts, status, faces in samples:
+        recent.append(status)
+        state.transition(ts, status, faces, verdict_confidence(recent, status))
+
+    last_status = state.status
+    if end_ts is not None:
+        state.close(end_ts)
+    summary = {k: round(v, 2) if k.endswith('_seconds') else v for k, v in state.delta.items()}
+    summary['last_status'] = last_status
+    return list(unpack_events(b''.join(state.pending))), summary
+
+class OfflineAnalyzer:
+    def __init__(self, workers=None, scale=1.0, min_size=MIN_FACE_SIZE, away_divisor=AWAY_DIVISOR):
+        self.workers = workers or os.cpu_count() or 1
+        self.scale = scale
+        self.min_size = min_size
+        self.away_divisor = away_divisor
+        self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                         mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=detection._init_worker)
+
+    def analyze(self, path, fps=5.0, start_ts=0.0, segments=None):
+        started = time.perf_counter()
+        video_fps, frame_count = video_info(path)
+        step = max(1, int(round(video_fps / fps))) if fps else 1
+
+        # Contiguous segments aligned to the step, a few per worker to balance load
+        if frame_count > 0:
+            segments = segments or self.workers * 4
+            per_segment = max(step, math.ceil(frame_count / (segments * step)) * step)
+            bounds = [(s, min(s + per_segment, frame_count)) for s in range(0, frame_count, per_segment)]
+        else:
+            # Unknown length (some streams): one segment read to the end
+            bounds = [(0, 2 ** 62)]
+        futures = [self._pool.submit(_analyze_segment, path, s, e, step,
+                                     self.scale, self.min_size, self.away_divisor) for s, e in bounds]
+
+        samples = []
+        for future in futures:
+            samples += [(start_ts + idx / video_fps, status, faces) for idx, status, faces in future.result()]
+        duration = frame_count / video_fps if frame_count > 0 else \
+            (samples[-1][0] - start_ts + 1 / video_fps if samples else 0.0)
+        events, summary = build_timeline(samples, start_ts + duration)
+
+        elapsed = time.perf_counter() - started
+        return {
+            'video': path,
+            'video_fps': round(video_fps, 2),
+            'duration_seconds': round(duration, 2),
+            'frames_analyzed': len(samples),
+            'seconds': round(elapsed, 2),
+            'realtime_factor': round(duration / elapsed, 1) if elapsed else None,
+            'events': events,
+            'summary': summary,
+            'samples': samples,
+        }
+
+    def close(self):
+        self._pool.shutdown()
+
+def save_timeline(result, student_id, exam_id):
+    # Replays the analyzed frames into the regular timeline (needs an app context).
+    # Replaces what the attempt already has, so running it again doesn't double up.
+    from models import db, ProctorEventBlock, ProctorSummary
+    from timeline import timeline
+    timeline.discard(exam_id=exam_id, student_id=student_id)
+    for model in (ProctorEventBlock, ProctorSummary):
+        db.session.query(model).filter_by(exam_id=exam_id, student_id=student_id).delete(synchronize_session=False)
+    db.session.commit()
+
+    recent = deque(maxlen=RECENT)
+    for ts, status, faces in result['samples']:
+        recent.append(status)
+        timeline.record(student_id, exam_id, status, faces, verdict_confidence(recent, status), ts=ts)
+    end_ts = result['samples'][-1][0] if result['samples'] else None
+    timeline.close_attempt(student_id, exam_id, ts=end_ts)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-score recorded exam sessions.")
+    parser.add_argument('videos', nargs='+')
+    parser.add_argument('--fps', type=float, default=5.0, help="Frames analyzed per second of video (0 = all)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--min-size', type=int, default=MIN_FACE_SIZE, help="Smallest face side in pixels")
+    parser.add_argument('--away-divisor', type=int, default=AWAY_DIVISOR,
+                        help="Face centre in the outer width/N on either side counts as looking away")
+    parser.add_argument('--json', action='store_true', help="Print full results (events included) as JSON")
+    parser.add_argument('--save', action='store_true', help="Store the timeline for --exam/--student")
+    parser.add_argument('--exam', type=int)
+    parser.add_argument('--student', type=int)
+    parser.add_argument('--start-ts', type=float, default=0.0, help="Unix time of the first frame")
+    args = parser.parse_args()
+    if args.save and (args.exam is None or args.student is None or len(args.videos) != 1):
+        parser.error("--save needs --exam, --student and exactly one video")
+
+    analyzer = OfflineAnalyzer(args.workers, args.scale, args.min_size, args.away_divisor)
+    try:
+        results = [analyzer.analyze(v, args.fps, args.start_ts) for v in args.videos]
+    finally:
+        analyzer.close()
+
+    if args.save:
+        from app import create_app
+        app = create_app()
+        with app.app_context():
+            save_timeline(results[0], args.student, args.exam)
+
+    if args.json:
+        print(json.dumps([{k: v for k, v in r.items() if k != 'samples'} for r in results], indent=2))
+    else:
+        for r in results:
+            s = r['summary']
+            print(f"{r['video']}: {r['duration_seconds']}s of video, {r['frames_analyzed']} frames in "
+                  f"{r['seconds']}s ({r['realtime_factor']}x realtime), {len(r['events'])} events")
+            print("   " + "  ".join(f"{v}: {s[f'{v}_events']} events / {s[f'{v}_seconds']}s" for v in VIOLATIONS))
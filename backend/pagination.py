@@ -0,0 +1,137 @@
+import base64
+import csv
+import io
+import json
+
+from flask import request, jsonify, Response, stream_with_context
+
+from models import db
+from db_routing import keep_routing
+from responses import dumps_str, wants_msgpack, pack_stream, MSGPACK_MIMETYPE
+
+# --- KEYSET PAGINATION + STREAMED LISTINGS ---
+# List endpoints describe their output as a field map (name -> (column, formatter))
+# and hand over a function that adds FROM/JOIN/WHERE to a select. Then:
+#   ?limit=N[&cursor=...]   one keyset page: {"items": [...], "next_cursor": ...}
+#   (no limit)              the full list, streamed as a JSON array from a
+#                           server-side cursor instead of being built in memory
+#   ?fields=a,b             only those fields (any mode)
+# MessagePack clients get the stream as one object per row (see responses.py).
+# Cursors are opaque; they encode the last key seen, so pages never use OFFSET.
+
+MAX_LIMIT = 1000
+STREAM_BATCH = 1000
+
+class ListingError(ValueError):
+    pass
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ListingError("Invalid cursor")
+
+def parse_fields(field_map):
+    requested = request.args.get('fields')
+    if not requested:
+        return list(field_map)
+    fields = [f.strip() for f in requested.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in field_map]
+    if unknown:
+        raise ListingError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def _row_dict(row, fields, field_map):
+    out = {}
+    for name in fields:
+        value = row._mapping[name]
+        formatter = field_map[name][1]
+        out[name] = formatter(value) if formatter and value is not None else value
+    return out
+
+def build_select(key_column, field_map, fields, apply):
+    columns = [field_map[f][0].label(f) for f in fields]
+    return apply(db.select(*columns, key_column.label('_key')))
+
+def keyset_page(key_column, field_map, apply, fields, limit, cursor=None):
+    stmt = build_select(key_column, field_map, fields, apply)
+    if cursor:
+        key = decode_cursor(cursor)
+        # Keys are integer ids; anything else is a tampered cursor, not a server error
+        if not isinstance(key, int) or isinstance(key, bool):
+            raise ListingError("Invalid cursor")
+        stmt = stmt.where(key_column > key)
+    rows = db.session.execute(stmt.order_by(key_column).limit(limit + 1)).all()
+    next_cursor = encode_cursor(rows[limit - 1]._mapping['_key']) if len(rows) > limit else None
+    return [_row_dict(r, fields, field_map) for r in rows[:limit]], next_cursor
+
+def stream_rows(key_column, field_map, apply, fields):
+    # yield_per turns on server-side cursors (stream_results) where the driver supports it
+    stmt = build_select(key_column, field_map, fields, apply).order_by(key_column)
+    for row in db.session.execute(stmt.execution_options(yield_per=STREAM_BATCH)):
+        yield _row_dict(row, fields, field_map)
+
+def stream_json_array(rows):
+    yield '['
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + dumps_str(row)
+    yield ']'
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield dumps_str(row) + '\n'
+
+def stream_csv(rows, fields):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() > 64 * 1024:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+def list_response(key_column, field_map, apply):
+    try:
+        fields = parse_fields(field_map)
+        limit = request.args.get('limit', type=int)
+        if limit is not None:
+            limit = max(1, min(limit, MAX_LIMIT))
+            items, next_cursor = keyset_page(key_column, field_map, apply, fields, limit,
+                                             request.args.get('cursor'))
+            return jsonify(items=items, next_cursor=next_cursor), 200
+    except ListingError as e:
+        return jsonify(message=str(e)), 400
+
+    rows = stream_rows(key_column, field_map, apply, fields)
+    if wants_msgpack():
+        body, mimetype = pack_stream(rows), MSGPACK_MIMETYPE
+    else:
+        body, mimetype = stream_json_array(rows), 'application/json'
+    response = Response(stream_with_context(keep_routing(body)), mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+def export_response(key_column, field_map, apply, filename):
+    try:
+        fields = parse_fields(field_map)
+    except ListingError as e:
+        return jsonify(message=str(e)), 400
+
+    fmt = request.args.get('format', 'ndjson')
+    rows = stream_rows(key_column, field_map, apply, fields)
+    if fmt == 'csv':
+        body, mimetype = stream_csv(rows, fields), 'text/csv'
+    elif fmt == 'ndjson':
+        body, mimetype = stream_ndjson(rows), 'application/x-ndjson'
+    elif fmt == 'msgpack' and wants_msgpack():
+        body, mimetype = pack_stream(rows), MSGPACK_MIMETYPE
+    else:
+        return jsonify(message="Unsupported format"), 400
+    return Response(stream_with_context(keep_routing(body)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'})
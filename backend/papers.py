@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+
+import cooperative
+from models import db, Question
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+# --- PRE-SERIALIZED QUESTION PAPERS ---
+# Every student of an exam gets the same question list, so it is serialized and
+# compressed once per exam (when the exam is published, or on first request)
+# instead of once per request. Question edits invalidate the paper; the TTL
+# bounds how long another worker process can serve a stale copy.
+#
+# With PAPER_VARIANTS > 1, students are spread over that many shuffled variants
+# (question order and option order) chosen by a deterministic seed, so every
+# variant is still a shared, cacheable payload. Options keep their letter keys;
+# the 'order' list only says how to display them, so grading is unchanged.
+
+LETTERS = ('A', 'B', 'C', 'D')
+
+class Paper:
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.encoded = {'gzip': gzip.compress(body, 6)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(body, quality=9)
+
+    def representation(self, accept_encodings):
+        # -> (encoding or None, bytes, etag); each encoding has its own strong ETag
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encoded and accept_encodings[encoding]:
+                return encoding, self.encoded[encoding], f"{self.etag}-{encoding}"
+        return None, self.body, self.etag
+
+class ExamPapers:
+    def __init__(self, variants):
+        self.variants = variants
+        self.built_at = time.time()
+
+    def for_student(self, exam_id, student_id):
+        if len(self.variants) == 1 or student_id is None:
+            return self.variants[0]
+        return self.variants[variant_for(exam_id, student_id, len(self.variants))]
+
+def variant_for(exam_id, student_id, count):
+    digest = hashlib.sha1(f"{exam_id}:{student_id}".encode()).digest()
+    return int.from_bytes(digest[:4], 'big') % count
+
+def serialize(questions, seed=None):
+    items = [{
+        'id': q.id,
+        'text': q.text,
+        'options': {'A': q.option_a, 'B': q.option_b, 'C': q.option_c, 'D': q.option_d},
+    } for q in questions]
+    if seed is not None:
+        rng = random.Random(seed)
+        rng.shuffle(items)
+        for item in items:
+            order = list(LETTERS)
+            rng.shuffle(order)
+            item['order'] = order
+    return json.dumps(items, separators=(',', ':')).encode()
+
+class PaperCache:
+    def __init__(self, app=None):
+        self._papers = {}
+        self._lock = threading.Lock()
+        self._building = {}
+        self._generation = {}
+        self.ttl = 300
+        self.variants = 1
+        self.cache_control = 'private, no-cache'
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('PAPER_TTL', 300)
+        self.variants = max(1, app.config.get('PAPER_VARIANTS', 1))
+        self.cache_control = app.config.get('PAPER_CACHE_CONTROL', self.cache_control)
+        app.extensions['papers'] = self
+
+    def build(self, exam_id):
+        questions = db.session.execute(
+            db.select(Question).filter_by(exam_id=exam_id).order_by(Question.id)
+        ).scalars().all()
+        # Variant 0 is always the unshuffled paper (admins, previews)
+        bodies = [serialize(questions)]
+        bodies += [serialize(questions, seed=f"{exam_id}:{v}") for v in range(1, self.variants)]
+        return ExamPapers([Paper(b) for b in bodies])
+
+    def get(self, exam_id):
+        with self._lock:
+            papers = self._papers.get(exam_id)
+            if papers is not None and time.time() - papers.built_at < self.ttl:
+                return papers
+            # Single flight: when an exam opens, only one request builds the paper
+            event = self._building.get(exam_id)
+            owner = event is None
+            if owner:
+                event = self._building[exam_id] = cooperative.Event()
+            generation = self._generation.get(exam_id, 0)
+
+        if not owner:
+            event.wait(10)
+            with self._lock:
+                papers = self._papers.get(exam_id)
+            if papers is not None:
+                return papers
+            return self.build(exam_id)
+
+        try:
+            papers = self.build(exam_id)
+            with self._lock:
+                # A question edited while building: serve this copy, don't keep it
+                if self._generation.get(exam_id, 0) == generation:
+                    self._papers[exam_id] = papers
+            return papers
+        finally:
+            with self._lock:
+                self._building.pop(exam_id, None)
+            event.set()
+
+    def publish(self, exam_id):
+        self.invalidate(exam_id)
+        return self.get(exam_id)
+
+    def invalidate(self, exam_id):
+        with self._lock:
+            self._papers.pop(exam_id, None)
+            self._generation[exam_id] = self._generation.get(exam_id, 0) + 1
+
+papers = PaperCache()
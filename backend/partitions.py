@@ -0,0 +1,177 @@
+import logging
+import re
+import threading
+
+from sqlalchemy import text, UniqueConstraint
+
+from models import db, Result, ProctorEventBlock
+
+logger = logging.getLogger(__name__)
+
+# --- RANGE PARTITIONING BY EXAM (PostgreSQL) ---
+# result and proctor_event_block grow with every semester while the hot queries
+# only touch running exams. On PostgreSQL both are range-partitioned on exam_id
+# in blocks of PARTITION_EXAMS consecutive exams (exam ids only grow, so a block
+# is roughly a term): a query for one exam is pruned to a single small partition,
+# and blocks whose exams have all been archived (retention.py) are dropped whole.
+#
+# Migration 7 converts the existing tables; afterwards create_exam keeps
+# PARTITION_AHEAD blocks ready beyond the newest exam. A DEFAULT partition
+# catches anything outside the ranges so an insert never fails on a missing one.
+# Primary keys become (id, exam_id): PostgreSQL requires the partition key in
+# every unique constraint. SQLite keeps plain tables.
+
+PARTITIONED_MODELS = (Result, ProctorEventBlock)
+_BOUND = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+
+def is_partitioned(conn, table):
+    return conn.execute(text(
+        "SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass(:t)"
+    ), {'t': table}).scalar() is True
+
+def partition_bounds(conn, table):
+    # [(partition name, lower, upper)] of the range partitions, ordered
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:t)"
+    ), {'t': table})
+    bounds = []
+    for name, bound in rows:
+        m = _BOUND.search(bound or '')
+        if m:
+            bounds.append((name, int(m.group(1)), int(m.group(2))))
+    return sorted(bounds, key=lambda b: b[1])
+
+def default_partition(conn, table):
+    return conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:t) AND pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT'"
+    ), {'t': table}).scalar()
+
+def _create_ranges(conn, table, start, stop, size, prefix=None):
+    # PostgreSQL refuses a new range while the DEFAULT partition holds rows in it
+    # (exams created while an earlier ensure() failed). Those rows are moved into
+    # the new table before it is attached.
+    default = default_partition(conn, table)
+    created = []
+    for lower in range(start, stop, size):
+        name = f'{prefix or table}_e{lower}'
+        upper = lower + size
+        stray = default and conn.execute(text(
+            f'SELECT 1 FROM "{default}" WHERE exam_id >= :lo AND exam_id < :hi LIMIT 1'
+        ), {'lo': lower, 'hi': upper}).first()
+        if not stray:
+            conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                              f'FOR VALUES FROM ({lower}) TO ({upper})'))
+        else:
+            conn.execute(text(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+            moved = conn.execute(text(
+                f'WITH moved AS (DELETE FROM "{default}" WHERE exam_id >= :lo AND exam_id < :hi RETURNING *) '
+                f'INSERT INTO "{name}" SELECT * FROM moved'
+            ), {'lo': lower, 'hi': upper}).rowcount
+            conn.execute(text(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM ({lower}) TO ({upper})'))
+            logger.info("Moved %d row(s) of %s from the default partition into %s", moved, table, name)
+        created.append(name)
+    return created
+
+def partition_table(conn, table, size, ahead=2):
+    # Rebuilds one plain table as a partitioned one (runs inside the migration transaction)
+    if is_partitioned(conn, table):
+        return False
+    if conn.execute(text(f'SELECT 1 FROM "{table}" WHERE exam_id IS NULL LIMIT 1')).first():
+        raise RuntimeError(f"{table} has rows without exam_id; they cannot be placed in a partition")
+    meta = db.metadata.tables[table]
+    new = f'{table}_partitioned'
+    top = conn.execute(text('SELECT COALESCE(MAX(id), 0) FROM exam')).scalar()
+
+    conn.execute(text(f'CREATE TABLE "{new}" (LIKE "{table}" INCLUDING DEFAULTS) PARTITION BY RANGE (exam_id)'))
+    _create_ranges(conn, new, 0, (top // size + 1 + ahead) * size, size, prefix=table)
+    conn.execute(text(f'CREATE TABLE "{table}_default" PARTITION OF "{new}" DEFAULT'))
+    conn.execute(text(f'INSERT INTO "{new}" SELECT * FROM "{table}"'))
+
+    # The id sequence belongs to the old table; hand it over before dropping that
+    seq = conn.execute(text('SELECT pg_get_serial_sequence(:t, :c)'), {'t': table, 'c': 'id'}).scalar()
+    if seq:
+        conn.execute(text(f'ALTER SEQUENCE {seq} OWNED BY "{new}".id'))
+    conn.execute(text(f'DROP TABLE "{table}"'))
+    conn.execute(text(f'ALTER TABLE "{new}" RENAME TO "{table}"'))
+
+    conn.execute(text(f'ALTER TABLE "{table}" ADD PRIMARY KEY (id, exam_id)'))
+    for constraint in meta.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            columns = ', '.join(c.name for c in constraint.columns)
+            conn.execute(text(f'ALTER TABLE "{table}" ADD CONSTRAINT {constraint.name} UNIQUE ({columns})'))
+    for index in meta.indexes:
+        columns = ', '.join(c.name for c in index.columns)
+        conn.execute(text(f'CREATE INDEX {index.name} ON "{table}" ({columns})'))
+    for fk in meta.foreign_keys:
+        conn.execute(text(f'ALTER TABLE "{table}" ADD FOREIGN KEY ({fk.parent.name}) '
+                          f'REFERENCES "{fk.column.table.name}" ({fk.column.name})'))
+    return True
+
+def drop_empty_partitions(conn, table):
+    # Blocks with no rows left and no remaining exam in their range (all archived or deleted)
+    dropped = []
+    for name, lower, upper in partition_bounds(conn, table):
+        if conn.execute(text(f'SELECT 1 FROM "{name}" LIMIT 1')).first():
+            continue
+        if conn.execute(text('SELECT 1 FROM exam WHERE id >= :lo LIMIT 1'), {'lo': lower}).first() is None:
+            continue    # At or beyond the newest exam: a block that is still ahead
+        if conn.execute(text('SELECT 1 FROM exam WHERE id >= :lo AND id < :hi LIMIT 1'),
+                        {'lo': lower, 'hi': upper}).first():
+            continue
+        conn.execute(text(f'DROP TABLE "{name}"'))
+        dropped.append(name)
+    return dropped
+
+class ExamPartitions:
+    def __init__(self, app=None):
+        self.size = 50
+        self.ahead = 2
+        self._upper = {}    # table -> exclusive upper bound of the highest partition
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.size = app.config.get('PARTITION_EXAMS', 50)
+        self.ahead = app.config.get('PARTITION_AHEAD', 2)
+        app.extensions['exam_partitions'] = self
+
+    def ensure(self, exam_id):
+        # Called after an exam is created; cheap unless the newest block is getting close
+        if db.engine.dialect.name != 'postgresql':
+            return []
+        tables = [m.__tablename__ for m in PARTITIONED_MODELS
+                  if self._upper.get(m.__tablename__, 0) <= exam_id + self.size]
+        if not tables:
+            return []
+
+        created, uppers = [], {}
+        with self._lock:
+            try:
+                # Own connection and transaction: the DDL must not ride on the request's session
+                with db.engine.begin() as conn:
+                    conn.execute(text("SET LOCAL lock_timeout = '2s'"))
+                    for table in tables:
+                        if not is_partitioned(conn, table):
+                            uppers[table] = float('inf')   # Migration 7 not applied here
+                            continue
+                        bounds = partition_bounds(conn, table)
+                        upper = bounds[-1][2] if bounds else 0
+                        stop = (exam_id // self.size + 1 + self.ahead) * self.size
+                        if upper < stop:
+                            created += _create_ranges(conn, table, upper, stop, self.size)
+                            upper = stop
+                        uppers[table] = upper
+            except Exception:
+                # Rows land in the DEFAULT partition meanwhile; the next ensure() creates the
+                # missing ranges and moves them out (a failure here is a lock timeout or worse)
+                logger.exception("Creating partitions for exam %s failed", exam_id)
+                return []
+            self._upper.update(uppers)
+        if created:
+            logger.info("Created partitions %s", ', '.join(created))
+        return created
+
+exam_partitions = ExamPartitions()
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+import cooperative
+
+# --- PASSWORD HASHING OFF THE REQUEST PATH ---
+# scrypt/pbkdf2 are deliberately slow (tens to hundreds of ms of CPU). Hashing
+# and verification run on a bounded thread pool (hashlib releases the GIL), so a
+# login burst queues there instead of tying up every request worker; when too
+# many are already waiting, login answers 503 straight away. Unknown usernames
+# are checked against a dummy hash so they cost (and take) the same as real ones.
+#
+# PASSWORD_HASH_METHOD is any werkzeug method string ('scrypt', 'pbkdf2:sha256:600000').
+# Stored hashes made with other parameters are upgraded on the next successful login.
+
+class PasswordBusy(Exception):
+    pass
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.method = 'scrypt'
+        self.max_pending = 256
+        self.timeout = 10.0
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._method_id = None
+        self._dummy = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+        self.max_pending = app.config.get('PASSWORD_MAX_PENDING', 256)
+        self.timeout = app.config.get('PASSWORD_TIMEOUT', 10.0)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 4,
+                thread_name_prefix='password'
+            )
+        # The method part of a fresh hash, with werkzeug's defaults filled in
+        self._dummy = generate_password_hash(os.urandom(16).hex(), method=self.method)
+        self._method_id = self._dummy.split('$', 1)[0]
+        app.extensions['passwords'] = self
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PasswordBusy()
+            self._pending += 1
+        try:
+            return cooperative.result(self._executor.submit(fn, *args), self.timeout)
+        except TimeoutError:
+            raise PasswordBusy()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        if not password:
+            return False
+        if not password_hash:
+            # Same work as a real check, so response times don't reveal valid usernames
+            self._run(check_password_hash, self._dummy, password)
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return bool(password_hash) and password_hash.split('$', 1)[0] != self._method_id
+
+passwords = PasswordHasher()
+
+# --- LOGIN RATE LIMITING (Failed attempts per username and per client IP) ---
+class LoginLimiter:
+    def __init__(self, app=None):
+        self.window = 300
+        self.per_user = 10
+        self.per_ip = 100
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.window = app.config.get('LOGIN_WINDOW_SECONDS', 300)
+        self.per_user = app.config.get('LOGIN_MAX_FAILURES_PER_USER', 10)
+        self.per_ip = app.config.get('LOGIN_MAX_FAILURES_PER_IP', 100)
+        app.extensions['login_limiter'] = self
+
+    def _recent(self, key, now):
+        failures = self._failures.get(key)
+        while failures and now - failures[0] > self.window:
+            failures.popleft()
+        return failures
+
+    def retry_after(self, ip, username):
+        # Seconds until another attempt is allowed, 0 when it is allowed now
+        now = time.time()
+        wait = 0
+        with self._lock:
+            for key, limit in ((('ip', ip), self.per_ip), (('user', username), self.per_user)):
+                failures = self._recent(key, now)
+                if failures and len(failures) >= limit:
+                    wait = max(wait, int(self.window - (now - failures[0])) + 1)
+        return wait
+
+    def failure(self, ip, username):
+        now = time.time()
+        with self._lock:
+            for key in (('ip', ip), ('user', username)):
+                self._failures.setdefault(key, deque(maxlen=max(self.per_ip, self.per_user))).append(now)
+            self._maybe_sweep(now)
+
+    def success(self, username):
+        with self._lock:
+            self._failures.pop(('user', username), None)
+
+    def _maybe_sweep(self, now):
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        for key in [k for k, f in self._failures.items() if not f or now - f[-1] > self.window]:
+            del self._failures[key]
+
+login_limiter = LoginLimiter()
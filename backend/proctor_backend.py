@@ -0,0 +1,323 @@
+import logging
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client
+
+import cooperative
+from broadcast import broadcasts, BOUNDARY
+from timeline import timeline
+
+logger = logging.getLogger(__name__)
+
+# --- PROCTORING BACKENDS ---
+# The API talks to proctoring only through `proctor` below, so API processes
+# never import OpenCV unless they analyze frames themselves. PROCTOR_BACKEND:
+#   'local'   ProctorManager (proctoring.py) in this process. cv2, numpy and the
+#             cascades are imported on the first frame, or at startup with
+#             PROCTOR_PRELOAD.
+#   'remote'  A proctor_worker.py process, reached over multiprocessing.connection
+#             at PROCTOR_WORKER_ADDRESS (pickled calls, handshake with the shared
+#             PROCTOR_WORKER_AUTHKEY, which must be set). API
+#             and vision workers then scale independently.
+#   'stub'    No vision at all: every frame gets PROCTOR_STUB_STATUS (or what
+#             set_status() scripted for the session). For tests and load tests.
+
+JPEG_MAGIC = b'\xff\xd8'
+
+class ProctorUnavailable(Exception):
+    pass
+
+class ProctorSession:
+    def __init__(self, key, queue_size, sampler=None):
+        self.key = key
+        self.frames = deque(maxlen=queue_size)
+        self.sampler = sampler
+        self.scheduled = False
+        self.status = None
+        # Change sequence of the last verdict change (server push)
+        self.version = 0
+        self.faces = 0
+        self.updated_at = None
+        self.last_seen = time.time()
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_analyzed = 0
+        # Last few analyzed verdicts; agreement among them is the event confidence
+        self.recent = deque(maxlen=5)
+
+    def to_dict(self):
+        student_id, exam_id = self.key
+        return {
+            'student_id': student_id,
+            'exam_id': exam_id,
+            'status': self.status,
+            'faces': self.faces,
+            'updated_at': self.updated_at,
+            'frames_received': self.frames_received,
+            'frames_dropped': self.frames_dropped,
+            'frames_analyzed': self.frames_analyzed,
+        }
+
+# --- VERDICT BOOKKEEPING (Shared by the local manager and the stub) ---
+class VerdictBoard:
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        # Notified (and _seq bumped) only when a session's verdict changes
+        self._changed = cooperative.Condition(self._lock)
+        self._seq = 0
+
+    def _set_status(self, session, status):
+        # Caller holds _lock
+        if status != session.status:
+            self._seq += 1
+            session.version = self._seq
+            self._changed.notify_all()
+        session.status = status
+
+    def get_verdict(self, student_id, exam_id):
+        with self._lock:
+            session = self._sessions.get((student_id, exam_id))
+            return session.to_dict() if session else None
+
+    def exam_verdicts(self, exam_id):
+        with self._lock:
+            return [s.to_dict() for (sid, eid), s in self._sessions.items() if eid == exam_id]
+
+    @property
+    def sequence(self):
+        with self._lock:
+            return self._seq
+
+    def changes(self, exam_id, student_id=None, since=0, timeout=15.0):
+        # Blocks until some verdict changed after `since` (or the timeout), then
+        # returns (seq, sessions of this exam/student that changed after `since`)
+        cooperative.wait_for(self._changed, lambda: self._seq > since, timeout)
+        with self._lock:
+            changed = [s.to_dict() for (sid, eid), s in self._sessions.items()
+                       if eid == exam_id and (student_id is None or sid == student_id) and s.version > since]
+            return self._seq, changed
+
+# --- IN-PROCESS BACKENDS ---
+def _session_stream(student_id, exam_id, level, max_fps):
+    # Annotated frames are published into this process's broadcast buffers
+    return broadcasts.get_or_create(('session', student_id, exam_id)).stream(level, max_fps)
+
+class LocalBackend:
+    def __init__(self, app, preload=False):
+        self.app = app
+        self.lease_seconds = app.config.get('PROCTOR_WATCH_LEASE', 5.0)
+        self._manager = None
+        self._created = cooperative.Condition()
+        if preload:
+            self.manager()
+
+    def manager(self, create=True):
+        if self._manager is None and create:
+            with self._created:
+                if self._manager is None:
+                    from proctoring import proctor   # cv2, numpy, cascades
+                    proctor.init_app(self.app)
+                    self._manager = proctor
+                    self._created.notify_all()
+        return self._manager
+
+    def submit_frame(self, student_id, exam_id, data):
+        return self.manager().submit_frame(student_id, exam_id, data)
+
+    def get_verdict(self, student_id, exam_id):
+        manager = self.manager(create=False)
+        return manager.get_verdict(student_id, exam_id) if manager else None
+
+    def exam_verdicts(self, exam_id):
+        manager = self.manager(create=False)
+        return manager.exam_verdicts(exam_id) if manager else []
+
+    @property
+    def sequence(self):
+        manager = self.manager(create=False)
+        return manager.sequence if manager else 0
+
+    def changes(self, exam_id, student_id=None, since=0, timeout=15.0):
+        # Before the first frame there is nothing to report; wait for the manager to exist
+        deadline = time.monotonic() + timeout
+        if not cooperative.wait_for(self._created, lambda: self._manager is not None, timeout):
+            return since, []
+        return self._manager.changes(exam_id, student_id, since, max(0.0, deadline - time.monotonic()))
+
+    def close_attempt(self, student_id, exam_id):
+        timeline.close_attempt(student_id, exam_id)
+
+    def stream(self, student_id, exam_id, level='full', max_fps=None):
+        return _session_stream(student_id, exam_id, level, max_fps)
+
+    def watch_frame(self, student_id, exam_id, level, after_seq, timeout=5.0):
+        # Served to remote API processes: the next annotated JPEG after `after_seq`.
+        # The lease keeps the session annotated between two calls.
+        feed = broadcasts.get_or_create(('session', student_id, exam_id))
+        feed.lease(self.lease_seconds)
+        seq = feed.buffer.wait(after_seq, timeout)
+        return seq, feed.buffer.jpeg(level) if seq > after_seq else None
+
+class StubBackend(VerdictBoard):
+    def __init__(self, status='safe'):
+        super().__init__()
+        self.status = status
+        self._scripted = {}
+
+    def set_status(self, student_id, exam_id, status):
+        with self._lock:
+            self._scripted[(student_id, exam_id)] = status
+
+    def submit_frame(self, student_id, exam_id, data):
+        key = (student_id, exam_id)
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = ProctorSession(key, 1)
+            previous = session.status
+            status = self._scripted.get(key, self.status)
+            self._set_status(session, status)
+            session.faces = {'missing': 0, 'multiple': 2}.get(status, 1)
+            session.updated_at = session.last_seen = now
+            session.frames_received += 1
+            session.frames_analyzed += 1
+            session.recent.append(status)
+        timeline.record(student_id, exam_id, status, [(0, 0, 0, 0)] * session.faces, ts=now)
+        return previous
+
+    def close_attempt(self, student_id, exam_id):
+        timeline.close_attempt(student_id, exam_id)
+
+    def stream(self, student_id, exam_id, level='full', max_fps=None):
+        return _session_stream(student_id, exam_id, level, max_fps)
+
+# --- REMOTE BACKEND (proctor_worker.py) ---
+class RemoteBackend:
+    def __init__(self, address, authkey, timeout=5.0, max_idle=16):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _call(self, method, *args, wait=0.0):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        try:
+            if conn is None:
+                conn = Client(self.address, authkey=self.authkey)
+            conn.send((method, args))
+            if not cooperative.readable(conn, wait + self.timeout):
+                raise TimeoutError(f"{method} timed out")
+            ok, value = conn.recv()
+        except (OSError, EOFError) as e:
+            # Includes timeouts: a late reply would desync the connection, so drop it
+            if conn is not None:
+                conn.close()
+            raise ProctorUnavailable(f"Proctoring worker at {self.address}: {e}") from e
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+        if not ok:
+            raise ProctorUnavailable(value)
+        return value
+
+    def submit_frame(self, student_id, exam_id, data):
+        return self._call('submit_frame', student_id, exam_id, data)
+
+    def get_verdict(self, student_id, exam_id):
+        return self._call('get_verdict', student_id, exam_id)
+
+    def exam_verdicts(self, exam_id):
+        return self._call('exam_verdicts', exam_id)
+
+    @property
+    def sequence(self):
+        return self._call('sequence')
+
+    def changes(self, exam_id, student_id=None, since=0, timeout=15.0):
+        return self._call('changes', exam_id, student_id, since, timeout, wait=timeout)
+
+    def close_attempt(self, student_id, exam_id):
+        # The submission is already committed; a worker outage must not fail it
+        try:
+            self._call('close_attempt', student_id, exam_id)
+        except ProctorUnavailable:
+            logger.exception("Closing the timeline of %s/%s failed", student_id, exam_id)
+
+    def stream(self, student_id, exam_id, level='full', max_fps=None):
+        min_gap = 1.0 / max_fps if max_fps else 0.0
+        seq = 0
+        while True:
+            try:
+                seq, frame = self._call('watch_frame', student_id, exam_id, level, seq, 5.0, wait=5.0)
+            except ProctorUnavailable:
+                # The response has started; end the feed and let the viewer reconnect
+                logger.warning("Live feed of %s/%s ended", student_id, exam_id, exc_info=True)
+                return
+            if frame:
+                sent = time.time()
+                yield BOUNDARY + frame + b'\r\n'
+                if min_gap:
+                    time.sleep(max(0.0, min_gap - (time.time() - sent)))
+
+# --- THE FACADE THE ROUTES USE ---
+def worker_address(value):
+    # 'host:port' -> ('host', port); anything else is a Unix socket path
+    host, sep, port = value.rpartition(':')
+    return (host or 'localhost', int(port)) if sep and port.isdigit() else value
+
+class ProctorService:
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('PROCTOR_BACKEND', 'local')
+        if kind == 'remote':
+            authkey = app.config.get('PROCTOR_WORKER_AUTHKEY')
+            # The worker unpickles what it receives, so the key must be a real secret
+            if not authkey:
+                raise ValueError("PROCTOR_BACKEND=remote needs PROCTOR_WORKER_AUTHKEY")
+            self.backend = RemoteBackend(worker_address(app.config.get('PROCTOR_WORKER_ADDRESS', 'localhost:6100')),
+                                         authkey.encode(), app.config.get('PROCTOR_WORKER_TIMEOUT', 5.0))
+        elif kind == 'stub':
+            self.backend = StubBackend(app.config.get('PROCTOR_STUB_STATUS', 'safe'))
+        elif kind == 'local':
+            self.backend = LocalBackend(app, preload=app.config.get('PROCTOR_PRELOAD', False))
+        else:
+            raise ValueError(f"Unknown PROCTOR_BACKEND {kind!r}")
+        app.extensions['proctor'] = self
+
+    def submit_frame(self, student_id, exam_id, data):
+        return self.backend.submit_frame(student_id, exam_id, data)
+
+    def get_verdict(self, student_id, exam_id):
+        return self.backend.get_verdict(student_id, exam_id)
+
+    def exam_verdicts(self, exam_id):
+        return self.backend.exam_verdicts(exam_id)
+
+    @property
+    def sequence(self):
+        return self.backend.sequence
+
+    def changes(self, exam_id, student_id=None, since=0, timeout=15.0):
+        return self.backend.changes(exam_id, student_id, since, timeout)
+
+    def close_attempt(self, student_id, exam_id):
+        self.backend.close_attempt(student_id, exam_id)
+
+    def stream(self, student_id, exam_id, level='full', max_fps=None):
+        return self.backend.stream(student_id, exam_id, level, max_fps)
+
+proctor = ProctorService()
@@ -0,0 +1,121 @@
+import json
+
+from flask import Blueprint, request, jsonify, current_app, g, Response
+from auth_middleware import auth_required, staff_required, stream_auth_required
+from proctor_backend import proctor, JPEG_MAGIC, ProctorUnavailable
+from models import db
+from timeline import timeline
+
+proctor_bp = Blueprint('proctor', __name__)
+
+@proctor_bp.errorhandler(ProctorUnavailable)
+def proctor_unavailable(e):
+    # PROCTOR_BACKEND=remote and the worker is down or overloaded
+    return jsonify(message=str(e)), 503
+
+# --- 1. FRAME INGEST (Browser posts one JPEG per capture) ---
+@proctor_bp.route('/<int:exam_id>/frames', methods=['POST'])
+@auth_required
+def ingest_frame(exam_id):
+    student_id = g.current_user.id
+
+    # Accept either a multipart upload ('frame') or the raw JPEG as the body
+    if 'frame' in request.files:
+        data = request.files['frame'].read()
+    else:
+        data = request.get_data()
+
+    if not data or not data.startswith(JPEG_MAGIC):
+        return jsonify(message="Expected a JPEG frame"), 400
+    if len(data) > current_app.config.get('PROCTOR_MAX_FRAME_BYTES', 512 * 1024):
+        return jsonify(message="Frame too large"), 413
+
+    status = proctor.submit_frame(student_id, exam_id, data)
+    return jsonify(message="Queued", status=status), 202
+
+# --- 2. STATUS FOR ONE CANDIDATE (Students: their own; staff: any ?student_id=) ---
+@proctor_bp.route('/proctor_status', methods=['GET'])
+@auth_required
+def check_status():
+    user = g.current_user
+    exam_id = request.args.get('exam_id', type=int)
+    student_id = user.id if user.role == 'student' else request.args.get('student_id', type=int)
+
+    if exam_id is None or student_id is None:
+        # Legacy behaviour: status of the local webcam feed
+        from camera import last_status
+        return jsonify(status=last_status)
+
+    verdict = proctor.get_verdict(student_id, exam_id)
+    return jsonify(status=verdict['status'] if verdict and verdict['status'] else "safe"), 200
+
+# --- 2b. VERDICT PUSH (Server-sent events instead of polling /proctor_status) ---
+# One 'verdict' event per session whenever its status changes, a comment line as
+# keep-alive otherwise. Students only get their own session.
+KEEPALIVE_SECONDS = 15
+
+def _sse(event, data, event_id=None):
+    head = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _sse_response(events):
+    # Streams live for the whole exam and need neither the request nor the database:
+    # give the session's connection back now (auth_required may have loaded the
+    # user) and let the request context end with the view instead of with the stream
+    db.session.remove()
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@proctor_bp.route('/<int:exam_id>/proctor_events', methods=['GET'])
+@stream_auth_required
+def verdict_events(exam_id):
+    user = g.current_user
+    student_id = user.id if user.role == 'student' else request.args.get('student_id', type=int)
+    # Resume after a reconnect; a fresh stream starts with every current verdict
+    since = request.headers.get('Last-Event-ID', type=int) or 0
+    if since > proctor.sequence:
+        since = 0  # Id from before a server restart
+
+    def events():
+        seq = since
+        yield 'retry: 3000\n\n'
+        while True:
+            seq_now, changed = proctor.changes(exam_id, student_id, seq, timeout=KEEPALIVE_SECONDS)
+            for verdict in changed:
+                yield _sse('verdict', verdict, seq_now)
+            if not changed:
+                yield ': keep-alive\n\n'
+            seq = seq_now
+    return _sse_response(events())
+
+# --- 3. ALL LIVE SESSIONS OF AN EXAM (Proctor view) ---
+@proctor_bp.route('/<int:exam_id>/proctor_sessions', methods=['GET'])
+@staff_required
+def exam_sessions(exam_id):
+    return jsonify(proctor.exam_verdicts(exam_id)), 200
+
+# --- 4. TIMELINE OF ONE ATTEMPT (Optional ?start=&end= as unix timestamps) ---
+# Staff see every attempt, students only their own
+@proctor_bp.route('/<int:exam_id>/timeline/<int:student_id>', methods=['GET'])
+@auth_required
+def attempt_timeline(exam_id, student_id):
+    user = g.current_user
+    if user.role == 'student' and user.id != student_id:
+        return jsonify(message="Forbidden"), 403
+    try:
+        start = request.args.get('start', type=float)
+        end = request.args.get('end', type=float)
+        return jsonify(timeline.events(student_id, exam_id, start, end)), 200
+    except Exception as e:
+        return jsonify(message=str(e)), 500
+
+# --- 5. VIOLATION SUMMARIES (Whole exam, or one student) ---
+@proctor_bp.route('/<int:exam_id>/violations', methods=['GET'])
+@auth_required
+def exam_violations(exam_id):
+    user = g.current_user
+    student_id = user.id if user.role == 'student' else request.args.get('student_id', type=int)
+    try:
+        return jsonify(timeline.summaries(exam_id, student_id)), 200
+    except Exception as e:
+        return jsonify(message=str(e)), 500
@@ -0,0 +1,72 @@
+import argparse
+import logging
+import os
+import threading
+from multiprocessing.connection import Listener, AuthenticationError
+
+logger = logging.getLogger(__name__)
+
+# --- STANDALONE PROCTORING WORKER ---
+# Runs the frame analysis (ProctorManager, OpenCV, the detection pool) and the
+# proctoring timeline writer in their own process. API processes started with
+# PROCTOR_BACKEND=remote forward frames, verdict queries and live video requests
+# here (proctor_backend.RemoteBackend); one thread per API connection.
+#
+#   python proctor_worker.py [--address HOST:PORT | --address /path/to.sock]
+#
+# Listens on PROCTOR_WORKER_ADDRESS; API and worker must share
+# PROCTOR_WORKER_AUTHKEY; the worker refuses to start without it.
+
+METHODS = {'submit_frame', 'get_verdict', 'exam_verdicts', 'sequence', 'changes',
+           'close_attempt', 'watch_frame'}
+
+def _handle(app, backend, conn):
+    with conn:
+        while True:
+            try:
+                method, args = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if method not in METHODS:
+                    raise ValueError(f"Unknown method {method!r}")
+                with app.app_context():
+                    value = backend.sequence if method == 'sequence' else getattr(backend, method)(*args)
+                reply = (True, value)
+            except Exception as e:
+                logger.exception("Proctor call %s failed", method)
+                reply = (False, str(e))
+            try:
+                conn.send(reply)
+            except OSError:
+                return
+
+def serve(app, backend, address, authkey):
+    with Listener(address, authkey=authkey) as listener:
+        logger.info("Proctoring worker listening on %s", listener.address)
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError):
+                logger.warning("Rejected a proctoring connection", exc_info=True)
+                continue
+            threading.Thread(target=_handle, args=(app, backend, conn),
+                             name='proctor-conn', daemon=True).start()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Standalone proctoring worker.")
+    parser.add_argument('--address', default=None, help="HOST:PORT or a Unix socket path")
+    args = parser.parse_args()
+
+    # This process analyzes the frames itself, with OpenCV loaded up front
+    os.environ['PROCTOR_BACKEND'] = 'local'
+    os.environ['PROCTOR_PRELOAD'] = '1'
+    from app import create_app
+    from proctor_backend import proctor, worker_address
+    app = create_app()
+
+    authkey = app.config.get('PROCTOR_WORKER_AUTHKEY')
+    if not authkey:
+        raise SystemExit("PROCTOR_WORKER_AUTHKEY must be set (shared with the API processes)")
+    address = worker_address(args.address or app.config.get('PROCTOR_WORKER_ADDRESS', 'localhost:6100'))
+    serve(app, proctor.backend, address, authkey.encode())
@@ -0,0 +1,197 @@
+import logging
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from camera import load_cascade, detect_faces, classify_faces, annotate_frame
+from broadcast import broadcasts
+from timeline import timeline, verdict_confidence
+from sampling import AdaptiveSampler
+from proctor_backend import ProctorSession, VerdictBoard
+from instrumentation import frame_seconds
+
+# --- PER-SESSION PROCTORING PIPELINE ---
+# Each candidate's browser posts JPEG frames for its (student_id, exam_id) session.
+# Frames land in a small bounded queue per session (oldest frame is dropped when
+# the queue is full, the verdict only cares about the latest picture). Sessions
+# with pending frames wait in a shared ready queue; worker threads pick up several
+# sessions at a time, decode one frame from each and detect faces either in-thread
+# or as one batch on the process-pool DetectionEngine. One verdict per session.
+# With PROCTOR_SAMPLING each session also gets an AdaptiveSampler, so unchanged
+# frames never reach the cascade and tracked faces are re-found in a small ROI.
+# Only imported by proctor_backend.LocalBackend (API process or proctor_worker.py).
+
+logger = logging.getLogger(__name__)
+
+class ProctorManager(VerdictBoard):
+    def __init__(self, app=None):
+        super().__init__()
+        self._local = threading.local()
+        self._ready = queue.Queue()
+        self._threads = []
+        self._engine = None
+        self._last_sweep = time.time()
+        self.queue_size = 2
+        self.session_ttl = 300
+        self.batch_size = 1
+        self.scale = 1.0
+        self._sampler_config = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.queue_size = app.config.get('PROCTOR_QUEUE_SIZE', 2)
+        self.session_ttl = app.config.get('PROCTOR_SESSION_TTL', 300)
+        self.scale = app.config.get('PROCTOR_DETECT_SCALE', 1.0)
+        if app.config.get('PROCTOR_SAMPLING'):
+            self._sampler_config = app.config
+
+        if app.config.get('PROCTOR_ENGINE', 'thread') == 'process':
+            from detection import DetectionEngine
+            self.batch_size = app.config.get('PROCTOR_BATCH_SIZE', 8)
+            self._engine = DetectionEngine(
+                workers=app.config.get('PROCTOR_DETECT_PROCESSES'),
+                batch_size=self.batch_size,
+                scale=self.scale
+            )
+
+        if not self._threads:
+            for i in range(app.config.get('PROCTOR_WORKERS', 4)):
+                t = threading.Thread(target=self._worker, name=f'proctor-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+        app.extensions['proctor_manager'] = self
+
+    # --- INGEST ---
+    def submit_frame(self, student_id, exam_id, data):
+        key = (student_id, exam_id)
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                sampler = AdaptiveSampler.from_config(self._sampler_config) if self._sampler_config else None
+                session = self._sessions[key] = ProctorSession(key, self.queue_size, sampler)
+            if len(session.frames) == session.frames.maxlen:
+                session.frames_dropped += 1
+            session.frames.append(data)
+            session.frames_received += 1
+            session.last_seen = now
+            schedule = not session.scheduled
+            session.scheduled = True
+            self._maybe_sweep(now)
+
+        if schedule:
+            self._ready.put(session)
+        return session.status
+
+    # --- WORKERS ---
+    def _worker(self):
+        while True:
+            sessions = [self._ready.get()]
+            # Opportunistically grab more ready sessions to fill a detection batch
+            while len(sessions) < self.batch_size:
+                try:
+                    sessions.append(self._ready.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._process(sessions)
+            except Exception:
+                logger.exception("Proctor worker failed")
+            finally:
+                self._reschedule(sessions)
+
+    def _process(self, sessions):
+        batch = []
+        for session in sessions:
+            with self._lock:
+                data = session.frames.popleft() if session.frames else None
+            if data is None:
+                continue
+            with frame_seconds.time('decode'):
+                img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                continue
+            batch.append((session, img, cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)))
+
+        if not batch:
+            return
+
+        if self._sampler_config is None:
+            results = zip(batch, self._detect([gray for _, _, gray in batch]))
+            self._record((session, img, faces, True) for (session, img, _), faces in results)
+            return
+
+        # Sampled sessions: plan, detect only what the samplers ask for, commit
+        plans = [(session, img, session.sampler.plan(gray)) for session, img, gray in batch]
+
+        pending = [(s, p) for s, _, p in plans if p.kind != 'skip']
+        retry = []
+        for (session, plan), faces in zip(pending, self._detect([p.crop() for _, p in pending])):
+            if session.sampler.commit(plan, faces) is None:
+                retry.append((session, session.sampler.full_scan_plan(plan)))
+        # ROI scans that lost the face get one full-frame scan in the same round
+        for (session, plan), faces in zip(retry, self._detect([p.gray for _, p in retry])):
+            session.sampler.commit(plan, faces)
+
+        self._record((s, img, s.sampler.faces, p.kind != 'skip') for s, img, p in plans)
+
+    def _detect(self, grays):
+        if not grays:
+            return []
+        if self._engine is not None:
+            return self._engine.detect(grays)
+        cascade = self._cascade()
+        return [detect_faces(cascade, gray, self.scale) for gray in grays]
+
+    def _record(self, results):
+        now = time.time()
+        for session, img, faces, analyzed in results:
+            status = classify_faces(faces, img.shape[1])
+            with self._lock:
+                self._set_status(session, status)
+                session.faces = len(faces)
+                session.updated_at = now
+                if analyzed:
+                    session.frames_analyzed += 1
+                    session.recent.append(status)
+                confidence = verdict_confidence(session.recent, status)
+
+            # Status transitions go to the attempt's timeline (repeats are ignored there)
+            timeline.record(*session.key, status, faces, confidence, ts=now)
+
+            # Only annotate when a proctor is actually watching this candidate
+            feed = broadcasts.get(('session',) + session.key)
+            if feed is not None and feed.watched:
+                feed.buffer.publish(annotate_frame(img, faces, status))
+
+    def _reschedule(self, sessions):
+        # Sessions go to the back of the ready queue so a busy one can't starve the rest
+        for session in sessions:
+            with self._lock:
+                more = bool(session.frames)
+                session.scheduled = more
+            if more:
+                self._ready.put(session)
+
+    def _cascade(self):
+        # CascadeClassifier is not thread-safe, so every worker thread keeps its own
+        cascade = getattr(self._local, 'cascade', None)
+        if cascade is None:
+            cascade = self._local.cascade = load_cascade()
+        return cascade
+
+    def _maybe_sweep(self, now):
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        stale = [k for k, s in self._sessions.items()
+                 if now - s.last_seen > self.session_ttl and not s.scheduled]
+        for k in stale:
+            del self._sessions[k]
+            broadcasts.discard(('session',) + k)
+
+proctor = ProctorManager()
@@ -1,14 +1,18 @@
-from flask import Blueprint, request, jsonify
-from models import db, Question, Result, User, Exam
-from auth_middleware import auth_required
+from flask import Blueprint, request, jsonify, g, Response
+from sqlalchemy.exc import IntegrityError
+from models import db, Question, Result, User, Exam, QuestionStats
+from auth_middleware import auth_required, staff_required
+from proctor_backend import proctor
+from grading import answer_keys, submissions, encode_mask
+from catalog import exam_catalog
+from db_routing import read_replica
+from pagination import list_response, export_response
+from papers import papers
+from autosave import autosave, VALID_ANSWERS
+import analytics
 
 question_bp = Blueprint('questions', __name__)
 
-@question_bp.route('/proctor_status', methods=['GET'])
-def check_status():
-    from camera import last_status
-    return jsonify(status=last_status)
-
 @question_bp.route('/<int:exam_id>/questions', methods=['POST'])
 def add_question(exam_id):
     try:
@@ -18,49 +22,172 @@ def add_question(exam_id):
                          option_c=data.get('option_c'), option_d=data.get('option_d'),
                          correct_option=data.get('correct_option'))
         db.session.add(new_q)
+        db.session.flush()
+        analytics.ensure_question(new_q.id, exam_id)
         db.session.commit()
+        answer_keys.invalidate(exam_id)
+        papers.invalidate(exam_id)
         return jsonify(message="Added"), 201
     except Exception as e: return jsonify(message=str(e)), 500
 
-# --- GET QUESTIONS (Standard GET) ---
+# --- GET QUESTIONS (Pre-serialized, compressed paper, see papers.py) ---
+# Not on the replica: a cache miss builds the paper that is then served for
+# PAPER_TTL, and it must not be a lagging copy of the questions.
 @question_bp.route('/<int:exam_id>/questions', methods=['GET'])
 @auth_required
 def get_questions(exam_id):
     try:
-        questions = db.session.execute(db.select(Question).filter_by(exam_id=exam_id)).scalars().all()
-        return jsonify([{ 'id': q.id, 'text': q.text, 'options': {'A': q.option_a, 'B': q.option_b, 'C': q.option_c, 'D': q.option_d} } for q in questions]), 200
+        user = g.current_user
+        # Students get their (possibly shuffled) variant, everyone else the plain paper
+        paper = papers.get(exam_id).for_student(exam_id, user.id if user.role == 'student' else None)
+        encoding, body, etag = paper.representation(request.accept_encodings)
+        headers = {'Cache-Control': papers.cache_control, 'Vary': 'Accept-Encoding'}
+        if etag in request.if_none_match:
+            return Response(status=304, headers=dict(headers, ETag=f'"{etag}"'))
+
+        response = Response(body, mimetype='application/json', headers=headers)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        return response, 200
     except Exception as e: return jsonify(message="Error"), 500
 
+# --- PUBLISH (Makes the exam visible and builds its paper ahead of the rush) ---
+@question_bp.route('/<int:exam_id>/publish', methods=['POST'])
+@auth_required
+def publish_exam(exam_id):
+    if g.current_user.role == 'student':
+        return jsonify(message="Forbidden"), 403
+    exam = db.session.get(Exam, exam_id)
+    if not exam:
+        return jsonify(message="Not found"), 404
+    exam.is_visible = True
+    db.session.commit()
+    exam_catalog.invalidate()
+    built = papers.publish(exam_id)
+    return jsonify(message="Published", variants=len(built.variants)), 200
+
 @question_bp.route('/<int:exam_id>/submit', methods=['POST'])
 @auth_required
 def submit_exam(exam_id):
     try:
-        student_id = request.headers.get('user-id') 
-        data = request.get_json() 
-        user_answers = data.get('answers', {})
-        questions = db.session.execute(db.select(Question).filter_by(exam_id=exam_id)).scalars().all()
-        score = sum(1 for q in questions if user_answers.get(str(q.id)) == q.correct_option)
-        db.session.add(Result(exam_id=exam_id, student_id=student_id, score=score, total_questions=len(questions)))
+        student_id = g.current_user.id
+        data = request.get_json(silent=True) or {}
+        user_answers = data.get('answers')
+        if user_answers is None:
+            # Nothing resent: grade what autosave already holds for this attempt
+            user_answers = autosave.answers(student_id, exam_id)
+        # Same rules as autosave: anything else would reach the answer key and fail there
+        if not isinstance(user_answers, dict):
+            return jsonify(message="Expected {\"answers\": {question_id: option}}"), 400
+        if any(not isinstance(answer, (str, type(None))) or answer not in VALID_ANSWERS
+               for answer in user_answers.values()):
+            return jsonify(message="Answers must be A, B, C, D or null"), 400
+
+        if submissions.enabled:
+            # Graded and written in bulk by the background submission writer, which
+            # also deletes the autosaved answers once the result is committed
+            submissions.submit(student_id, exam_id, user_answers)
+            proctor.close_attempt(student_id, exam_id)
+            return jsonify(message="Submitted"), 202
+
+        key = answer_keys.get(exam_id)
+        score, mask = key.grade(user_answers)
+        correct_mask = encode_mask(key.question_ids, mask)
+        db.session.add(Result(exam_id=exam_id, student_id=student_id, score=score,
+                              total_questions=len(key), correct_mask=correct_mask))
+        try:
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify(message="Already submitted"), 409
+        autosave.clear(student_id, exam_id)
         db.session.commit()
+        # The shared analytics rows are updated in batches, outside this transaction
+        analytics.stats_writer.add(exam_id, score, len(key), correct_mask)
+        # Close the proctoring timeline so the final interval is counted
+        proctor.close_attempt(student_id, exam_id)
         return jsonify(message="Submitted"), 200
     except Exception as e: return jsonify(message=str(e)), 500
 
+# --- AUTOSAVE (Write-behind, see autosave.py) ---
+@question_bp.route('/<int:exam_id>/answers', methods=['PUT'])
+@auth_required
+def save_answers(exam_id):
+    data = request.get_json(silent=True) or {}
+    answers = data.get('answers')
+    if not isinstance(answers, dict):
+        return jsonify(message="Expected {\"answers\": {question_id: option}}"), 400
+    try:
+        answers = {int(qid): answer for qid, answer in answers.items()}
+    except (TypeError, ValueError):
+        return jsonify(message="Invalid question id"), 400
+    if any(answer not in VALID_ANSWERS for answer in answers.values()):
+        return jsonify(message="Answers must be A, B, C, D or null"), 400
+
+    saved = autosave.save(g.current_user.id, exam_id, answers)
+    # Buffered now, in the database within the flush interval
+    return jsonify(saved=saved, durable_within=autosave.flush_seconds), 202
+
+@question_bp.route('/<int:exam_id>/answers', methods=['GET'])
+@auth_required
+def get_saved_answers(exam_id):
+    return jsonify(autosave.answers(g.current_user.id, exam_id)), 200
+
+# --- RESULTS (Paginated with ?limit=&cursor=&fields=, streamed otherwise) ---
+RESULT_FIELDS = {
+    'result_id': (Result.id, None),
+    'student_name': (User.username, None),
+    'enrollment_id': (User.enrollment_id, None),
+    'score': (Result.score, None),
+    'total': (Result.total_questions, None),
+    'date': (Result.date_taken, lambda d: d.date()),
+}
+
+def _exam_results(exam_id):
+    return lambda q: q.select_from(Result).join(User, Result.student_id == User.id).filter(Result.exam_id == exam_id)
+
 @question_bp.route('/<int:exam_id>/results', methods=['GET'])
+@staff_required
+@read_replica
 def get_results(exam_id):
-    results = db.session.query(Result, User).join(User, Result.student_id == User.id).filter(Result.exam_id == exam_id).all()
-    output = [{ 'result_id': r.id, 'student_name': u.username, 'enrollment_id': u.enrollment_id, 'score': r.score, 'total': r.total_questions, 'date': r.date_taken.strftime("%Y-%m-%d") } for r, u in results]
-    return jsonify(output), 200
+    return list_response(Result.id, RESULT_FIELDS, _exam_results(exam_id))
+
+@question_bp.route('/<int:exam_id>/results/export', methods=['GET'])
+@staff_required
+@read_replica
+def export_results(exam_id):
+    # ?format=ndjson (default) or csv, streamed row by row from a server-side cursor
+    return export_response(Result.id, RESULT_FIELDS, _exam_results(exam_id), f"exam_{exam_id}_results")
+
+# --- EXAM ANALYTICS (Precomputed aggregates, see analytics.py) ---
+@question_bp.route('/<int:exam_id>/analytics', methods=['GET'])
+@staff_required
+@read_replica
+def get_analytics(exam_id):
+    data = analytics.exam_analytics(exam_id)
+    if data is None:
+        return jsonify(message="No analytics for this exam (run 'python analytics.py rebuild')"), 404
+    return jsonify(data), 200
 
 @question_bp.route('/results/<int:result_id>', methods=['DELETE'])
 def delete_result(result_id):
-    db.session.query(Result).filter_by(id=result_id).delete()
-    db.session.commit()
+    result = db.session.get(Result, result_id)
+    if result:
+        # Take the result back out of the exam analytics in the same transaction
+        analytics.reverse_result(result)
+        db.session.delete(result)
+        db.session.commit()
     return jsonify(message="Deleted"), 200
 
 @question_bp.route('/question/<int:question_id>', methods=['DELETE'])
 def delete_question(question_id):
+    exam_id = db.session.query(Question.exam_id).filter_by(id=question_id).scalar()
+    db.session.query(QuestionStats).filter_by(question_id=question_id).delete()
     db.session.query(Question).filter_by(id=question_id).delete()
     db.session.commit()
+    answer_keys.invalidate(exam_id)
+    papers.invalidate(exam_id)
     return jsonify(message="Deleted"), 200
 
 @question_bp.route('/question/<int:question_id>', methods=['PUT'])
@@ -75,5 +202,7 @@ def update_question(question_id):
         q.option_d = data.get('option_d', q.option_d)
         q.correct_option = data.get('correct_option', q.correct_option)
         db.session.commit()
+        answer_keys.invalidate(q.exam_id)
+        papers.invalidate(q.exam_id)
         return jsonify(message="Updated"), 200
     return jsonify(message="Error"), 500
\ No newline at end of file
@@ -0,0 +1,154 @@
+import datetime
+import decimal
+import gzip
+import json
+import zlib
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional: stdlib json
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # Optional: JSON only
+    msgpack = None
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+# --- RESPONSE LAYER (Serialization + compression for every blueprint) ---
+# jsonify() goes through FastJSONProvider: orjson when installed, datetimes as
+# ISO 8601 (dates as YYYY-MM-DD) so handlers pass them through unformatted.
+# Clients that send "Accept: application/msgpack" (or ?format=msgpack) get the
+# same body as MessagePack; streamed listings then send one MessagePack object
+# per row, back to back (read them with msgpack.Unpacker). After each request,
+# buffered bodies of compressible types above COMPRESS_MIN_SIZE are
+# gzip/brotli-encoded as the client accepts, and streamed ones are compressed
+# chunk by chunk as they are sent. Bodies that already carry a Content-Encoding
+# (question papers) and non-compressible streams (SSE, MJPEG) are left alone.
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+COMPRESSIBLE = {'application/json', MSGPACK_MIMETYPE, 'application/x-ndjson', 'text/csv',
+                'text/plain', 'text/html', 'application/javascript'}
+
+def _default(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+if orjson is not None:
+    def dumps(obj):
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    loads = orjson.loads
+else:
+    def dumps(obj):
+        return json.dumps(obj, default=_default, separators=(',', ':')).encode()
+    loads = json.loads
+
+def dumps_str(obj):
+    return dumps(obj).decode()
+
+def wants_msgpack():
+    if msgpack is None:
+        return False
+    if request.args.get('format') == 'msgpack':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE]) == MSGPACK_MIMETYPE
+
+def pack_stream(rows):
+    packer = msgpack.Packer(default=_default)
+    for row in rows:
+        yield packer.pack(row)
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return json.dumps(obj, default=_default, **kwargs)
+        return dumps_str(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if wants_msgpack():
+            response = self._app.response_class(msgpack.packb(obj, default=_default), mimetype=MSGPACK_MIMETYPE)
+        else:
+            response = self._app.response_class(dumps(obj), mimetype=self.mimetype)
+        response.vary.add('Accept')
+        return response
+
+# --- COMPRESSION ---
+def _negotiate(accept_encodings):
+    # Prefer brotli, then gzip, honouring the client's q-values
+    best, best_q = None, 0
+    for encoding in (('br',) if brotli is not None else ()) + ('gzip',):
+        q = accept_encodings[encoding]
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def compress_stream(chunks, encoding, gzip_level=6, brotli_quality=5):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=brotli_quality)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)   # 31: gzip container
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        out = compress(chunk)
+        if out:
+            yield out
+    yield finish()
+
+def compress_response(response, min_size=1024, gzip_level=6, brotli_quality=5):
+    if (response.direct_passthrough
+            or not 200 <= response.status_code < 300 or response.status_code in (204, 206)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+    encoding = _negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        # Size unknown up front: always compress, the compressor buffers small chunks
+        response.response = compress_stream(response.iter_encoded(), encoding, gzip_level, brotli_quality)
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    if encoding == 'br':
+        body = brotli.compress(data, quality=brotli_quality)
+    else:
+        body = gzip.compress(data, gzip_level)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def init_app(app):
+    app.json = FastJSONProvider(app)
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', 6)
+    brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 5)
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, min_size, gzip_level, brotli_quality)
@@ -0,0 +1,212 @@
+import argparse
+import base64
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, or_, and_
+
+from models import db, User, Exam, Question, Result, ProctorEventBlock, ProctorSummary, SavedAnswer
+import analytics
+from analytics import Aggregates
+from autosave import autosave
+from timeline import timeline
+from catalog import exam_catalog
+from papers import papers
+from grading import answer_keys
+from responses import dumps
+
+# --- SET-BASED CASCADES ---
+# Deleting an exam or a user is one DELETE per dependent table, filtered on the
+# indexed exam_id / student_id, instead of loading ORM objects. Buffered state
+# (autosave, unflushed timeline) is discarded first so a background flush can't
+# write rows for what is being deleted, and the caches are invalidated after
+# the commit.
+
+def delete_exam_rows(exam_id):
+    # Caller commits
+    for model in (SavedAnswer, ProctorEventBlock, ProctorSummary, Result):
+        db.session.query(model).filter_by(exam_id=exam_id).delete(synchronize_session=False)
+    analytics.drop_exam_stats(exam_id)
+    db.session.query(Question).filter_by(exam_id=exam_id).delete(synchronize_session=False)
+    return db.session.query(Exam).filter_by(id=exam_id).delete(synchronize_session=False)
+
+def delete_exam(exam_id):
+    autosave.discard(exam_id=exam_id)
+    analytics.stats_writer.discard(exam_id)
+    timeline.discard(exam_id=exam_id)
+    deleted = delete_exam_rows(exam_id)
+    db.session.commit()
+    exam_catalog.invalidate()
+    papers.invalidate(exam_id)
+    answer_keys.invalidate(exam_id)
+    return bool(deleted)
+
+def delete_user_rows(user_id):
+    # The user's results leave the exam analytics in the same transaction
+    agg = Aggregates()
+    for row in db.session.query(Result.exam_id, Result.score, Result.total_questions,
+                                Result.correct_mask).filter_by(student_id=user_id):
+        agg.add(*row, sign=-1)
+    agg.apply()
+    for model in (SavedAnswer, ProctorEventBlock, ProctorSummary, Result):
+        db.session.query(model).filter_by(student_id=user_id).delete(synchronize_session=False)
+    # Exams outlive the teacher who created them
+    db.session.query(Exam).filter_by(creator_id=user_id).update({Exam.creator_id: None}, synchronize_session=False)
+    return db.session.query(User).filter_by(id=user_id).delete(synchronize_session=False)
+
+def delete_user(user_id):
+    autosave.discard(student_id=user_id)
+    timeline.discard(student_id=user_id)
+    deleted = delete_user_rows(user_id)
+    db.session.commit()
+    return bool(deleted)
+
+# --- ARCHIVE (Closed exams -> compressed NDJSON) ---
+# One gzip file per exam: the exam, its questions, results, proctoring summaries
+# and timeline blocks, one JSON object per line, then a trailer with the row
+# counts. Binary columns are base64. The file is written and re-read before the
+# rows are deleted; 'restore' loads it back and rebuilds the exam's analytics.
+# Autosaved answers of attempts never submitted are not kept.
+#
+#   python retention.py archive (--exam ID | --closed-days N) [--out DIR] [--keep]
+#   python retention.py restore FILE [FILE ...]
+#   python retention.py drop-partitions
+
+ARCHIVED = (Exam, Question, Result, ProctorSummary, ProctorEventBlock)
+
+def _encode(table, row):
+    out = dict(row)
+    for column in table.columns:
+        if isinstance(column.type, db.LargeBinary) and out.get(column.name) is not None:
+            out[column.name] = base64.b64encode(out[column.name]).decode()
+    return out
+
+def _decode(table, row):
+    out = {}
+    for column in table.columns:
+        value = row.get(column.name)
+        if value is not None:
+            if isinstance(column.type, db.LargeBinary):
+                value = base64.b64decode(value)
+            elif isinstance(column.type, db.DateTime):
+                value = datetime.fromisoformat(value)
+        out[column.name] = value
+    return out
+
+def closed_exams(days):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    return [r[0] for r in db.session.query(Exam.id).filter(or_(
+        Exam.end_date < cutoff,
+        and_(Exam.end_date.is_(None), Exam.start_date < cutoff)
+    )).order_by(Exam.id)]
+
+def _read(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def archive_exam(exam_id, out_dir, delete=True):
+    path = os.path.join(out_dir, f'exam-{exam_id}.ndjson.gz')
+    tmp = path + '.tmp'
+    counts = {}
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        for model in ARCHIVED:
+            table = model.__table__
+            key = table.c.id if model is Exam else table.c.exam_id
+            rows = db.session.execute(db.select(table).where(key == exam_id).execution_options(yield_per=1000))
+            counts[table.name] = 0
+            for row in rows.mappings():
+                f.write(dumps({'table': table.name, 'row': _encode(table, row)}).decode() + '\n')
+                counts[table.name] += 1
+        f.write(dumps({'table': None, 'counts': counts}).decode() + '\n')
+    if not counts['exam']:
+        os.remove(tmp)
+        return None
+
+    # Only delete what the file is known to hold
+    read = {}
+    for record in _read(tmp):
+        if record['table'] is not None:
+            read[record['table']] = read.get(record['table'], 0) + 1
+    if any(read.get(t, 0) != n for t, n in counts.items()):
+        raise RuntimeError(f"Archive of exam {exam_id} does not match the database; nothing deleted")
+    os.replace(tmp, path)
+    if delete:
+        delete_exam(exam_id)
+    return path, counts
+
+def restore_exam(path):
+    tables = {model.__tablename__: model.__table__ for model in ARCHIVED}
+    batches = {name: [] for name in tables}
+    trailer = None
+    for record in _read(path):
+        if record['table'] is None:
+            trailer = record['counts']
+        else:
+            batches[record['table']].append(_decode(tables[record['table']], record['row']))
+    if trailer is None or any(len(batches[t]) != n for t, n in trailer.items()):
+        raise RuntimeError(f"{path} is truncated or damaged")
+
+    exam_id = batches['exam'][0]['id']
+    if db.session.get(Exam, exam_id) is not None:
+        raise RuntimeError(f"Exam {exam_id} already exists")
+    # Students deleted since the archive was written can't be restored
+    users = {r[0] for r in db.session.query(User.id)}
+    for exam in batches['exam']:
+        if exam['creator_id'] not in users:
+            exam['creator_id'] = None
+    counts = {}
+    for name, table in tables.items():
+        rows = [r for r in batches[name] if 'student_id' not in r or r['student_id'] in users]
+        if rows:
+            db.session.execute(insert(table), rows)
+        counts[name] = len(rows)
+    db.session.commit()
+    analytics.rebuild(exam_id)
+    exam_catalog.invalidate()
+    return exam_id, counts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Archive closed exams and restore archives.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('archive', help="Export exams to gzip NDJSON and delete them from the database")
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument('--exam', type=int, action='append', help="Exam id (repeatable)")
+    target.add_argument('--closed-days', type=int, help="Every exam that ended more than N days ago")
+    p.add_argument('--out', default='archive')
+    p.add_argument('--keep', action='store_true', help="Write the archive but keep the rows")
+    p = sub.add_parser('restore', help="Load archived exams back into the database")
+    p.add_argument('files', nargs='+')
+    sub.add_parser('drop-partitions', help="Drop emptied partitions of fully archived exam blocks (PostgreSQL)")
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        if args.command == 'archive':
+            os.makedirs(args.out, exist_ok=True)
+            exam_ids = args.exam or closed_exams(args.closed_days)
+            for exam_id in exam_ids:
+                result = archive_exam(exam_id, args.out, delete=not args.keep)
+                if result is None:
+                    print(f"· exam {exam_id}: not found")
+                    continue
+                path, counts = result
+                print(f"📦 exam {exam_id} -> {path} ({', '.join(f'{n} {t}' for t, n in counts.items())})")
+            print(f"✅ Archived {len(exam_ids)} exam(s).")
+        elif args.command == 'restore':
+            for path in args.files:
+                exam_id, counts = restore_exam(path)
+                print(f"✅ Restored exam {exam_id} from {path} ({', '.join(f'{n} {t}' for t, n in counts.items())})")
+        else:
+            from partitions import PARTITIONED_MODELS, drop_empty_partitions
+            if db.engine.dialect.name != 'postgresql':
+                print("Partitioning is only used on PostgreSQL.")
+            else:
+                with db.engine.begin() as conn:
+                    dropped = [name for model in PARTITIONED_MODELS
+                               for name in drop_empty_partitions(conn, model.__tablename__)]
+                print(f"✅ Dropped {len(dropped)} partition(s): {', '.join(dropped)}" if dropped
+                      else "✅ No empty partitions.")
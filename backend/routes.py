@@ -1,36 +1,90 @@
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, current_app, g
+import hashlib
+import logging
 from datetime import datetime
 from models import db, User, Exam, Result
-from camera import VideoCamera
+from broadcast import broadcasts
+from proctor_backend import proctor, ProctorUnavailable
+from catalog import exam_catalog
+import analytics
+import retention
+from partitions import exam_partitions
 # Import the new Auth Helper
-from auth_middleware import auth_required
+from auth_middleware import auth_required, stream_auth_required, issue_token, set_session_cookie, clear_session_cookie
+from passwords import passwords, login_limiter, PasswordBusy
+
+logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
 exam_bp = Blueprint('exam', __name__)
 
-# --- LOGIN (No Token, Just User Data) ---
+# --- LOGIN (User Data + Signed Token + Session Cookie) ---
+# Password checks run on the bounded hashing pool (passwords.py); repeated
+# failures per username / per IP are answered with 429 before any hashing.
 @auth_bp.route('/login', methods=['POST'])
 def login():
     try:
-        data = request.get_json()
-        user = db.session.execute(db.select(User).filter_by(username=data.get('username'))).scalar_one_or_none()
+        data = request.get_json() or {}
+        username, password = data.get('username'), data.get('password')
+        ip = request.remote_addr
 
-        if user and user.check_password(data.get('password')):
-            # RETURN PURE USER DATA
-            return jsonify(user={'id': user.id, 'username': user.username, 'role': user.role}), 200
-        return jsonify(message='Invalid credentials'), 401
-    except Exception as e:
-        print(f"LOGIN ERROR: {e}")
+        retry_after = login_limiter.retry_after(ip, username)
+        if retry_after:
+            return jsonify(message="Too many failed attempts"), 429, {'Retry-After': str(retry_after)}
+
+        user = db.session.execute(
+            db.select(User.id, User.username, User.role, User.password_hash).filter_by(username=username)
+        ).first()
+        # Give the connection back to the pool while the hash is being checked
+        db.session.rollback()
+
+        try:
+            ok = passwords.verify(user.password_hash if user else None, password)
+        except PasswordBusy:
+            return jsonify(message="Server busy, try again"), 503, {'Retry-After': '1'}
+        if not ok:
+            login_limiter.failure(ip, username)
+            return jsonify(message='Invalid credentials'), 401
+        login_limiter.success(username)
+
+        # Transparent upgrade when PASSWORD_HASH_METHOD changed since the hash was made
+        if passwords.needs_rehash(user.password_hash):
+            try:
+                new_hash = passwords.hash(password)
+                db.session.query(User).filter_by(id=user.id).update({User.password_hash: new_hash})
+                db.session.commit()
+            except PasswordBusy:
+                pass
+
+        # RETURN USER DATA + a signed token for the Authorization header
+        token = issue_token(user)
+        response = jsonify(user={'id': user.id, 'username': user.username, 'role': user.role}, token=token)
+        return set_session_cookie(response, token), 200
+    except Exception:
+        logger.exception("Login failed")
         return jsonify(message="Login failed"), 500
 
+# --- REFRESH (New token + cookie for a still valid session) ---
+@auth_bp.route('/refresh', methods=['POST'])
+@auth_required
+def refresh():
+    user = g.current_user
+    token = issue_token(user)
+    response = jsonify(user={'id': user.id, 'username': user.username, 'role': user.role}, token=token)
+    return set_session_cookie(response, token), 200
+
+@auth_bp.route('/logout', methods=['POST'])
+def logout():
+    return clear_session_cookie(jsonify(message="Logged out")), 200
+
 # --- CREATE EXAM (FIXED: Now saves end_date) ---
 @exam_bp.route('', methods=['POST'])
 @auth_required 
 def create_exam():
     try:
         data = request.get_json()
-        # Get creator ID from header directly
-        creator_id = request.headers.get('user-id') 
+        # Creator is the authenticated user
+        creator_id = g.current_user.id
 
         # 1. Parse Dates safely
         start_dt = datetime.now()
@@ -38,12 +92,12 @@ def create_exam():
 
         if 'start_date' in data:
             try: start_dt = datetime.fromisoformat(data['start_date'])
-            except: pass
+            except (TypeError, ValueError): pass
         
         # FIX: Capture end_date from frontend
         if 'end_date' in data:
             try: end_dt = datetime.fromisoformat(data['end_date'])
-            except: pass
+            except (TypeError, ValueError): pass
 
         new_exam = Exam(
             title=data.get('title', 'Untitled'),
@@ -54,64 +108,87 @@ def create_exam():
             creator_id=creator_id
         )
         db.session.add(new_exam)
+        db.session.flush()
+        analytics.ensure_exam(new_exam.id)
         db.session.commit()
+        exam_partitions.ensure(new_exam.id)
+        exam_catalog.invalidate()
         return jsonify(message='Exam created!', exam_id=new_exam.id), 201
     except Exception as e:
         return jsonify(message=str(e)), 500
 
 # --- GET EXAMS (FIXED: Now sends end_date) ---
+# The exam list comes from the shared catalogue cache; the student's attempts are
+# one query, and the ETag covers both so polling clients get 304s.
 @exam_bp.route('', methods=['GET'])
 @auth_required
 def get_exams():
     try:
-        user_id = request.headers.get('user-id')
-        user = db.session.get(User, user_id)
+        user = g.current_user
 
-        exams = db.session.execute(db.select(Exam)).scalars().all()
-        exams_list = []
-        
-        for e in exams:
-            has_attempted = False
-            if user.role == 'student':
-                if db.session.query(Result).filter_by(student_id=user.id, exam_id=e.id).first():
-                    has_attempted = True
-            
-            # FIX: Include end_date in the response
-            # We check "if e.end_date" exists before calling .isoformat() to prevent crashes on old data
-            exams_list.append({
-                'id': e.id, 
-                'title': e.title, 
-                'duration': e.duration_minutes,
-                'start_date': e.start_date.isoformat() if e.start_date else None,
-                'end_date': e.end_date.isoformat() if e.end_date else None, # <--- FIX: Send end_date to frontend
-                'attempted': has_attempted
-            })
-        
-        return jsonify(exams_list), 200
-    except Exception as e:
-        print(f"GET EXAMS ERROR: {e}")
+        catalog_etag, exams = exam_catalog.get()
+
+        attempted = set()
+        if user.role == 'student':
+            attempted = {r[0] for r in db.session.query(Result.exam_id).filter_by(student_id=user.id)}
+
+        etag = hashlib.sha1(f"{catalog_etag}:{sorted(attempted)}".encode()).hexdigest()
+        if etag in request.if_none_match:
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+
+        response = jsonify([dict(e, attempted=e['id'] in attempted) for e in exams])
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, 200
+    except Exception:
+        logger.exception("Listing exams failed")
         return jsonify(message="Error"), 500
 
 # --- DELETE EXAM ---
 @exam_bp.route('/<int:exam_id>', methods=['DELETE'])
 def delete_exam(exam_id):
     try:
-        exam = db.session.get(Exam, exam_id)
-        if exam:
-            db.session.query(Result).filter_by(exam_id=exam_id).delete()
-            db.session.delete(exam)
-            db.session.commit()
+        # Questions, results, proctoring data, analytics and saved answers go with it
+        if retention.delete_exam(exam_id):
             return jsonify(message="Deleted"), 200
         return jsonify(message="Not found"), 404
     except Exception as e:
+        db.session.rollback()
         return jsonify(message=str(e)), 500
 
 # --- VIDEO ---
-def gen(camera):
-    while True:
-        frame = camera.get_frame()
-        if frame: yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+# One producer per source publishes into a shared buffer (broadcast.py); every
+# viewer streams from it at its own rate and picks a level of the JPEG ladder.
+def _camera_factory(config):
+    def factory():
+        # Only the process that opens the local camera pays for cv2
+        from camera import VideoCamera
+        from sampling import AdaptiveSampler
+        sampler = AdaptiveSampler.from_config(config) if config.get('PROCTOR_SAMPLING') else None
+        return VideoCamera(sampler)
+    return factory
 
 @exam_bp.route('/video_feed')
+@stream_auth_required
 def video_feed():
-    return Response(gen(VideoCamera()), mimetype='multipart/x-mixed-replace; boundary=frame')
\ No newline at end of file
+    level = request.args.get('quality', 'full')
+    max_fps = request.args.get('fps', type=float)
+    student_id = request.args.get('student_id', type=int)
+    exam_id = request.args.get('exam_id', type=int)
+
+    if student_id and exam_id:
+        # Browser-ingested session: proctors and admins, or the candidate themself
+        user = g.current_user
+        if user.role == 'student' and user.id != student_id:
+            return jsonify(message="Forbidden"), 403
+        try:
+            # Only sessions that exist; unknown ids must not create broadcasters
+            if proctor.get_verdict(student_id, exam_id) is None:
+                return jsonify(message="No such proctoring session"), 404
+        except ProctorUnavailable as e:
+            return jsonify(message=str(e)), 503
+        # Annotated by the proctoring backend
+        frames = proctor.stream(student_id, exam_id, level, max_fps)
+    else:
+        frames = broadcasts.get_or_create('local', _camera_factory(current_app.config)).stream(level, max_fps)
+    return Response(frames, mimetype='multipart/x-mixed-replace; boundary=frame')
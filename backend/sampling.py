@@ -0,0 +1,151 @@
+import time
+
+import cv2
+import numpy as np
+
+from camera import classify_faces
+
+# --- ADAPTIVE FRAME SAMPLING ---
+# The cascade is by far the most expensive step of the proctoring loop, so each
+# source gets a sampler that decides, per frame, whether it has to run at all:
+#   1. frames arriving faster than the target analysis FPS reuse the last verdict
+#   2. a tiny grayscale thumbnail is diffed against the last analyzed frame; a still
+#      scene reuses the last verdict
+#   3. when the motion stays inside the tracked face box, only that region is
+#      scanned; if the face is not found there, tracking is lost and the full frame
+#      is scanned in the same step
+#   4. a full-frame scan is forced every few seconds regardless, so a slowly
+#      appearing second person can never be missed for long
+
+SKIP = 'skip'
+ROI = 'roi'
+FULL = 'full'
+
+class SamplePlan:
+    def __init__(self, kind, gray, changed, now, region=None):
+        self.kind = kind
+        self.gray = gray
+        self.changed = changed
+        self.now = now
+        self.region = region
+
+    def crop(self):
+        if self.kind == ROI:
+            x, y, w, h = self.region
+            return self.gray[y:y + h, x:x + w]
+        return self.gray
+
+class AdaptiveSampler:
+    def __init__(self, target_fps=5.0, motion_threshold=0.01, pixel_threshold=15,
+                 full_scan_interval=2.0, roi_margin=0.5, thumb_size=(64, 48)):
+        self.interval = 1.0 / target_fps if target_fps else 0.0
+        self.motion_threshold = motion_threshold
+        self.pixel_threshold = pixel_threshold
+        self.full_scan_interval = full_scan_interval
+        self.roi_margin = roi_margin
+        self.thumb_size = thumb_size
+
+        self.status = None
+        self.faces = []
+        self.track_box = None
+        self._prev_thumb = None
+        self._reference = None
+        self._last_analysis = 0.0
+        self._last_full_scan = 0.0
+        self.stats = {'frames': 0, 'rate_limited': 0, 'still': 0, 'roi_scans': 0, 'full_scans': 0}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            target_fps=config.get('PROCTOR_TARGET_FPS', 5.0),
+            motion_threshold=config.get('PROCTOR_MOTION_THRESHOLD', 0.01),
+            full_scan_interval=config.get('PROCTOR_FULL_SCAN_SECONDS', 2.0)
+        )
+
+    def _thumb(self, gray):
+        return cv2.resize(gray, self.thumb_size, interpolation=cv2.INTER_AREA)
+
+    def _motion_mask(self, thumb, other):
+        if other is None:
+            return None
+        mask = cv2.absdiff(thumb, other) > self.pixel_threshold
+        if mask.mean() < self.motion_threshold:
+            return None
+        return mask
+
+    def _motion_box(self, mask, shape):
+        # Bounding box of the changed thumbnail pixels, in full-frame coordinates
+        ys, xs = np.nonzero(mask)
+        sx = shape[1] / self.thumb_size[0]
+        sy = shape[0] / self.thumb_size[1]
+        return (int(xs.min() * sx), int(ys.min() * sy),
+                int((xs.max() + 1) * sx), int((ys.max() + 1) * sy))
+
+    def _roi(self, shape):
+        x, y, w, h = self.track_box
+        mx, my = int(w * self.roi_margin), int(h * self.roi_margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(shape[1], x + w + mx), min(shape[0], y + h + my)
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    # --- STEP 1: DECIDE WHAT TO SCAN ---
+    def plan(self, gray, now=None):
+        now = time.monotonic() if now is None else now
+        self.stats['frames'] += 1
+
+        thumb = self._thumb(gray)
+        changed = self._prev_thumb is None or self._motion_mask(thumb, self._prev_thumb) is not None
+        self._prev_thumb = thumb
+
+        if self.status is not None and now - self._last_analysis < self.interval:
+            self.stats['rate_limited'] += 1
+            return SamplePlan(SKIP, gray, changed, now)
+        self._last_analysis = now
+
+        full_due = self.status is None or now - self._last_full_scan >= self.full_scan_interval
+        mask = self._motion_mask(thumb, self._reference)
+        if not full_due and mask is None:
+            self.stats['still'] += 1
+            return SamplePlan(SKIP, gray, changed, now)
+
+        self._reference = thumb
+        if not full_due and self.track_box is not None:
+            roi = self._roi(gray.shape)
+            mx0, my0, mx1, my1 = self._motion_box(mask, gray.shape)
+            if mx0 >= roi[0] and my0 >= roi[1] and mx1 <= roi[0] + roi[2] and my1 <= roi[1] + roi[3]:
+                self.stats['roi_scans'] += 1
+                return SamplePlan(ROI, gray, changed, now, roi)
+
+        self._last_full_scan = now
+        self.stats['full_scans'] += 1
+        return SamplePlan(FULL, gray, changed, now)
+
+    # --- STEP 2: RECORD THE DETECTION RESULT ---
+    def commit(self, plan, faces):
+        # Returns the verdict, or None when an ROI scan lost the face and a full scan is needed
+        if plan.kind == ROI:
+            if len(faces) != 1:
+                self.track_box = None
+                return None
+            rx, ry = plan.region[0], plan.region[1]
+            faces = [(x + rx, y + ry, w, h) for (x, y, w, h) in faces]
+
+        self.faces = list(faces)
+        self.track_box = self.faces[0] if len(self.faces) == 1 else None
+        self.status = classify_faces(self.faces, plan.gray.shape[1])
+        return self.status
+
+    def full_scan_plan(self, plan):
+        self._last_full_scan = plan.now
+        self.stats['full_scans'] += 1
+        return SamplePlan(FULL, plan.gray, plan.changed, plan.now)
+
+    # --- SEQUENTIAL HELPER ---
+    def process(self, gray, detect, now=None):
+        plan = self.plan(gray, now)
+        if plan.kind == SKIP:
+            return plan
+        if self.commit(plan, detect(plan.crop())) is None:
+            plan = self.full_scan_plan(plan)
+            self.commit(plan, detect(plan.crop()))
+        return plan
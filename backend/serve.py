@@ -0,0 +1,54 @@
+import os
+
+# --- PRODUCTION ENTRY POINT (gevent) ---
+# app.py runs Flask's threaded dev server, where every MJPEG viewer and every
+# open event stream holds an OS thread for the whole exam. Here requests run as
+# greenlets, so long-lived responses cost a socket and a little memory each.
+#
+#   python serve.py                                         single process
+#   gunicorn -c gunicorn.conf.py 'app:create_app()'         gevent workers
+#
+# Threads are deliberately NOT patched: the proctoring workers, broadcaster
+# producers, timeline flusher and submission writer stay real OS threads (cv2
+# releases the GIL, a greenlet would stall the event loop), and waits on their
+# Conditions turn cooperative via cooperative.py.
+
+def patch():
+    from gevent import monkey
+    monkey.patch_all(thread=False)
+    try:
+        # Optional: lets psycopg2 queries yield to other greenlets as well
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+
+    import cooperative
+    cooperative.enable()
+
+try:
+    from gunicorn.workers.ggevent import GeventWorker
+
+    class ProctorGeventWorker(GeventWorker):
+        # GeventWorker.patch() with thread=False (see above)
+        def patch(self):
+            patch()
+            from gevent import socket
+            self.sockets = [socket.socket(s.FAMILY, socket.SOCK_STREAM, fileno=s.sock.fileno())
+                            for s in self.sockets]
+except ImportError:
+    pass
+
+def main():
+    patch()
+    from gevent.pywsgi import WSGIServer
+    from app import create_app
+
+    app = create_app()
+    host = os.environ.get('HOST', '0.0.0.0')
+    port = int(os.environ.get('PORT', 5000))
+    print(f"🚀 Server Starting on {host}:{port} (gevent)...")
+    WSGIServer((host, port), app, spawn=int(os.environ.get('WEB_CONNECTIONS', 2000))).serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import csv
+import functools
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import insert, or_
+from werkzeug.security import generate_password_hash
+
+from models import db, User
+from passwords import passwords
+
+# --- BULK STUDENT IMPORT ---
+# Rows are streamed from the uploaded file (CSV, NDJSON or the legacy JSON body),
+# checked against the existing usernames/emails/enrollment IDs (one set-based
+# query per chunk), hashed on a process pool (password hashing is deliberately slow) and
+# inserted with executemany in chunks, one commit per chunk. Progress is kept on
+# an ImportJob that the status endpoint reports.
+
+MAX_ERRORS = 200
+MAX_JOBS = 50
+
+class ImportJob:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'
+        self.processed = 0
+        self.added = 0
+        self.skipped = 0
+        self.errors = []
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def error(self, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(message)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'processed': self.processed,
+            'added': self.added,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+def create_job():
+    job = ImportJob()
+    with _jobs_lock:
+        _jobs[job.id] = job
+        # Forget the oldest finished jobs
+        for old in sorted(_jobs.values(), key=lambda j: j.created_at)[:max(0, len(_jobs) - MAX_JOBS)]:
+            if old.finished_at:
+                del _jobs[old.id]
+    return job
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def _hash_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+# --- INPUT PARSING (Streams rows, never loads the whole file) ---
+def iter_rows(stream, fmt):
+    if fmt == 'json':
+        # Legacy body: {"students": [...]} or a bare list
+        data = json.load(stream)
+        yield from (data.get('students', []) if isinstance(data, dict) else data)
+        return
+
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for row in csv.DictReader(text):
+            yield {k.strip(): (v or '').strip() for k, v in row.items() if k}
+    else:
+        for line in text:
+            if line.strip():
+                yield json.loads(line)
+
+def detect_format(content_type, requested=None):
+    if requested:
+        return requested
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return 'json'
+
+# --- IMPORT ---
+def _existing(chunk):
+    # One query per chunk for every username/email/enrollment id it could clash with
+    usernames = [r['username'] for r in chunk]
+    emails = [r['email'] for r in chunk]
+    enrollments = [r['enrollment_id'] for r in chunk if r['enrollment_id']]
+    conditions = [User.username.in_(usernames), User.email.in_(emails)]
+    if enrollments:
+        conditions.append(User.enrollment_id.in_(enrollments))
+    rows = db.session.query(User.username, User.email, User.enrollment_id).filter(or_(*conditions)).all()
+    return ({r[0] for r in rows}, {r[1] for r in rows}, {r[2] for r in rows if r[2]})
+
+def run_import(job, rows, chunk_size=500, workers=None):
+    job.status = 'running'
+    seen_usernames, seen_enrollments = set(), set()
+    try:
+        rows = iter(rows)
+        while True:
+            chunk = []
+            for s in itertools.islice(rows, chunk_size):
+                job.processed += 1
+                username = str(s.get('username') or '').strip()
+                password = s.get('password')
+                enrollment_id = str(s.get('enrollment_id') or '').strip() or None
+                if not username or not password:
+                    job.error(f"Row {job.processed} skipped (Missing username or password)")
+                    continue
+                if username in seen_usernames or (enrollment_id and enrollment_id in seen_enrollments):
+                    job.error(f"User '{username}' skipped (Duplicate in file)")
+                    continue
+                seen_usernames.add(username)
+                if enrollment_id:
+                    seen_enrollments.add(enrollment_id)
+                chunk.append({'username': username, 'password': password,
+                              'email': f"{username}@student.com", 'enrollment_id': enrollment_id})
+            if not chunk:
+                break
+
+            usernames, emails, enrollments = _existing(chunk)
+            fresh = []
+            for r in chunk:
+                if r['username'] in usernames or r['email'] in emails:
+                    job.error(f"User '{r['username']}' skipped (Exists)")
+                elif r['enrollment_id'] and r['enrollment_id'] in enrollments:
+                    job.error(f"User '{r['username']}' skipped (Enrollment ID exists)")
+                else:
+                    fresh.append(r)
+            if not fresh:
+                continue
+
+            pool = _hash_pool(workers)
+            hash_password = functools.partial(generate_password_hash, method=passwords.method)
+            hashes = pool.map(hash_password, [r['password'] for r in fresh],
+                              chunksize=max(1, len(fresh) // (4 * (workers or os.cpu_count() or 1))))
+            db.session.execute(insert(User), [{
+                'username': r['username'], 'email': r['email'], 'enrollment_id': r['enrollment_id'],
+                'password_hash': h, 'role': 'student'
+            } for r, h in zip(fresh, hashes)])
+            db.session.commit()
+            job.added += len(fresh)
+
+        job.status = 'done'
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.errors.append(str(e))
+    finally:
+        job.finished_at = time.time()
+    return job
+
+def start_import(app, job, path, fmt):
+    # Runs the import on a background thread from a spooled copy of the upload
+    def work():
+        try:
+            with app.app_context(), open(path, 'rb') as f:
+                run_import(job, iter_rows(f, fmt),
+                           app.config.get('IMPORT_CHUNK_SIZE', 500),
+                           app.config.get('IMPORT_HASH_WORKERS'))
+        finally:
+            os.remove(path)
+    threading.Thread(target=work, name=f'import-{job.id[:8]}', daemon=True).start()
@@ -1,6 +1,16 @@
-from flask import Blueprint, request, jsonify
+import logging
+import os
+import shutil
+import tempfile
+from flask import Blueprint, request, jsonify, current_app
 from models import db, User
-from auth_middleware import auth_required
+from auth_middleware import auth_required, user_cache
+from db_routing import read_replica
+from pagination import list_response
+import retention
+from student_import import create_job, get_job, run_import, start_import, detect_format
+
+logger = logging.getLogger(__name__)
 
 student_bp = Blueprint('students', __name__)
 
@@ -10,61 +20,72 @@ def bulk_add_students():
     try:
         data = request.get_json()
         students_list = data.get('students', [])
-        
-        added_count = 0
-        errors = []
 
-        print(f"--- 🚀 BULK ADDING {len(students_list)} STUDENTS ---")
+        logger.info("Bulk adding %d students", len(students_list))
 
-        for s in students_list:
-            username = s.get('username')
-            password = s.get('password')
-            enrollment_id = s.get('enrollment_id')
-            
-            if not username or not password:
-                continue
+        # Small JSON bodies are imported inline with the same engine as /import
+        job = run_import(create_job(), students_list,
+                         current_app.config.get('IMPORT_CHUNK_SIZE', 500),
+                         current_app.config.get('IMPORT_HASH_WORKERS'))
+        if job.status == 'failed':
+            return jsonify(message=job.errors[-1]), 500
+        return jsonify({"message": f"Added {job.added} students.", "errors": job.errors}), 200
 
-            # Check if user exists
-            if User.query.filter_by(username=username).first():
-                errors.append(f"User '{username}' skipped (Exists)")
-                continue
+    except Exception as e:
+        return jsonify(message=str(e)), 500
 
-            # Create User
-            email = f"{username}@student.com"
-            new_user = User(username=username, email=email, enrollment_id=enrollment_id, role='student')
-            new_user.set_password(password)
-            db.session.add(new_user)
-            added_count += 1
+# --- STREAMED IMPORT (CSV / NDJSON / JSON body, runs in the background) ---
+@student_bp.route('/import', methods=['POST'])
+@auth_required
+def import_students():
+    try:
+        fmt = detect_format(request.content_type, request.args.get('format'))
+        if fmt not in ('csv', 'ndjson', 'json'):
+            return jsonify(message="Unsupported format"), 400
 
-        db.session.commit()
-        return jsonify({"message": f"Added {added_count} students.", "errors": errors}), 200
+        # Spool the upload to disk so the request can return right away
+        fd, path = tempfile.mkstemp(prefix='import-', suffix=f'.{fmt}')
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(request.stream, f, 64 * 1024)
 
+        job = create_job()
+        start_import(current_app._get_current_object(), job, path, fmt)
+        return jsonify(job.to_dict()), 202
     except Exception as e:
         return jsonify(message=str(e)), 500
 
+@student_bp.route('/import/<job_id>', methods=['GET'])
+@auth_required
+def import_status(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify(message="Job not found"), 404
+    return jsonify(job.to_dict()), 200
+
+# --- LIST STUDENTS (Supports ?limit=&cursor=&fields=, see pagination.py) ---
+STUDENT_FIELDS = {
+    'id': (User.id, None),
+    'username': (User.username, None),
+    'enrollment_id': (User.enrollment_id, None),
+}
+
 @student_bp.route('/list', methods=['GET'])
+@read_replica
 def list_students():
     try:
-        students = db.session.execute(db.select(User).filter_by(role='student')).scalars().all()
-        return jsonify([{
-            'id': s.id, 'username': s.username, 'enrollment_id': s.enrollment_id
-        } for s in students]), 200
-    except:
+        return list_response(User.id, STUDENT_FIELDS, lambda q: q.select_from(User).filter(User.role == 'student'))
+    except Exception:
+        logger.exception("Listing students failed")
         return jsonify(message="Error"), 500
     
 # --- DELETE STUDENT ---
 @student_bp.route('/<int:user_id>', methods=['DELETE'])
 def delete_student(user_id):
     try:
-        # Find user
-        user = db.session.get(User, user_id)
-        if not user:
+        # Results (out of the analytics), timelines and saved answers go with the student
+        if not retention.delete_user(user_id):
             return jsonify(message="User not found"), 404
-            
-        # Optional: Check if they have exam results before deleting? 
-        # For now, we just delete them.
-        db.session.delete(user)
-        db.session.commit()
+        user_cache.invalidate(user_id)
         
         return jsonify(message="Student deleted successfully"), 200
     except Exception as e:
@@ -0,0 +1,82 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The backend modules import each other as top-level modules (python app.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.py reads the environment at import time: point it at a throwaway SQLite file
+_fd, DB_PATH = tempfile.mkstemp(suffix='.db', prefix='exam-tests-')
+os.close(_fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+
+PASSWORD = 'test-pass'
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    from models import db
+    from analytics import stats_writer
+    from grading import submissions
+
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+    yield app
+    # Background writers flush at exit; give them nothing left to write first
+    with app.app_context():
+        submissions.drain()
+        stats_writer.flush()
+        db.engine.dispose()
+
+def pytest_sessionfinish(session, exitstatus):
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+_users = itertools.count(1)
+
+@pytest.fixture
+def make_user(app):
+    # -> (user id, auth headers) of a fresh user
+    from models import db, User
+    from auth_middleware import issue_token
+
+    def make_user(role='student'):
+        n = next(_users)
+        with app.app_context():
+            user = User(username=f'{role}{n}', email=f'{role}{n}@exam.test', role=role,
+                        enrollment_id=f'T{n:06d}' if role == 'student' else None)
+            user.set_password(PASSWORD)
+            db.session.add(user)
+            db.session.commit()
+            return user.id, {'Authorization': f'Bearer {issue_token(user)}'}
+    return make_user
+
+@pytest.fixture
+def make_exam(client):
+    # -> (exam id, question ids) of an exam created through the API; the correct
+    # options cycle A, B, C, D
+    def make_exam(headers, questions=4):
+        response = client.post('/api/exams', headers=headers, json={'title': 'Test exam', 'duration': 30})
+        assert response.status_code == 201, response.get_json()
+        exam_id = response.get_json()['exam_id']
+        for q in range(questions):
+            response = client.post(f'/api/exams/{exam_id}/questions', headers=headers, json={
+                'text': f'Question {q}', 'option_a': 'a', 'option_b': 'b', 'option_c': 'c', 'option_d': 'd',
+                'correct_option': 'ABCD'[q % 4]
+            })
+            assert response.status_code == 201, response.get_json()
+        from models import Question
+        with client.application.app_context():
+            ids = [q.id for q in Question.query.filter_by(exam_id=exam_id).order_by(Question.id)]
+        return exam_id, ids
+    return make_exam
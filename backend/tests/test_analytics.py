@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import analytics
+from analytics import Aggregates, bucket_for, BUCKETS
+from grading import encode_mask
+from models import db, ExamStats, ExamScoreBucket, QuestionStats
+
+@pytest.mark.parametrize('score,total,bucket', [(0, 10, 0), (5, 10, 5), (9, 10, 9), (10, 10, 9), (3, 0, 0)])
+def test_bucket_for(score, total, bucket):
+    assert bucket_for(score, total) == bucket
+
+def _state(exam_id):
+    stats = db.session.get(ExamStats, exam_id)
+    buckets = dict(db.session.query(ExamScoreBucket.bucket, ExamScoreBucket.count).filter_by(exam_id=exam_id))
+    questions = {q.question_id: (q.attempts, q.correct) for q in QuestionStats.query.filter_by(exam_id=exam_id)}
+    return (stats.attempts, stats.score_sum, stats.score_sq_sum, round(stats.percent_sum, 6)), buckets, questions
+
+def test_apply_then_reverse_restores_the_totals(app, make_user, make_exam):
+    _, admin = make_user('admin')
+    exam_id, qids = make_exam(admin, questions=4)
+    with app.app_context():
+        before = _state(exam_id)
+        assert before[0] == (0, 0, 0, 0.0)
+        assert set(before[1]) == set(range(BUCKETS))
+
+        first = encode_mask(qids, np.array([1, 1, 0, 1], dtype=bool))
+        second = encode_mask(qids, np.array([0, 1, 0, 0], dtype=bool))
+        Aggregates().add(exam_id, 3, 4, first).add(exam_id, 1, 4, second).apply()
+        db.session.commit()
+
+        (attempts, total, squares, percent), buckets, questions = _state(exam_id)
+        assert (attempts, total, squares, percent) == (2, 4, 10, 100.0)
+        assert buckets[bucket_for(3, 4)] == 1 and buckets[bucket_for(1, 4)] == 1
+        assert questions == {qids[0]: (2, 1), qids[1]: (2, 2), qids[2]: (2, 0), qids[3]: (2, 1)}
+
+        Aggregates().add(exam_id, 3, 4, first, sign=-1).add(exam_id, 1, 4, second, sign=-1).apply()
+        db.session.commit()
+        assert _state(exam_id) == before
+
+def test_apply_creates_missing_stats_rows(app, make_user, make_exam):
+    _, admin = make_user('admin')
+    exam_id, qids = make_exam(admin, questions=2)
+    with app.app_context():
+        # An exam from before analytics existed
+        analytics.drop_exam_stats(exam_id)
+        db.session.commit()
+        analytics.record_result(exam_id, 2, 2, encode_mask(qids, np.array([1, 1], dtype=bool)))
+        # A second creation attempt is a no-op, not a duplicate key
+        analytics.ensure_exam(exam_id)
+        db.session.commit()
+        (attempts, total, _, _), buckets, questions = _state(exam_id)
+        assert (attempts, total) == (1, 2)
+        assert buckets[BUCKETS - 1] == 1
+        assert questions == {qids[0]: (1, 1), qids[1]: (1, 1)}
+
+def test_stats_writer_merges_until_flushed(app, make_user, make_exam):
+    _, admin = make_user('admin')
+    exam_id, qids = make_exam(admin, questions=2)
+    writer = analytics.StatsWriter()
+    writer._thread = object()   # Pretend a flusher runs, so add() only buffers
+    mask = encode_mask(qids, np.array([1, 0], dtype=bool))
+    with app.app_context():
+        writer.add(exam_id, 1, 2, mask)
+        writer.add(exam_id, 1, 2, mask)
+        assert _state(exam_id)[0][0] == 0
+        assert writer.flush() == 2
+        assert _state(exam_id)[0][:2] == (2, 2)
+        assert writer.flush() == 0
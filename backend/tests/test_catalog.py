@@ -0,0 +1,23 @@
+import catalog
+from catalog import ExamCatalog
+
+def test_build_raced_by_invalidate_is_not_cached(app, monkeypatch):
+    exams = ExamCatalog()
+    builds = []
+    real_dumps = catalog.dumps
+
+    def dumps(value):
+        # An exam is created while the first build is in flight
+        builds.append(value)
+        if len(builds) == 1:
+            exams.invalidate()
+        return real_dumps(value)
+    monkeypatch.setattr(catalog, 'dumps', dumps)
+
+    with app.app_context():
+        exams.get()
+        exams.get()
+        assert len(builds) == 2
+        # The second build was not raced and is served from the cache
+        exams.get()
+        assert len(builds) == 2
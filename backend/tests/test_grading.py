@@ -0,0 +1,44 @@
+import numpy as np
+
+from grading import AnswerKey, encode_mask, decode_mask
+
+ROWS = [(11, 'A'), (12, 'B'), (15, 'C'), (20, None)]
+
+def test_mask_round_trip():
+    ids = [3, 70000, 5, 9, 11, 2, 8, 1, 4]
+    mask = np.array([1, 0, 1, 1, 0, 0, 1, 0, 1], dtype=bool)
+    out_ids, out_mask = decode_mask(encode_mask(ids, mask))
+    assert out_ids.tolist() == ids
+    assert out_mask.tolist() == mask.tolist()
+
+def test_mask_of_empty_exam():
+    ids, mask = decode_mask(encode_mask([], np.zeros(0, dtype=bool)))
+    assert len(ids) == 0 and len(mask) == 0
+
+def test_grade_matches_plain_comparison():
+    key = AnswerKey(1, ROWS)
+    answers = {'11': 'A', 12: 'C', '15': 'C', '99': 'A'}
+    score, mask = key.grade(answers)
+    # Unknown question ids are ignored; a question without a correct option
+    # counts as correct only when left unanswered
+    assert score == 3
+    assert mask.tolist() == [True, False, True, True]
+
+def test_unknown_option_is_never_correct():
+    key = AnswerKey(1, ROWS)
+    score, mask = key.grade({'11': 'Z', '20': 'Z'})
+    assert score == 0
+    assert not mask[0] and not mask[3]
+
+def test_grade_many_equals_grade():
+    key = AnswerKey(1, ROWS)
+    submissions = [{}, {'11': 'A'}, {'11': 'A', '12': 'B', '15': 'C'}, {'12': 'D', '20': 'A'}]
+    scores, masks = key.grade_many(submissions)
+    for answers, score, mask in zip(submissions, scores, masks):
+        expected_score, expected_mask = key.grade(answers)
+        assert score == expected_score
+        assert mask.tolist() == expected_mask.tolist()
+
+def test_grade_many_of_nothing():
+    scores, masks = AnswerKey(1, ROWS).grade_many([])
+    assert scores.shape == (0,) and masks.shape == (0, len(ROWS))
@@ -0,0 +1,51 @@
+import itertools
+from collections import deque
+
+from offline_analysis import build_timeline, save_timeline, RECENT
+from timeline import TimelineRecorder, timeline, verdict_confidence
+
+_exams = itertools.count(9501)
+
+FACE = (100, 80, 60, 60)
+STATUSES = ['safe', 'safe', 'missing', 'missing', 'safe', 'looking_away', 'looking_away', 'multiple',
+            'safe', 'safe', 'missing', 'safe', 'multiple', 'multiple', 'multiple', 'looking_away']
+
+def samples(start=1000.0, step=0.2):
+    faces = {'safe': [FACE], 'looking_away': [(5, 80, 60, 60)], 'missing': [], 'multiple': [FACE, (10, 10, 50, 50)]}
+    return [(start + i * step, status, faces[status]) for i, status in enumerate(STATUSES)]
+
+def test_offline_and_live_timelines_agree(app):
+    exam_id = next(_exams)
+    frames = samples()
+    end_ts = frames[-1][0] + 5.0
+    events, summary = build_timeline(frames, end_ts)
+
+    # The live path: ProctorManager's confidence, TimelineRecorder, submit at end_ts
+    live = TimelineRecorder()
+    recent = deque(maxlen=RECENT)
+    with app.app_context():
+        for ts, status, faces in frames:
+            recent.append(status)
+            live.record(1, exam_id, status, faces, verdict_confidence(recent, status), ts=ts)
+        last_status = live._attempts[(1, exam_id)].status
+        live.close_attempt(1, exam_id, ts=end_ts)
+        live_events = live.events(1, exam_id)
+        live_summary, = live.summaries(exam_id)
+
+    assert events == live_events
+    assert len(events) == 10
+    assert summary['last_status'] == last_status
+    for key, value in summary.items():
+        if key != 'last_status':
+            assert live_summary[key] == value, key
+
+def test_saving_twice_replaces_the_timeline(app):
+    exam_id = next(_exams)
+    frames = samples()
+    result = {'samples': frames}
+    with app.app_context():
+        save_timeline(result, 7, exam_id)
+        first = timeline.events(7, exam_id), timeline.summaries(exam_id)
+        save_timeline(result, 7, exam_id)
+        assert (timeline.events(7, exam_id), timeline.summaries(exam_id)) == first
+    assert len(first[0]) == 10
@@ -0,0 +1,34 @@
+import pytest
+
+from pagination import encode_cursor, decode_cursor, ListingError
+
+@pytest.mark.parametrize('key', [0, 1, 123456789, 'abc', [1, 2]])
+def test_cursor_round_trip(key):
+    cursor = encode_cursor(key)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == key
+
+def test_garbage_cursor_is_a_listing_error():
+    with pytest.raises(ListingError):
+        decode_cursor('not a cursor!')
+
+@pytest.mark.parametrize('key', ['x', [1], {'id': 1}, True, 1.5, None])
+def test_tampered_cursor_is_rejected(client, make_user, key):
+    _, admin = make_user('admin')
+    response = client.get(f'/api/admin/users?limit=5&cursor={encode_cursor(key)}', headers=admin)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == "Invalid cursor"
+
+def test_pages_follow_the_cursor(client, make_user):
+    _, admin = make_user('admin')
+    for _ in range(3):
+        make_user('student')
+    seen, cursor = [], None
+    while True:
+        url = '/api/admin/users?limit=2&fields=id' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url, headers=admin).get_json()
+        seen += [u['id'] for u in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == sorted(seen) and len(seen) == len(set(seen)) >= 4
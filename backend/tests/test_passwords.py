@@ -0,0 +1,59 @@
+from flask import Flask
+from werkzeug.security import generate_password_hash
+
+import passwords as passwords_module
+from passwords import PasswordHasher, LoginLimiter
+
+def make_hasher(method='pbkdf2:sha256:1000'):
+    app = Flask(__name__)
+    app.config['PASSWORD_HASH_METHOD'] = method
+    return PasswordHasher(app)
+
+def test_hash_and_verify():
+    hasher = make_hasher()
+    stored = hasher.hash('secret')
+    assert hasher.verify(stored, 'secret')
+    assert not hasher.verify(stored, 'wrong')
+    assert not hasher.verify(None, 'secret')
+    assert not hasher.verify(stored, '')
+
+def test_needs_rehash_only_for_other_parameters():
+    hasher = make_hasher()
+    assert not hasher.needs_rehash(hasher.hash('secret'))
+    assert hasher.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:2000'))
+    assert hasher.needs_rehash(generate_password_hash('secret', method='scrypt'))
+    assert not hasher.needs_rehash(None)
+
+def make_limiter(per_user=3, per_ip=5, window=60):
+    app = Flask(__name__)
+    app.config.update(LOGIN_WINDOW_SECONDS=window, LOGIN_MAX_FAILURES_PER_USER=per_user,
+                      LOGIN_MAX_FAILURES_PER_IP=per_ip)
+    return LoginLimiter(app)
+
+def test_user_limit_and_success_reset():
+    limiter = make_limiter()
+    for _ in range(3):
+        assert limiter.retry_after('1.1.1.1', 'alice') == 0
+        limiter.failure('1.1.1.1', 'alice')
+    assert 0 < limiter.retry_after('1.1.1.1', 'alice') <= 61
+    # Another user from the same address is still below the IP limit
+    assert limiter.retry_after('1.1.1.1', 'bob') == 0
+    limiter.success('alice')
+    assert limiter.retry_after('1.1.1.1', 'alice') == 0
+
+def test_ip_limit_spans_usernames():
+    limiter = make_limiter()
+    for i in range(5):
+        limiter.failure('2.2.2.2', f'user{i}')
+    assert limiter.retry_after('2.2.2.2', 'someone-else') > 0
+    assert limiter.retry_after('3.3.3.3', 'someone-else') == 0
+
+def test_failures_expire_after_the_window(monkeypatch):
+    limiter = make_limiter(window=60)
+    now = [1000.0]
+    monkeypatch.setattr(passwords_module.time, 'time', lambda: now[0])
+    for _ in range(3):
+        limiter.failure('1.1.1.1', 'alice')
+    assert limiter.retry_after('1.1.1.1', 'alice') == 61
+    now[0] += 61
+    assert limiter.retry_after('1.1.1.1', 'alice') == 0
@@ -0,0 +1,6 @@
+from proctor_backend import RemoteBackend
+
+def test_remote_stream_ends_when_the_worker_is_gone(tmp_path):
+    backend = RemoteBackend(str(tmp_path / 'no-worker.sock'), b'key', timeout=0.5)
+    # Raised inside the MJPEG generator the error would abort the response mid-stream
+    assert list(backend.stream(1, 1)) == []
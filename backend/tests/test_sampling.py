@@ -0,0 +1,74 @@
+import numpy as np
+
+from sampling import AdaptiveSampler, SKIP, ROI, FULL
+
+W, H = 320, 240
+FACE = (130, 80, 60, 60)   # centred: 'safe'
+
+def frame(square=None, value=200):
+    gray = np.zeros((H, W), dtype=np.uint8)
+    if square:
+        x, y, w, h = square
+        gray[y:y + h, x:x + w] = value
+    return gray
+
+def sampler():
+    return AdaptiveSampler(target_fps=5.0, full_scan_interval=2.0)
+
+def test_first_frame_is_a_full_scan():
+    s = sampler()
+    plan = s.plan(frame(), now=0.0)
+    assert plan.kind == FULL
+    assert s.commit(plan, [FACE]) == 'safe'
+    assert s.track_box == FACE
+
+def test_frames_faster_than_the_target_reuse_the_verdict():
+    s = sampler()
+    s.commit(s.plan(frame(), now=0.0), [FACE])
+    assert s.plan(frame(FACE), now=0.1).kind == SKIP
+    assert s.stats['rate_limited'] == 1
+
+def test_still_scene_is_skipped_until_the_full_scan_is_due():
+    s = sampler()
+    s.commit(s.plan(frame(), now=0.0), [FACE])
+    assert s.plan(frame(), now=0.5).kind == SKIP
+    assert s.stats['still'] == 1
+    assert s.plan(frame(), now=2.5).kind == FULL
+
+def test_motion_inside_the_tracked_face_scans_only_that_region():
+    s = sampler()
+    s.commit(s.plan(frame(), now=0.0), [FACE])
+    plan = s.plan(frame((140, 90, 40, 40)), now=0.5)
+    assert plan.kind == ROI
+    x, y, w, h = plan.region
+    assert x <= FACE[0] and y <= FACE[1] and x + w >= FACE[0] + FACE[2] and y + h >= FACE[1] + FACE[3]
+    assert plan.crop().shape == (h, w)
+    # Face found again inside the region: boxes come back in frame coordinates
+    assert s.commit(plan, [(FACE[0] - x, FACE[1] - y, FACE[2], FACE[3])]) == 'safe'
+    assert s.faces == [FACE]
+
+def test_losing_the_face_in_the_region_asks_for_a_full_scan():
+    s = sampler()
+    s.commit(s.plan(frame(), now=0.0), [FACE])
+    plan = s.plan(frame((140, 90, 40, 40)), now=0.5)
+    assert s.commit(plan, []) is None
+    assert s.track_box is None
+    full = s.full_scan_plan(plan)
+    assert full.kind == FULL
+    assert s.commit(full, []) == 'missing'
+
+def test_motion_outside_the_face_is_a_full_scan():
+    s = sampler()
+    s.commit(s.plan(frame(), now=0.0), [FACE])
+    assert s.plan(frame((0, 0, 40, 40)), now=0.5).kind == FULL
+
+def test_process_runs_detection_only_when_planned():
+    s = sampler()
+    calls = []
+    def detect(gray):
+        calls.append(gray.shape)
+        return [FACE]
+    s.process(frame(), detect, now=0.0)
+    s.process(frame(), detect, now=0.1)
+    assert calls == [(H, W)]
+    assert s.status == 'safe'
@@ -0,0 +1,60 @@
+import pytest
+
+from analytics import stats_writer
+
+def test_submit_duplicate_then_analytics(app, client, make_user, make_exam):
+    _, admin = make_user('admin')
+    student_id, student = make_user('student')
+    exam_id, qids = make_exam(admin, questions=4)
+
+    # Two right (A, B), one wrong, one unanswered
+    answers = {str(qids[0]): 'A', str(qids[1]): 'B', str(qids[2]): 'A'}
+    response = client.post(f'/api/exams/{exam_id}/submit', headers=student, json={'answers': answers})
+    assert response.status_code == 200, response.get_json()
+
+    response = client.post(f'/api/exams/{exam_id}/submit', headers=student, json={'answers': answers})
+    assert response.status_code == 409
+
+    with app.app_context():
+        stats_writer.flush()
+
+    # Answer statistics are for staff only
+    assert client.get(f'/api/exams/{exam_id}/analytics', headers=student).status_code == 403
+    response = client.get(f'/api/exams/{exam_id}/analytics', headers=admin)
+    assert response.status_code == 200
+    data = response.get_json()
+    # The rejected duplicate left no trace
+    assert data['attempts'] == 1
+    assert data['mean_score'] == 2.0
+    assert [q['correct'] for q in data['questions']] == [1, 1, 0, 0]
+
+    results = client.get(f'/api/exams/{exam_id}/results?limit=10', headers=admin).get_json()
+    assert [(r['score'], r['total']) for r in results['items']] == [(2, 4)]
+
+def test_submit_clears_autosaved_answers(client, make_user, make_exam):
+    _, admin = make_user('admin')
+    _, student = make_user('student')
+    exam_id, qids = make_exam(admin, questions=2)
+
+    response = client.put(f'/api/exams/{exam_id}/answers', headers=student, json={'answers': {str(qids[0]): 'A'}})
+    assert response.status_code == 202
+    assert client.get(f'/api/exams/{exam_id}/answers', headers=student).get_json() == {str(qids[0]): 'A'}
+
+    # No answers in the body: graded from the autosave buffer
+    response = client.post(f'/api/exams/{exam_id}/submit', headers=student, json={})
+    assert response.status_code == 200
+    assert client.get(f'/api/exams/{exam_id}/answers', headers=student).get_json() == {}
+
+@pytest.mark.parametrize('answers', [['A'], {'1': ['A']}, {'1': {'x': 1}}, {'1': 'E'}, {'1': 1}])
+def test_invalid_answers_are_rejected(client, make_user, make_exam, answers):
+    _, admin = make_user('admin')
+    _, student = make_user('student')
+    exam_id, qids = make_exam(admin, questions=1)
+    if isinstance(answers, dict):
+        answers = {str(qids[0]): v for v in answers.values()}
+
+    response = client.post(f'/api/exams/{exam_id}/submit', headers=student, json={'answers': answers})
+    assert response.status_code == 400
+    # Nothing was recorded, a valid submission still goes through
+    response = client.post(f'/api/exams/{exam_id}/submit', headers=student, json={'answers': {str(qids[0]): 'A'}})
+    assert response.status_code == 200
@@ -0,0 +1,94 @@
+import itertools
+
+import pytest
+
+from timeline import TimelineRecorder, pack_event, unpack_events, RECORD
+
+_exams = itertools.count(9001)
+
+@pytest.fixture
+def recorder():
+    # Not init_app'ed: no background flusher, tests flush explicitly
+    return TimelineRecorder()
+
+@pytest.fixture
+def exam_id():
+    return next(_exams)
+
+def test_event_record_round_trip():
+    payload = pack_event(1234.5, 'multiple', 2, (10, 20, 300, 70000), 0.75) + pack_event(1240.0, 'safe', 1, (-5, 0, 1, 1), 1.0)
+    assert len(payload) == 2 * RECORD.size
+    first, second = unpack_events(payload)
+    assert first == {'ts': 1234.5, 'status': 'multiple', 'faces': 2, 'box': [10, 20, 300, 65535], 'confidence': 0.75}
+    # Box values are clamped into uint16
+    assert second['box'] == [0, 0, 1, 1]
+
+def test_only_transitions_are_recorded(recorder):
+    assert recorder.record(1, 1, 'safe', ts=100.0)
+    assert not recorder.record(1, 1, 'safe', ts=101.0)
+    assert recorder.record(1, 1, 'missing', ts=102.0)
+    assert recorder.record(1, 1, 'safe', ts=107.0)
+    state = recorder._attempts[(1, 1)]
+    assert len(state.pending) == 3
+    assert state.delta['missing_seconds'] == 5.0
+    assert state.delta['missing_events'] == 1
+
+def test_failed_flush_restores_events_and_totals(recorder):
+    recorder.record(1, 1, 'safe', ts=100.0)
+    recorder.record(1, 1, 'looking_away', ts=101.0)
+    recorder.record(1, 1, 'safe', ts=104.0)
+    batches = recorder._take_batches()
+    assert recorder._attempts[(1, 1)].pending == []
+    # Recorded while the failed flush was in flight
+    recorder.record(1, 1, 'multiple', ts=105.0)
+    recorder._restore(batches)
+    state = recorder._attempts[(1, 1)]
+    assert [e['status'] for e in unpack_events(b''.join(state.pending))] == ['safe', 'looking_away', 'safe', 'multiple']
+    assert state.first_ts == 100.0
+    assert state.delta['looking_away_seconds'] == 3.0
+    assert state.delta['multiple_events'] == 1
+    assert recorder._pending_count == 4
+
+def test_summaries_fold_in_unflushed_state(app, recorder, exam_id):
+    with app.app_context():
+        recorder.record(1, exam_id, 'safe', ts=100.0)
+        recorder.record(1, exam_id, 'missing', ts=110.0)
+        recorder.record(1, exam_id, 'safe', ts=130.0)
+        recorder.flush()
+        # Still open, and not flushed: counted up to the last frame
+        recorder.record(1, exam_id, 'multiple', ts=140.0)
+        recorder.record(1, exam_id, 'multiple', ts=150.0)
+        recorder.record(2, exam_id, 'safe', ts=100.0)
+
+        rows = {r['student_id']: r for r in recorder.summaries(exam_id)}
+        assert rows[1]['missing_seconds'] == 20.0
+        assert rows[1]['missing_events'] == 1
+        assert rows[1]['multiple_seconds'] == 10.0
+        assert rows[1]['multiple_events'] == 1
+        assert rows[1]['last_status'] == 'multiple'
+        assert rows[2]['missing_events'] == 0
+        assert [r['student_id'] for r in recorder.summaries(exam_id, student_id=2)] == [2]
+
+def test_close_attempt_persists_and_forgets(app, recorder, exam_id):
+    with app.app_context():
+        recorder.record(1, exam_id, 'safe', ts=100.0)
+        recorder.record(1, exam_id, 'looking_away', ts=101.0)
+        recorder.record(1, exam_id, 'looking_away', ts=109.0)
+        recorder.close_attempt(1, exam_id, ts=200.0)
+        assert (1, exam_id) not in recorder._attempts
+        events = recorder.events(1, exam_id)
+        assert [e['status'] for e in events] == ['safe', 'looking_away']
+        summary, = recorder.summaries(exam_id)
+        # Frames stopped at 109: the violation ends there, not at the submit
+        assert summary['looking_away_seconds'] == 8.0
+
+def test_idle_attempts_are_evicted(app, recorder, exam_id):
+    recorder.idle_seconds = 60
+    with app.app_context():
+        recorder.record(1, exam_id, 'missing', ts=100.0)
+        recorder.record(1, exam_id, 'missing', ts=130.0)
+        assert recorder.evict_idle(now=150.0) == 0
+        assert recorder.evict_idle(now=200.0) == 1
+        assert recorder._attempts == {}
+        summary, = recorder.summaries(exam_id)
+        assert summary['missing_seconds'] == 30.0
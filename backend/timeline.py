@@ -0,0 +1,295 @@
+import logging
+import struct
+import threading
+import time
+
+from models import db, ProctorEventBlock, ProctorSummary
+
+logger = logging.getLogger(__name__)
+
+# --- PROCTORING EVENT TIMELINE ---
+# Only status transitions are recorded (not every frame). Each event is a 22-byte
+# fixed-width record; events are buffered per attempt and written in blocks by a
+# background flusher, either every TIMELINE_FLUSH_SECONDS or as soon as
+# TIMELINE_BATCH_EVENTS are pending. Violation totals are kept incrementally in
+# ProctorSummary, so summaries never need to scan the raw events. Attempts that
+# stop sending frames without a submit (closed tab, lost connection) are closed
+# at their last frame after TIMELINE_IDLE_SECONDS and dropped from memory.
+
+STATUS_CODES = {'safe': 0, 'missing': 1, 'multiple': 2, 'looking_away': 3}
+STATUS_NAMES = {v: k for k, v in STATUS_CODES.items()}
+VIOLATIONS = ('missing', 'looking_away', 'multiple')
+
+# timestamp (float64), status, face count (uint8), x, y, w, h (uint16), confidence (float32)
+RECORD = struct.Struct('<dBBHHHHf')
+
+def pack_event(ts, status, faces, box, confidence):
+    x, y, w, h = (min(max(int(v), 0), 0xFFFF) for v in box)
+    return RECORD.pack(ts, STATUS_CODES[status], min(faces, 255), x, y, w, h, confidence)
+
+def unpack_events(payload):
+    for ts, code, faces, x, y, w, h, confidence in RECORD.iter_unpack(payload):
+        yield {
+            'ts': ts,
+            'status': STATUS_NAMES[code],
+            'faces': faces,
+            'box': [x, y, w, h],
+            'confidence': round(confidence, 3),
+        }
+
+def verdict_confidence(recent, status):
+    # Share of the last few analyzed verdicts that agree with this one
+    return recent.count(status) / len(recent) if recent else 1.0
+
+def _empty_delta():
+    delta = {f'{v}_seconds': 0.0 for v in VIOLATIONS}
+    delta.update({f'{v}_events': 0 for v in VIOLATIONS})
+    return delta
+
+class AttemptState:
+    def __init__(self):
+        self.status = None
+        self.since = None
+        self.pending = []
+        self.first_ts = None
+        self.last_frame = None
+        self.delta = _empty_delta()
+
+    def accrue(self, ts):
+        # Close the interval spent in the current status
+        if self.status in VIOLATIONS:
+            self.delta[f'{self.status}_seconds'] += max(0.0, ts - self.since)
+        self.since = ts
+
+    # --- THE TIMELINE RULES (Live recorder and offline_analysis.py both go through these) ---
+    def transition(self, ts, status, faces=(), confidence=1.0):
+        # One analyzed frame: -> True when it changed the status and an event was added
+        self.last_frame = max(ts, self.last_frame or ts)
+        if self.status == status:
+            return False
+        if self.status is not None:
+            self.accrue(ts)
+        else:
+            self.since = ts
+        if status in VIOLATIONS:
+            self.delta[f'{status}_events'] += 1
+        self.status = status
+
+        box = faces[0] if len(faces) else (0, 0, 0, 0)
+        self.pending.append(pack_event(ts, status, len(faces), box, confidence))
+        if self.first_ts is None:
+            self.first_ts = ts
+        return True
+
+    def close(self, ts):
+        # End of the attempt. No frames since the last one: the final interval ends there.
+        if self.status is not None:
+            self.accrue(min(ts, self.last_frame or ts))
+        self.status = None
+
+class TimelineRecorder:
+    def __init__(self, app=None):
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending_count = 0
+        self._thread = None
+        self.app = None
+        self.batch_events = 256
+        self.flush_seconds = 5.0
+        self.idle_seconds = 300.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_events = app.config.get('TIMELINE_BATCH_EVENTS', 256)
+        self.flush_seconds = app.config.get('TIMELINE_FLUSH_SECONDS', 5.0)
+        self.idle_seconds = app.config.get('TIMELINE_IDLE_SECONDS', 300.0)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='timeline-flush', daemon=True)
+            self._thread.start()
+        app.extensions['timeline'] = self
+
+    # --- WRITE PATH ---
+    def record(self, student_id, exam_id, status, faces=(), confidence=1.0, ts=None):
+        ts = time.time() if ts is None else ts
+        key = (student_id, exam_id)
+        with self._lock:
+            state = self._attempts.get(key)
+            if state is None:
+                state = self._attempts[key] = AttemptState()
+            if not state.transition(ts, status, faces, confidence):
+                return False
+            self._pending_count += 1
+            if self._pending_count >= self.batch_events:
+                self._wake.set()
+        return True
+
+    def close_attempt(self, student_id, exam_id, ts=None):
+        # Called when the attempt ends (submit): account for the final interval and persist
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            state = self._attempts.get((student_id, exam_id))
+            if state is None:
+                return
+            state.close(ts)
+        self.flush()
+        with self._lock:
+            state = self._attempts.get((student_id, exam_id))
+            if state is not None and state.status is None and not state.pending:
+                del self._attempts[(student_id, exam_id)]
+
+    def evict_idle(self, now=None):
+        # Attempts with no frame for idle_seconds: close the open interval at the
+        # last frame, persist, and forget them
+        now = time.time() if now is None else now
+        with self._lock:
+            idle = [key for key, state in self._attempts.items()
+                    if state.last_frame is not None and now - state.last_frame > self.idle_seconds]
+            for key in idle:
+                self._attempts[key].close(now)
+        if not idle:
+            return 0
+        self.flush()
+        with self._lock:
+            for key in idle:
+                state = self._attempts.get(key)
+                # A frame may have arrived meanwhile: then the attempt is live again
+                if state is not None and state.status is None and not state.pending \
+                        and now - state.last_frame > self.idle_seconds:
+                    del self._attempts[key]
+        return len(idle)
+
+    def discard(self, exam_id=None, student_id=None):
+        # Before an exam or user is deleted: drop unflushed state so a later flush
+        # can't write blocks for it. Waits for a running flush to finish.
+        with self._flush_lock, self._lock:
+            for key in [k for k in self._attempts
+                        if (student_id is None or k[0] == student_id) and (exam_id is None or k[1] == exam_id)]:
+                self._pending_count -= len(self._attempts.pop(key).pending)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+                    self.evict_idle()
+            except Exception:
+                logger.exception("Timeline flush failed")
+
+    def _take_batches(self):
+        batches = []
+        with self._lock:
+            for key, state in self._attempts.items():
+                delta = state.delta
+                if not state.pending and not any(delta.values()):
+                    continue
+                batches.append((key, state.first_ts, state.pending, delta, state.status, state.since))
+                state.pending = []
+                state.first_ts = None
+                state.delta = _empty_delta()
+            self._pending_count = 0
+        return batches
+
+    def flush(self):
+        with self._flush_lock:
+            batches = self._take_batches()
+            if not batches:
+                return 0
+            try:
+                for (student_id, exam_id), first_ts, pending, delta, status, since in batches:
+                    if pending:
+                        payload = b''.join(pending)
+                        db.session.add(ProctorEventBlock(
+                            exam_id=exam_id, student_id=student_id,
+                            first_ts=first_ts, last_ts=RECORD.unpack_from(payload, len(payload) - RECORD.size)[0],
+                            event_count=len(pending), payload=payload
+                        ))
+                    self._apply_delta(student_id, exam_id, delta, status, since)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self._restore(batches)
+                raise
+            return sum(len(b[2]) for b in batches)
+
+    def _apply_delta(self, student_id, exam_id, delta, status, since):
+        values = {k: getattr(ProctorSummary, k) + v for k, v in delta.items()}
+        if status is not None:
+            values.update(last_status=status, last_ts=since)
+        updated = db.session.query(ProctorSummary).filter_by(
+            exam_id=exam_id, student_id=student_id
+        ).update(values, synchronize_session=False)
+        if not updated:
+            db.session.add(ProctorSummary(exam_id=exam_id, student_id=student_id,
+                                          last_status=status, last_ts=since, **delta))
+
+    def _restore(self, batches):
+        # Put a failed batch back in front of anything recorded since, to retry next flush
+        with self._lock:
+            for key, first_ts, pending, delta, status, since in batches:
+                state = self._attempts.setdefault(key, AttemptState())
+                state.pending = pending + state.pending
+                state.first_ts = first_ts if first_ts is not None else state.first_ts
+                for k, v in delta.items():
+                    state.delta[k] += v
+                self._pending_count += len(pending)
+
+    # --- READ PATH ---
+    def events(self, student_id, exam_id, start=None, end=None):
+        q = db.session.query(ProctorEventBlock).filter_by(exam_id=exam_id, student_id=student_id)
+        if start is not None:
+            q = q.filter(ProctorEventBlock.last_ts >= start)
+        if end is not None:
+            q = q.filter(ProctorEventBlock.first_ts <= end)
+        payloads = [b.payload for b in q.order_by(ProctorEventBlock.first_ts)]
+
+        # Events recorded but not flushed yet (only visible to this process)
+        with self._lock:
+            state = self._attempts.get((student_id, exam_id))
+            if state is not None and state.pending:
+                payloads.append(b''.join(state.pending))
+
+        out = []
+        for payload in payloads:
+            for e in unpack_events(payload):
+                if (start is None or e['ts'] >= start) and (end is None or e['ts'] <= end):
+                    out.append(e)
+        return out
+
+    def summaries(self, exam_id, student_id=None):
+        q = db.session.query(ProctorSummary).filter_by(exam_id=exam_id)
+        if student_id is not None:
+            q = q.filter_by(student_id=student_id)
+
+        rows = {}
+        for s in q:
+            rows[s.student_id] = {'student_id': s.student_id, 'last_status': s.last_status}
+            rows[s.student_id].update({k: getattr(s, k) or 0 for k in _empty_delta()})
+
+        # Fold in unflushed deltas and the still-open interval of live attempts,
+        # counted up to their last frame (not now: the camera may have gone away)
+        now = time.time()
+        with self._lock:
+            for (sid, eid), state in self._attempts.items():
+                if eid != exam_id or (student_id is not None and sid != student_id):
+                    continue
+                row = rows.setdefault(sid, dict({'student_id': sid, 'last_status': None}, **_empty_delta()))
+                for k, v in state.delta.items():
+                    row[k] += v
+                if state.status in VIOLATIONS:
+                    until = min(now, state.last_frame or state.since)
+                    row[f'{state.status}_seconds'] += max(0.0, until - state.since)
+                if state.status is not None:
+                    row['last_status'] = state.status
+
+        for row in rows.values():
+            for v in VIOLATIONS:
+                row[f'{v}_seconds'] = round(row[f'{v}_seconds'], 2)
+        return sorted(rows.values(), key=lambda r: r['student_id'])
+
+timeline = TimelineRecorder()
@@ -1,21 +1,16 @@
 from app import create_app, db
-from sqlalchemy import text
+from migrations import upgrade
 
 app = create_app()
 
+# Schema changes now live in migrations.py (versioned + idempotent).
+# This script is kept so the old instructions still work.
 with app.app_context():
     try:
-        print("🛠️  Attempting to add 'end_date' column to 'exam' table...")
-        
-        # This raw SQL command adds the missing column
-        # We set a default value (NOW) so existing exams don't crash
-        sql = text("ALTER TABLE exam ADD COLUMN end_date TIMESTAMP DEFAULT NOW();")
-        
-        db.session.execute(sql)
-        db.session.commit()
-        
-        print("✅ Success! Column 'end_date' added.")
+        print("🛠️  Applying pending schema migrations...")
+        applied = upgrade(db.engine)
+        print(f"✅ Success! Applied {len(applied)} migration(s).")
         print("🚀 You can now run 'python app.py' without errors.")
         
     except Exception as e:
-        print(f"⚠️  Error (Column might already exist): {e}")
\ No newline at end of file
+        print(f"⚠️  Error: {e}")
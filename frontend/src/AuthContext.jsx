@@ -29,10 +29,13 @@ export const AuthProvider = ({ children }) => {
 
   const getHeaders = () => {
     const storedUser = JSON.parse(localStorage.getItem('user') || '{}');
-    return {
+    const headers = {
         'Content-Type': 'application/json',
         'user-id': storedUser.id ? String(storedUser.id) : ''
     };
+    // Signed token from /auth/login lets the backend skip the user lookup
+    if (storedUser.token) headers['Authorization'] = `Bearer ${storedUser.token}`;
+    return headers;
   };
 
   return (
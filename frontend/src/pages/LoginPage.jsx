@@ -28,7 +28,7 @@ const Login = () => {
       const data = await res.json();
       
       if (res.ok) {
-        login(data.user);
+        login({ ...data.user, token: data.token });
         if (data.user.role === 'admin') navigate('/admin-dashboard');
         else if (data.user.role === 'teacher') navigate('/teacher-dashboard');
         else navigate('/student-dashboard');
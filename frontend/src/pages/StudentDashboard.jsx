@@ -22,6 +22,7 @@ const StudentDashboard = () => {
   const [proctorStatus, setProctorStatus] = useState("safe");
   const [showAlert, setShowAlert] = useState(false);
   const questionRefs = useRef({});
+  const videoRef = useRef(null);
 
   // --- AESTHETIC STYLES ---
   const styles = {
@@ -89,6 +90,9 @@ const StudentDashboard = () => {
             setTimeLeft(exam.duration * 60); 
             setVisited({ 0: true }); 
         }
+        // Restore answers autosaved before a refresh or crash
+        const saved = await fetch(`${API_BASE_URL}/exams/${exam.id}/answers`, { headers: getHeaders() });
+        if (saved.ok) setAnswers(await saved.json());
     } catch (e) { console.error(e); }
   };
 
@@ -160,25 +164,65 @@ const StudentDashboard = () => {
     return `${m}:${sec < 10 ? '0' : ''}${sec}`;
   };
 
-  // --- 4. PROCTOR ---
+  // --- 4. PROCTOR (Webcam frames go up; the server pushes the status only when it changes) ---
   useEffect(() => {
-    let interval;
-    if (activeExam) {
-      interval = setInterval(async () => {
-        try {
-          const res = await fetch(`${API_BASE_URL}/exams/proctor_status`);
-          if (res.ok) {
-            const data = await res.json();
-            setProctorStatus(data.status);
-            setShowAlert(data.status !== "safe");
-          }
-        } catch (e) { }
-      }, 2000);
-    }
-    return () => clearInterval(interval);
+    if (!activeExam) return;
+    let stream = null;
+    let stopped = false;
+    const canvas = document.createElement('canvas');
+    const sendFrame = () => {
+      const video = videoRef.current;
+      if (!video || !video.videoWidth) return;
+      canvas.width = 320;
+      canvas.height = Math.round(320 * video.videoHeight / video.videoWidth);
+      canvas.getContext('2d').drawImage(video, 0, 0, canvas.width, canvas.height);
+      canvas.toBlob((jpeg) => {
+        if (!jpeg || stopped) return;
+        fetch(`${API_BASE_URL}/exams/${activeExam.id}/frames`, {
+          method: 'POST', headers: { ...getHeaders(), 'Content-Type': 'image/jpeg' }, body: jpeg
+        }).catch(() => {});
+      }, 'image/jpeg', 0.7);
+    };
+    navigator.mediaDevices?.getUserMedia({ video: true, audio: false })
+      .then((s) => {
+        if (stopped) { s.getTracks().forEach(t => t.stop()); return; }
+        stream = s;
+        if (videoRef.current) videoRef.current.srcObject = s;
+      })
+      .catch(() => { setProctorStatus("missing"); setShowAlert(true); });
+    const capture = setInterval(sendFrame, 1000);
+    return () => {
+      stopped = true;
+      clearInterval(capture);
+      if (stream) stream.getTracks().forEach(t => t.stop());
+    };
   }, [activeExam, API_BASE_URL]);
 
+  useEffect(() => {
+    if (!activeExam) return;
+    // EventSource can't send headers: the token goes in the query string
+    const token = encodeURIComponent(user?.token || '');
+    const events = new EventSource(`${API_BASE_URL}/exams/${activeExam.id}/proctor_events?access_token=${token}`);
+    events.addEventListener('verdict', (e) => {
+      const data = JSON.parse(e.data);
+      setProctorStatus(data.status);
+      setShowAlert(data.status !== "safe");
+    });
+    return () => events.close();
+  }, [activeExam, API_BASE_URL, user]);
+
   const handleOptionSelect = (qId, opt) => setAnswers(prev => ({ ...prev, [qId]: opt }));
+
+  // --- 5. AUTOSAVE (Debounced; the server buffers and writes in bulk) ---
+  useEffect(() => {
+    if (!activeExam || Object.keys(answers).length === 0) return;
+    const timer = setTimeout(() => {
+      fetch(`${API_BASE_URL}/exams/${activeExam.id}/answers`, {
+        method: 'PUT', headers: getHeaders(), body: JSON.stringify({ answers })
+      }).catch(() => {});
+    }, 1000);
+    return () => clearTimeout(timer);
+  }, [answers, activeExam, API_BASE_URL]);
   
   const handleNavClick = (index) => {
     setVisited(prev => ({ ...prev, [index]: true }));
@@ -317,7 +361,7 @@ const StudentDashboard = () => {
                             <p className="lead fw-bold text-dark mb-5" style={{lineHeight: '1.6'}}>{currentQ.text}</p>
                             
                             <div className="d-flex flex-column gap-3">
-                                {['A','B','C','D'].map(opt => (
+                                {(currentQ.order || ['A','B','C','D']).map((opt, i) => (
                                     <div key={opt} 
                                         onClick={()=>handleOptionSelect(currentQ.id, opt)}
                                         style={styles.optionCard(answers[currentQ.id]===opt)}
@@ -330,7 +374,7 @@ const StudentDashboard = () => {
                                                     color: answers[currentQ.id]===opt ? 'white' : '#666', 
                                                     fontWeight: 'bold'
                                                 }}>
-                                                {opt}
+                                                {'ABCD'[i]}
                                             </div>
                                             <span className="fs-6">{currentQ.options[opt]}</span>
                                         </div>
@@ -348,13 +392,13 @@ const StudentDashboard = () => {
                                     <h6 className="fw-bold text-muted">Q{idx+1}</h6>
                                     <p className="fw-bold">{q.text}</p>
                                     <div className="d-flex flex-column gap-2">
-                                        {['A','B','C','D'].map(opt => (
+                                        {(q.order || ['A','B','C','D']).map((opt, i) => (
                                             <div key={opt} 
                                                 onClick={()=>handleOptionSelect(q.id, opt)}
                                                 style={styles.optionCard(answers[q.id]===opt)}
                                                 className="p-2"
                                             >
-                                                <small className="fw-bold me-2">{opt}:</small> {q.options[opt]}
+                                                <small className="fw-bold me-2">{'ABCD'[i]}:</small> {q.options[opt]}
                                             </div>
                                         ))}
                                     </div>
@@ -405,7 +449,7 @@ const StudentDashboard = () => {
              <div className="p-3 border-top bg-light text-center">
                 <small className="d-block mb-2 text-muted fw-bold">Live Proctoring Active 📹</small>
                 <div className="rounded overflow-hidden border mx-auto shadow-sm" style={{width: '180px', height: '135px', background: '#000'}}>
-                    <img src={`${API_BASE_URL}/exams/video_feed`} width="100%" height="100%" style={{objectFit: 'cover', opacity: 0.9}} alt="proctor" />
+                    <video ref={videoRef} autoPlay muted playsInline width="100%" height="100%" style={{objectFit: 'cover', opacity: 0.9}} />
                 </div>
              </div>
         </div>